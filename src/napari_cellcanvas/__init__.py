@@ -1,7 +1,20 @@
-from .widget import CellCanvasWidget
-
 __version__ = "0.0.1"
 
 __all__ = (
     "CellCanvasWidget",
+    "build_label_pyramid",
 )
+
+
+def __getattr__(name):
+    # napari discovers the plugin through napari.yaml, the widget and its
+    # dependencies are only imported when it is opened
+    if name == "CellCanvasWidget":
+        from .widget import CellCanvasWidget
+
+        return CellCanvasWidget
+    if name == "build_label_pyramid":
+        from ._pyramid import build_label_pyramid
+
+        return build_label_pyramid
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
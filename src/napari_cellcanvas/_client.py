@@ -0,0 +1,193 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ._profiling import Profiler
+
+
+class ServerError(RuntimeError):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CachedResponse:
+    def __init__(self, payload, etag, expires_at):
+        self.payload = payload
+        self.etag = etag
+        self.expires_at = expires_at
+
+
+class CellCanvasClient:
+    """Client for the CellCanvas server.
+
+    Requests go through one keep-alive session, created on first use.
+    Catalog endpoints (`/index`, `/info`, `/models`) are cached for
+    `cache_ttl` seconds and revalidated with their ETag once expired.
+    """
+
+    def __init__(
+        self,
+        hostname="localhost",
+        port=8082,
+        timeout=(3.05, 30),
+        run_timeout=(3.05, None),
+        cache_ttl=300,
+        pool_size=8,
+        profiler=None,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.timeout = timeout
+        self.run_timeout = run_timeout
+        self.cache_ttl = cache_ttl
+        self.pool_size = pool_size
+        self.profiler = profiler or Profiler(enabled=False)
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def session(self):
+        # requests is only imported once the server is contacted
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    @staticmethod
+    def is_transient(error):
+        """Whether a request that failed with `error` may succeed when
+        retried: connection errors, timeouts and server-side errors."""
+        import requests
+
+        if isinstance(error, ServerError):
+            return error.status_code >= 500
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+    @property
+    def base_url(self):
+        return f"http://{self.hostname}:{self.port}"
+
+    def get_json(self, path, use_cache=True):
+        with self._lock:
+            cached = self._cache.get(path)
+        if (
+            use_cache
+            and cached is not None
+            and cached.expires_at > time.monotonic()
+        ):
+            return cached.payload
+
+        headers = {}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        with self.profiler.span(
+            f"GET /{path.split('/')[1]}", "http", path=path
+        ) as span:
+            response = self.session.get(
+                f"{self.base_url}{path}", headers=headers, timeout=self.timeout
+            )
+            span.bytes = len(response.content)
+            span.args["status"] = response.status_code
+        if response.status_code == 304 and cached is not None:
+            payload = cached.payload
+        else:
+            response.raise_for_status()
+            payload = response.json()
+
+        with self._lock:
+            self._cache[path] = CachedResponse(
+                payload,
+                response.headers.get("ETag"),
+                time.monotonic() + self.cache_ttl,
+            )
+        return payload
+
+    def cached(self, path):
+        """Payload of `path` if cached and not expired, else None. Never
+        sends a request."""
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached is None or cached.expires_at <= time.monotonic():
+            return None
+        return cached.payload
+
+    def is_cached(self, path):
+        return self.cached(path) is not None
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(path, None)
+
+    def index(self, use_cache=True):
+        return self.get_json("/index", use_cache).get("index", {})
+
+    def info(self, catalog, group, name, version, use_cache=True):
+        return self.get_json(
+            f"/info/{catalog}/{group}/{name}/{version}", use_cache
+        ).get("info", {})
+
+    def cached_info(self, catalog, group, name, version):
+        """`info` if cached, else None."""
+        payload = self.cached(f"/info/{catalog}/{group}/{name}/{version}")
+        return None if payload is None else payload.get("info", {})
+
+    def models(self, use_cache=True):
+        return self.get_json("/models", use_cache).get("models", [])
+
+    def cached_models(self):
+        """`models` if cached, else None."""
+        payload = self.cached("/models")
+        return None if payload is None else payload.get("models", [])
+
+    def run(self, catalog, group, name, version, args):
+        with self.profiler.span(
+            "POST /run", "http", solution=f"{catalog}:{group}:{name}:{version}"
+        ) as span:
+            response = self.session.post(
+                f"{self.base_url}/run/{catalog}/{group}/{name}/{version}",
+                json={"args": args},
+                timeout=self.run_timeout,
+            )
+            span.bytes = len(response.content)
+            span.args["status"] = response.status_code
+        if response.status_code != 200:
+            raise ServerError(
+                f"Failed to execute solution. Status code: {response.status_code}. "
+                f"Response content: {response.text}",
+                response.status_code,
+            )
+        return response.json()
+
+    def prefetch_info(self, solutions, max_workers=None):
+        """Fetch `/info` for (catalog, group, name, version) tuples
+        concurrently, so later lookups are served from the cache."""
+
+        def fetch(solution):
+            try:
+                self.info(*solution)
+            except Exception as e:  # noqa: BLE001
+                print(f"Error prefetching info for {':'.join(solution)}: {e}")
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers or self.pool_size
+        ) as executor:
+            list(executor.map(fetch, solutions))
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
@@ -0,0 +1,254 @@
+import collections
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from ._picks import store_new_picks
+
+
+def chunk_regions_of(shape, chunks):
+    """Chunk grid coordinates of an array with the region of each chunk."""
+    grid = [
+        range((size + chunk - 1) // chunk)
+        for size, chunk in zip(shape, chunks)
+    ]
+    for coords in itertools.product(*grid):
+        yield coords, tuple(
+            slice(c * chunk, min((c + 1) * chunk, size))
+            for c, chunk, size in zip(coords, chunks, shape)
+        )
+
+
+class ChunkComponents:
+    """Connected components of one chunk, with the labels of its first and
+    last plane along each axis for merging with the neighbouring chunks."""
+
+    def __init__(self, classes, counts, sums, faces):
+        self.classes = classes
+        self.counts = counts
+        self.sums = sums
+        self.faces = faces
+
+    def __len__(self):
+        return len(self.classes)
+
+
+def label_chunk(array, region):
+    """Label the connected components of each label value in a chunk."""
+    from scipy import ndimage
+
+    block = np.asarray(array[region])
+    local = np.zeros(block.shape, dtype=np.int32)
+    classes = []
+    for value in np.unique(block):
+        if value == 0:
+            continue
+        labels, count = ndimage.label(block == value)
+        mask = labels > 0
+        local[mask] = labels[mask] + len(classes)
+        classes.extend([value] * count)
+
+    flat = local.ravel()
+    n = len(classes)
+    counts = np.bincount(flat, minlength=n + 1)[1:]
+    # Sums of the array coordinates of the voxels, for centroids
+    sums = np.zeros((n, block.ndim))
+    for axis, s in enumerate(region):
+        shape = [1] * block.ndim
+        shape[axis] = -1
+        coordinates = np.broadcast_to(
+            np.arange(s.start, s.stop).reshape(shape), block.shape
+        )
+        sums[:, axis] = np.bincount(
+            flat, weights=coordinates.ravel(), minlength=n + 1
+        )[1:]
+    faces = [
+        (np.take(local, 0, axis=axis), np.take(local, -1, axis=axis))
+        for axis in range(block.ndim)
+    ]
+    return ChunkComponents(np.array(classes), counts, sums, faces)
+
+
+def _find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def _map_bounded(executor, fn, items, window):
+    """`executor.map` that submits at most `window` items ahead of the
+    results consumed."""
+    pending = collections.deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _merge_planes(parent, last, first):
+    """Union the components of two chunks touching across a border, each
+    given as the local labels of its border plane, the offset of its
+    global ids and the classes of its components."""
+    last_labels, last_offset, last_classes = last
+    first_labels, first_offset, first_classes = first
+    touching = (last_labels > 0) & (first_labels > 0)
+    a = last_labels[touching]
+    b = first_labels[touching]
+    same = last_classes[a - 1] == first_classes[b - 1]
+    pairs = np.unique(
+        np.stack([a[same] + last_offset, b[same] + first_offset], axis=1),
+        axis=0,
+    )
+    for i, j in pairs.tolist():
+        root_i, root_j = _find(parent, i), _find(parent, j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+
+def connected_components(array, min_size=1, max_workers=None):
+    """Connected components of each nonzero value of a label array.
+
+    Chunks are labelled in parallel, at most twice `max_workers` of them
+    are read ahead. They are merged in order with the chunks before them
+    through the labels of their border planes, which are only kept until
+    the next chunk along each axis is merged.
+
+    Returns a dict from label value to the (N, ndim) centroids, in array
+    coordinates, and the (N,) voxel counts of its components of at least
+    `min_size` voxels.
+    """
+    regions = list(chunk_regions_of(array.shape, array.chunks))
+    grid = [
+        -(-size // chunk) for size, chunk in zip(array.shape, array.chunks)
+    ]
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+
+    # Global ids start at 1, each chunk gets a range of them
+    total = 0
+    parent = [0]
+    classes, counts, sums = [], [], []
+    # Last planes of merged chunks along each axis, with the offsets of
+    # their ids and their classes, by chunk and axis
+    last_planes = {}
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="cellcanvas-components"
+    ) as executor:
+        results = _map_bounded(
+            executor,
+            partial(label_chunk, array),
+            [region for _, region in regions],
+            2 * max_workers,
+        )
+        for (coords, _), result in zip(regions, results):
+            offset = total
+            total += len(result)
+            parent.extend(range(offset + 1, total + 1))
+            classes.append(result.classes)
+            counts.append(result.counts)
+            sums.append(result.sums)
+
+            for axis in range(array.ndim):
+                first, last = result.faces[axis]
+                previous = list(coords)
+                previous[axis] -= 1
+                previous_last = last_planes.pop((tuple(previous), axis), None)
+                if previous_last is not None:
+                    _merge_planes(
+                        parent, previous_last, (first, offset, result.classes)
+                    )
+                if coords[axis] + 1 < grid[axis]:
+                    last_planes[coords, axis] = (last, offset, result.classes)
+
+    if not total:
+        return {}
+    classes = np.concatenate(classes)
+    counts = np.concatenate(counts)
+    sums = np.concatenate(sums)
+
+    # Only merged components need a lookup, the others are their own root
+    roots = np.arange(1, total + 1)
+    for i in range(1, total + 1):
+        if parent[i] != i:
+            roots[i - 1] = _find(parent, i)
+    unique_roots, inverse = np.unique(roots, return_inverse=True)
+    merged_counts = np.bincount(inverse, weights=counts)
+    merged_sums = np.stack(
+        [
+            np.bincount(inverse, weights=sums[:, axis])
+            for axis in range(array.ndim)
+        ],
+        axis=1,
+    )
+    merged_classes = classes[unique_roots - 1]
+
+    components = {}
+    keep = merged_counts >= min_size
+    for value in np.unique(merged_classes[keep]):
+        selected = keep & (merged_classes == value)
+        components[value.item()] = (
+            merged_sums[selected] / merged_counts[selected, None],
+            merged_counts[selected].astype(int),
+        )
+    return components
+
+
+def components_to_picks(
+    components, run, pickable_objects, user_id, session_id, scale, translate
+):
+    """Write the centroids of `connected_components` to a new pick set per
+    pickable object, in physical z, y, x coordinates given by `scale` and
+    `translate`. Label values without a pickable object are skipped.
+
+    Returns the created pick sets.
+    """
+    objects = {obj.label: obj for obj in pickable_objects}
+    pick_sets = []
+    for value, (centroids, _) in components.items():
+        obj = objects.get(value)
+        if obj is None:
+            continue
+        positions = centroids * np.asarray(scale) + np.asarray(translate)
+        pick_sets.append(
+            store_new_picks(run, obj.name, positions, user_id, session_id)
+        )
+    return pick_sets
+
+
+def segmentation_to_picks(
+    segmentation,
+    pickable_objects,
+    user_id,
+    session_id,
+    min_size=1,
+    max_workers=None,
+):
+    """Pick the centroid of every connected component of a segmentation,
+    at full resolution, in new pick sets of its run."""
+    import zarr
+
+    from ._zarr import lazy_levels
+
+    data, scale, translate = lazy_levels(
+        zarr.open(segmentation.zarr(), "r"), segmentation.meta.voxel_size
+    )
+    components = connected_components(
+        data[0], min_size=min_size, max_workers=max_workers
+    )
+    return components_to_picks(
+        components,
+        segmentation.run,
+        pickable_objects,
+        user_id,
+        session_id,
+        scale,
+        translate,
+    )
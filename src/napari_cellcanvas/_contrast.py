@@ -0,0 +1,186 @@
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+# Contrast limits are these percentiles of the voxel values
+PERCENTILES = (0.5, 99.5)
+HISTOGRAM_BINS = 256
+# Voxels of the coarsest level read at most, others are skipped by striding
+MAX_SAMPLES = 2**24
+# Tomograms whose statistics are kept in the sidecar file
+MAX_ENTRIES = 2000
+
+
+def default_cache_dir():
+    """Directory of the on-disk caches, set by the CELLCANVAS_CACHE_DIR
+    environment variable."""
+    return os.environ.get("CELLCANVAS_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "napari-cellcanvas"
+    )
+
+
+class ImageStats:
+    def __init__(self, contrast_limits, counts, edges):
+        self.contrast_limits = contrast_limits
+        self.counts = counts
+        self.edges = edges
+
+    @property
+    def range(self):
+        return self.edges[0], self.edges[-1]
+
+    def to_json(self):
+        return {
+            "contrast_limits": list(self.contrast_limits),
+            "counts": list(self.counts),
+            "edges": list(self.edges),
+        }
+
+    @classmethod
+    def from_json(cls, entry):
+        return cls(
+            tuple(entry["contrast_limits"]), entry["counts"], entry["edges"]
+        )
+
+
+def compute_stats(
+    array,
+    percentiles=PERCENTILES,
+    bins=HISTOGRAM_BINS,
+    max_samples=MAX_SAMPLES,
+):
+    """Percentile contrast limits and histogram of an array, normally the
+    coarsest level of a pyramid."""
+    step = max(1, math.ceil((array.size / max_samples) ** (1 / array.ndim)))
+    data = np.asarray(array[(slice(None, None, step),) * array.ndim]).ravel()
+    if data.dtype.kind == "f":
+        data = data[np.isfinite(data)]
+    if not data.size:
+        edges = [float(e) for e in np.linspace(0, 1, bins + 1)]
+        return ImageStats((0.0, 1.0), [0] * bins, edges)
+
+    low, high = (float(v) for v in np.percentile(data, percentiles))
+    vmin, vmax = float(data.min()), float(data.max())
+    # Constant images still get a usable contrast range
+    if vmax <= vmin:
+        vmax = vmin + 1
+    if high <= low:
+        low, high = vmin, vmax
+    counts, edges = np.histogram(data, bins=bins, range=(vmin, vmax))
+    return ImageStats(
+        (low, high), [int(c) for c in counts], [float(e) for e in edges]
+    )
+
+
+def default_contrast_limits(dtype):
+    """Limits shown until the statistics of an image are known."""
+    dtype = np.dtype(dtype)
+    if dtype.kind in "iu":
+        info = np.iinfo(dtype)
+        return float(info.min), float(info.max)
+    return 0.0, 1.0
+
+
+def _store_root(store):
+    # zarr's FSStore keeps its location in `path`, fsspec mappers in `root`
+    return getattr(store, "path", None) or getattr(store, "root", None)
+
+
+def store_url(store, path=""):
+    """URL of an array in an fsspec store or mapping, None for other
+    stores."""
+    fs = getattr(store, "fs", None)
+    root = _store_root(store)
+    if fs is None or root is None:
+        return None
+    protocol = fs.protocol if isinstance(fs.protocol, str) else fs.protocol[0]
+    return f"{protocol}://{root}/{path}".rstrip("/")
+
+
+def store_mtime(store, path=""):
+    """Modification time of an array in an fsspec store or mapping, None
+    when the backend does not expose it."""
+    fs = getattr(store, "fs", None)
+    root = _store_root(store)
+    if fs is None or root is None:
+        return None
+    try:
+        info = fs.info(f"{root}/{path}".rstrip("/"))
+    except Exception:  # noqa: BLE001
+        return None
+    mtime = info.get("mtime", info.get("LastModified"))
+    # Object stores return datetimes, kept as strings in the sidecar file
+    if mtime is not None and not isinstance(mtime, (int, float)):
+        mtime = str(mtime)
+    return mtime
+
+
+class StatsCache:
+    """Image statistics by store location, kept in memory and in a JSON
+    sidecar file.
+
+    Entries hold the modification time of the data they were computed
+    from, a changed modification time invalidates them.
+    """
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES):
+        self.path = path or os.path.join(default_cache_dir(), "contrast.json")
+        self.max_entries = max_entries
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Read once, on first access
+        if self._entries is None:
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, location, mtime=None, check_mtime=False):
+        """Cached statistics of `location`, only if computed at `mtime`
+        when `check_mtime`."""
+        if location is None:
+            return None
+        with self._lock:
+            entry = self._load().get(location)
+        if entry is None or (check_mtime and entry.get("mtime") != mtime):
+            return None
+        return ImageStats.from_json(entry)
+
+    def put(self, location, mtime, stats):
+        if location is None:
+            return
+        with self._lock:
+            entries = self._load()
+            entries.pop(location, None)
+            entries[location] = {"mtime": mtime, **stats.to_json()}
+            # Oldest entries first
+            for key in list(entries)[
+                : max(0, len(entries) - self.max_entries)
+            ]:
+                del entries[key]
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Error writing {self.path}: {e}")
+
+    def stats(self, store, path, array):
+        """Statistics of `array` at `path` of `store`, computed unless they
+        were cached at its current modification time."""
+        location = store_url(store, path)
+        mtime = store_mtime(store, path)
+        stats = self.get(location, mtime, check_mtime=True)
+        if stats is None:
+            stats = compute_stats(array)
+            self.put(location, mtime, stats)
+        return stats
@@ -0,0 +1,140 @@
+import contextlib
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from ._contrast import default_cache_dir
+
+# Default size of the on-disk chunk cache
+DISK_CACHE_SIZE = 20 * 2**30
+# Eviction goes this far below the size, so that it does not run on every
+# write
+EVICTION_RATIO = 0.9
+
+_TMP_SUFFIX = ".tmp"
+
+
+class DiskChunkCache:
+    """Chunks of remote stores kept in files under `path`, by store location
+    and key. Above `max_size` bytes the least recently used files are
+    evicted.
+
+    Files are written to a temporary name and renamed, so several threads
+    and napari sessions can share the directory. A file evicted or
+    invalidated by another of them is only read again from its store.
+    """
+
+    def __init__(self, path=None, max_size=DISK_CACHE_SIZE):
+        self.path = path or os.path.join(default_cache_dir(), "chunks")
+        self.max_size = max_size
+        # Bytes in the directory, counted on first write and kept up to
+        # date by this process only. Eviction counts them again
+        self._size = None
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def location_path(self, location):
+        return os.path.join(
+            self.path, hashlib.sha1(location.encode()).hexdigest()
+        )
+
+    def _file(self, location, key):
+        return os.path.join(self.location_path(location), *key.split("/"))
+
+    def get(self, location, key, max_age=None):
+        """Cached value of `key`, None if missing or cached more than
+        `max_age` seconds ago."""
+        path = self._file(location, key)
+        try:
+            if (
+                max_age is not None
+                and time.time() - os.path.getmtime(path) > max_age
+            ):
+                return None
+            with open(path, "rb") as f:
+                value = f.read()
+        except OSError:
+            return None
+        # The modification time orders files for eviction. Entries that
+        # expire keep the time they were cached
+        if max_age is None:
+            with contextlib.suppress(OSError):
+                os.utime(path)
+        return value
+
+    def contains(self, location, key, max_age=None):
+        try:
+            mtime = os.path.getmtime(self._file(location, key))
+        except OSError:
+            return False
+        return max_age is None or time.time() - mtime <= max_age
+
+    def put(self, location, key, value):
+        path = self._file(location, key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}{_TMP_SUFFIX}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error caching {key} of {location}: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += memoryview(value).nbytes
+            size = self._size
+        if self.max_size and size > self.max_size:
+            self.evict()
+
+    def discard(self, location, key):
+        with contextlib.suppress(OSError):
+            os.remove(self._file(location, key))
+
+    def invalidate(self, location):
+        """Drop all cached chunks of a store."""
+        shutil.rmtree(self.location_path(location), ignore_errors=True)
+        with self._lock:
+            self._size = None
+
+    def _scan(self):
+        for directory, _, names in os.walk(self.path):
+            for name in names:
+                if name.endswith(_TMP_SUFFIX):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def size(self):
+        return sum(size for _, size, _ in self._scan())
+
+    def evict(self):
+        """Remove the least recently used files down to `EVICTION_RATIO`
+        of `max_size`."""
+        if not self._evict_lock.acquire(blocking=False):
+            # Already evicting
+            return
+        try:
+            files = sorted(self._scan())
+            total = sum(size for _, size, _ in files)
+            target = EVICTION_RATIO * self.max_size
+            for _, size, path in files:
+                if total <= target:
+                    break
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                total -= size
+            with self._lock:
+                self._size = total
+        finally:
+            self._evict_lock.release()
@@ -0,0 +1,178 @@
+import itertools
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Voxels sampled at most from the coarsest level to fit the PCA
+PCA_SAMPLES = 100_000
+# Projected chunks kept in memory by each projection
+PROJECTION_CACHE_CHUNKS = 256
+
+
+class PCA:
+    """Projection of feature vectors on their first principal components,
+    scaled to [0, 1] by percentiles of the fitted sample."""
+
+    def __init__(self, mean, components, low, high):
+        self.mean = mean
+        self.components = components
+        self.low = low
+        self.high = high
+
+    def project(self, block):
+        """Project a (C, ...) block to (..., n_components) in [0, 1]."""
+        vectors = np.moveaxis(block, 0, -1).astype(np.float32)
+        projected = (vectors - self.mean) @ self.components.T
+        scaled = (projected - self.low) / (self.high - self.low)
+        return np.clip(np.nan_to_num(scaled), 0, 1).astype(np.float32)
+
+
+def fit_pca(array, n_components=3, max_samples=PCA_SAMPLES, seed=0):
+    """Fit a PCA on voxels of a (C, Z, Y, X) feature array, normally its
+    coarsest level. Arrays with fewer channels than components get zero
+    components."""
+    n_channels = array.shape[0]
+    spatial_size = math.prod(array.shape[1:])
+    step = max(1, math.ceil((spatial_size / max_samples) ** (1 / 3)))
+    sample = np.asarray(array[(slice(None), *[slice(None, None, step)] * 3)])
+    sample = sample.reshape(n_channels, -1).T.astype(np.float64)
+    sample = sample[np.isfinite(sample).all(axis=1)]
+    if len(sample) > max_samples:
+        rng = np.random.default_rng(seed)
+        sample = sample[rng.choice(len(sample), max_samples, replace=False)]
+
+    mean = sample.mean(axis=0) if len(sample) else np.zeros(n_channels)
+    centered = sample - mean
+    components = np.zeros((n_components, n_channels))
+    if len(sample) > 1:
+        _, _, vt = np.linalg.svd(centered, full_matrices=False)
+        components[: len(vt)] = vt[:n_components]
+    projected = centered @ components.T
+    if len(projected):
+        low, high = np.percentile(projected, (1, 99), axis=0)
+    else:
+        low, high = np.zeros(n_components), np.ones(n_components)
+    high = np.where(high > low, high, low + 1)
+    return PCA(
+        mean.astype(np.float32),
+        components.astype(np.float32),
+        low.astype(np.float32),
+        high.astype(np.float32),
+    )
+
+
+def _normalize_key(key, ndim):
+    if not isinstance(key, tuple):
+        key = (key,)
+    if any(k is Ellipsis for k in key):
+        i = key.index(Ellipsis)
+        key = key[:i] + (slice(None),) * (ndim - len(key) + 1) + key[i + 1 :]
+    return key + (slice(None),) * (ndim - len(key))
+
+
+class PCAProjection:
+    """Lazy (Z, Y, X, 3) RGB view of a (C, Z, Y, X) feature array.
+
+    Reading a region projects the chunks it covers on a thread pool, and
+    keeps the most recent ones in memory. Nothing else is read.
+    """
+
+    def __init__(
+        self,
+        array,
+        pca,
+        executor,
+        cache_chunks=PROJECTION_CACHE_CHUNKS,
+    ):
+        self.array = array
+        self.pca = pca
+        self.executor = executor
+        self.shape = (*array.shape[1:], pca.components.shape[0])
+        self.dtype = np.dtype(np.float32)
+        self.ndim = len(self.shape)
+        self.chunks = array.chunks[1:]
+        self.cache_chunks = cache_chunks
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        data = self[...]
+        return data if dtype is None else data.astype(dtype)
+
+    def _chunk(self, coords):
+        with self._lock:
+            block = self._cache.get(coords)
+            if block is not None:
+                self._cache.move_to_end(coords)
+                return block
+        region = tuple(
+            slice(c * size, min((c + 1) * size, extent))
+            for c, size, extent in zip(coords, self.chunks, self.shape)
+        )
+        block = self.pca.project(
+            np.asarray(self.array[(slice(None), *region)])
+        )
+        with self._lock:
+            self._cache[coords] = block
+            while len(self._cache) > self.cache_chunks:
+                self._cache.popitem(last=False)
+        return block
+
+    def __getitem__(self, key):
+        key = _normalize_key(key, self.ndim)
+        spatial, channel_key = key[:3], key[3]
+        bounds = []
+        squeeze = []
+        steps = []
+        for k, extent in zip(spatial, self.shape):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(extent)
+                bounds.append((start, max(start, stop)))
+                steps.append(slice(None, None, step))
+                squeeze.append(False)
+            else:
+                k = int(k) % extent
+                bounds.append((k, k + 1))
+                steps.append(slice(None))
+                squeeze.append(True)
+
+        out = np.zeros(
+            (*(stop - start for start, stop in bounds), self.shape[3]),
+            dtype=self.dtype,
+        )
+        grid = [
+            (
+                range(start // size, (stop - 1) // size + 1)
+                if stop > start
+                else []
+            )
+            for (start, stop), size in zip(bounds, self.chunks)
+        ]
+        chunks = list(itertools.product(*grid))
+        for coords, block in zip(
+            chunks, self.executor.map(self._chunk, chunks)
+        ):
+            source = []
+            target = []
+            for c, size, (start, stop) in zip(coords, self.chunks, bounds):
+                lo = max(start, c * size)
+                hi = min(stop, (c + 1) * size)
+                source.append(slice(lo - c * size, hi - c * size))
+                target.append(slice(lo - start, hi - start))
+            out[tuple(target)] = block[tuple(source)]
+
+        out = out[tuple(steps)]
+        out = out[tuple(0 if s else slice(None) for s in squeeze)]
+        return out[..., channel_key]
+
+
+def projection_executor(max_workers=None):
+    return ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="cellcanvas-pca"
+    )
@@ -0,0 +1,554 @@
+import threading
+
+from ._profiling import Profiler
+
+
+def storage_signature(run, voxel_sizes=()):
+    """Modification times of the directories that hold a run's entities.
+
+    Returns None when the storage backend does not expose mtimes, in which
+    case the run has to be re-listed to detect changes.
+    """
+    locations = []
+    for fs_name, path_name in (
+        ("fs_overlay", "overlay_path"),
+        ("fs_static", "static_path"),
+    ):
+        fs = getattr(run, fs_name, None)
+        path = getattr(run, path_name, None)
+        if fs is None or path is None:
+            return None
+        if (fs, path) not in locations:
+            locations.append((fs, path))
+
+    subdirs = ["", "/Picks", "/Segmentations"]
+    subdirs += [f"/VoxelSpacing{voxel_size:.3f}" for voxel_size in voxel_sizes]
+
+    signature = []
+    for fs, path in locations:
+        for subdir in subdirs:
+            try:
+                info = fs.info(path + subdir)
+            except FileNotFoundError:
+                signature.append(None)
+                continue
+            except Exception:  # noqa: BLE001
+                return None
+            mtime = info.get("mtime", info.get("LastModified"))
+            if mtime is None:
+                return None
+            signature.append(mtime)
+    return tuple(signature)
+
+
+class VoxelSpacingEntry:
+    def __init__(self, voxel_spacing):
+        self.voxel_spacing = voxel_spacing
+        # Listed on first access, None until then
+        self.tomograms = None
+        self.features = None
+        # Shape of the full resolution tomograms, read once
+        self.shape = None
+
+    @property
+    def voxel_size(self):
+        return self.voxel_spacing.meta.voxel_size
+
+    @property
+    def loaded(self):
+        return self.tomograms is not None
+
+    def entities(self):
+        entities = {("voxel_spacing", self.voxel_size): self.voxel_spacing}
+        for tomogram in self.tomograms or []:
+            key = ("tomogram", self.voxel_size, tomogram.meta.tomo_type)
+            entities[key] = tomogram
+        for tomo_type, features in (self.features or {}).items():
+            for feature in features:
+                key = (
+                    "features",
+                    self.voxel_size,
+                    tomo_type,
+                    feature.meta.feature_type,
+                )
+                entities[key] = feature
+        return entities
+
+    def keys(self):
+        return set(self.entities())
+
+
+class RunEntry:
+    def __init__(self, run):
+        self.run = run
+        self.lock = threading.RLock()
+        # Listed on first access, None until then
+        self.voxel_spacings = None
+        self.picks = None
+        self.segmentations = None
+        self.signature = None
+
+    @property
+    def name(self):
+        return self.run.meta.name
+
+    @property
+    def loaded(self):
+        return self.voxel_spacings is not None
+
+    def segmentations_at(self, voxel_size):
+        return [
+            segmentation
+            for segmentation in self.segmentations or []
+            if segmentation.meta.voxel_size == voxel_size
+        ]
+
+    def entities(self):
+        """Listed entities of the run, by key."""
+        entities = {}
+        for voxel_spacing_entry in (self.voxel_spacings or {}).values():
+            entities.update(voxel_spacing_entry.entities())
+        for pick in self.picks or []:
+            key = (
+                "picks",
+                pick.meta.user_id,
+                pick.meta.session_id,
+                pick.meta.pickable_object_name,
+            )
+            entities[key] = pick
+        for segmentation in self.segmentations or []:
+            key = (
+                "segmentation",
+                segmentation.meta.voxel_size,
+                segmentation.meta.user_id,
+                segmentation.meta.session_id,
+                segmentation.meta.name,
+            )
+            entities[key] = segmentation
+        return entities
+
+    def keys(self):
+        return set(self.entities())
+
+    def names(self):
+        """Labels of the run and its listed tomograms, segmentations and
+        pick sets, with the entities they name."""
+        names = [(self.name, self.run)]
+        for voxel_spacing_entry in (self.voxel_spacings or {}).values():
+            for tomogram in voxel_spacing_entry.tomograms or []:
+                label = (
+                    f"{self.name} / {voxel_spacing_entry.voxel_size} / "
+                    f"Tomogram: {tomogram.meta.tomo_type}"
+                )
+                names.append((label, tomogram))
+        for segmentation in self.segmentations or []:
+            meta = segmentation.meta
+            label = (
+                f"{self.name} / {meta.voxel_size} / Segmentation: "
+                f"{meta.name} ({meta.user_id}/{meta.session_id})"
+            )
+            names.append((label, segmentation))
+        for pick in self.picks or []:
+            meta = pick.meta
+            label = (
+                f"{self.name} / Picks: {meta.pickable_object_name} "
+                f"({meta.user_id}/{meta.session_id})"
+            )
+            names.append((label, pick))
+        return names
+
+
+def unique(values):
+    return list(dict.fromkeys(values))
+
+
+class SearchIndex:
+    """Labels and entities by the lower-cased words of the labels.
+
+    Search terms hold no whitespace, so a term is in a label exactly when it
+    is in one of its words. Only the distinct words are scanned, which are
+    far fewer than the labels.
+    """
+
+    def __init__(self, entries):
+        self.entries = [(label, entity) for _, label, entity in entries]
+        self.words = {}
+        for i, (haystack, _, _) in enumerate(entries):
+            for word in set(haystack.split()):
+                self.words.setdefault(word, []).append(i)
+
+    def search(self, text, limit=1000):
+        matches = None
+        for term in text.lower().split():
+            found = set()
+            for word, indices in self.words.items():
+                if term in word:
+                    found.update(indices)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        if matches is None:
+            return self.entries[:limit]
+        return [self.entries[i] for i in sorted(matches)[:limit]]
+
+
+class RunChoices:
+    """Values offered for the solution arguments of one run."""
+
+    def __init__(self, entry=None):
+        self.voxel_sizes = []
+        self.tomo_types = []
+        self.feature_types = []
+        self.segmentation_names = []
+        self.user_ids = []
+        self.session_ids = []
+        if entry is None:
+            return
+
+        voxel_spacing_entries = list(entry.voxel_spacings.values())
+        self.voxel_sizes = [e.voxel_size for e in voxel_spacing_entries]
+        # Tomogram types of the first voxel spacing, as offered before
+        if voxel_spacing_entries:
+            self.tomo_types = unique(
+                tomogram.meta.tomo_type
+                for tomogram in voxel_spacing_entries[0].tomograms
+            )
+        self.feature_types = unique(
+            feature.meta.feature_type
+            for e in voxel_spacing_entries
+            for features in e.features.values()
+            for feature in features
+        )
+        self.segmentation_names = unique(
+            segmentation.meta.name for segmentation in entry.segmentations
+        )
+        self.user_ids = unique(pick.meta.user_id for pick in entry.picks)
+        self.session_ids = unique(pick.meta.session_id for pick in entry.picks)
+
+
+class ProjectIndex:
+    """In-memory index of the runs of a copick project and their contents.
+
+    Runs and voxel spacings are listed from storage the first time they are
+    accessed and served from memory afterwards. Listing methods are safe to
+    call from worker threads.
+
+    The choices and search names of the runs are written from worker
+    threads and read from the main thread under `lock`.
+    """
+
+    def __init__(self, root, profiler=None):
+        self.root = root
+        self.profiler = profiler or Profiler(enabled=False)
+        with self.profiler.span("list_runs", "copick"):
+            self.runs = {run.meta.name: RunEntry(run) for run in root.runs}
+        self.lock = threading.Lock()
+        self._choices = {}
+        # Lower-cased labels of the runs' entities for `search`
+        self._names = {}
+        # Built from them on the first search after they changed
+        self._search_index = None
+
+    def run_names(self):
+        return list(self.runs)
+
+    def get_run(self, name):
+        entry = self.runs.get(name)
+        return entry.run if entry is not None else None
+
+    def is_loaded(self, name, voxel_size=None):
+        entry = self.runs.get(name)
+        if entry is None or not entry.loaded:
+            return False
+        if voxel_size is None:
+            return True
+        voxel_spacing_entry = entry.voxel_spacings.get(voxel_size)
+        return voxel_spacing_entry is None or voxel_spacing_entry.loaded
+
+    def load_run(self, name, deep=False):
+        entry = self.runs[name]
+        with entry.lock:
+            if not entry.loaded:
+                self._list_run(entry)
+            if deep:
+                for voxel_spacing_entry in entry.voxel_spacings.values():
+                    if not voxel_spacing_entry.loaded:
+                        self._list_voxel_spacing(voxel_spacing_entry)
+        return entry
+
+    def load_voxel_spacing(self, name, voxel_size):
+        entry = self.load_run(name)
+        with entry.lock:
+            voxel_spacing_entry = entry.voxel_spacings[voxel_size]
+            if not voxel_spacing_entry.loaded:
+                self._list_voxel_spacing(voxel_spacing_entry)
+        return voxel_spacing_entry
+
+    def _list_run(self, entry, loaded_voxel_sizes=()):
+        with self.profiler.span("list_run", "copick", run=entry.name):
+            self._list_run_entities(entry)
+        for voxel_size in loaded_voxel_sizes:
+            if voxel_size in entry.voxel_spacings:
+                self._list_voxel_spacing(entry.voxel_spacings[voxel_size])
+
+    def _list_run_entities(self, entry):
+        run = entry.run
+        voxel_sizes = [vs.meta.voxel_size for vs in run.voxel_spacings]
+        # Taken before listing so that changes made meanwhile are seen by the
+        # next refresh
+        entry.signature = storage_signature(run, voxel_sizes)
+        entry.voxel_spacings = {
+            vs.meta.voxel_size: VoxelSpacingEntry(vs)
+            for vs in run.voxel_spacings
+        }
+        entry.picks = list(run.picks)
+        entry.segmentations = list(run.segmentations)
+
+    def _list_voxel_spacing(self, voxel_spacing_entry):
+        voxel_spacing = voxel_spacing_entry.voxel_spacing
+        with self.profiler.span(
+            "list_voxel_spacing",
+            "copick",
+            run=voxel_spacing.run.meta.name,
+            voxel_size=voxel_spacing.meta.voxel_size,
+        ):
+            tomograms = list(voxel_spacing.tomograms)
+            voxel_spacing_entry.features = {
+                tomogram.meta.tomo_type: list(tomogram.features)
+                for tomogram in tomograms
+            }
+        voxel_spacing_entry.tomograms = tomograms
+
+    def voxel_sizes(self, name):
+        return list(self.load_run(name).voxel_spacings)
+
+    def voxel_spacings(self, name):
+        entry = self.load_run(name)
+        return [
+            voxel_spacing_entry.voxel_spacing
+            for voxel_spacing_entry in entry.voxel_spacings.values()
+        ]
+
+    def tomograms(self, name, voxel_size=None):
+        entry = self.load_run(name, deep=voxel_size is None)
+        if voxel_size is not None:
+            return list(self.load_voxel_spacing(name, voxel_size).tomograms)
+        return [
+            tomogram
+            for voxel_spacing_entry in entry.voxel_spacings.values()
+            for tomogram in voxel_spacing_entry.tomograms
+        ]
+
+    def volume_shape(self, name, voxel_size):
+        """Shape of the full resolution of the tomograms of a voxel spacing,
+        read from the metadata of the first one and kept. None without
+        tomograms."""
+        voxel_spacing_entry = self.load_voxel_spacing(name, voxel_size)
+        if voxel_spacing_entry.shape is None and voxel_spacing_entry.tomograms:
+            import zarr
+
+            from ._zarr import lazy_levels
+
+            tomogram = voxel_spacing_entry.tomograms[0]
+            with self.profiler.span("read_shape", "copick", run=name):
+                data, _, _ = lazy_levels(
+                    zarr.open(tomogram.zarr(), "r"), voxel_size
+                )
+            voxel_spacing_entry.shape = data[0].shape
+        return voxel_spacing_entry.shape
+
+    def features(self, name, voxel_size=None):
+        entry = self.load_run(name, deep=True)
+        return [
+            feature
+            for voxel_spacing_entry in entry.voxel_spacings.values()
+            if voxel_size is None
+            or voxel_spacing_entry.voxel_size == voxel_size
+            for features in voxel_spacing_entry.features.values()
+            for feature in features
+        ]
+
+    def segmentations(self, name, voxel_size=None):
+        entry = self.load_run(name)
+        if voxel_size is None:
+            return list(entry.segmentations)
+        return entry.segmentations_at(voxel_size)
+
+    def picks(self, name):
+        return list(self.load_run(name).picks)
+
+    def run_choices(self, name):
+        """Choices of a run, listed once and kept until the run changes."""
+        with self.lock:
+            choices = self._choices.get(name)
+        if choices is None:
+            entry = self.load_run(name, deep=True)
+            with entry.lock:
+                choices = RunChoices(entry)
+            with self.lock:
+                # Not kept for a run removed by a refresh meanwhile
+                if self.runs.get(name) is entry:
+                    self._choices[name] = choices
+        return choices
+
+    def has_choices(self, name):
+        with self.lock:
+            return name in self._choices
+
+    def choices_complete(self):
+        with self.lock:
+            return all(name in self._choices for name in self.runs)
+
+    def build_choices(self):
+        # The search names are built from the same listings
+        for name in self.run_names():
+            self.run_choices(name)
+            self.search_names(name)
+
+    def search_names(self, name):
+        """Search labels of a run, listed once and kept until the run
+        changes."""
+        with self.lock:
+            names = self._names.get(name)
+        if names is None:
+            entry = self.load_run(name, deep=True)
+            with entry.lock:
+                names = [
+                    (label.lower(), label, entity)
+                    for label, entity in entry.names()
+                ]
+            with self.lock:
+                if self.runs.get(name) is entry:
+                    self._names[name] = names
+                    self._search_index = None
+        return names
+
+    def search(self, text, limit=1000):
+        """Labels and entities whose label contains all words of `text`,
+        ignoring case, up to `limit` of them.
+
+        Runs whose names are not built yet only match by their name.
+        """
+        with self.lock:
+            search_index = self._search_index
+            if search_index is None:
+                entries = []
+                for name, entry in self.runs.items():
+                    names = self._names.get(name)
+                    if names is None:
+                        names = [(name.lower(), name, entry.run)]
+                    entries.extend(names)
+                search_index = self._search_index = SearchIndex(entries)
+        return search_index.search(text, limit)
+
+    def user_ids(self):
+        # Across all runs whose choices are built
+        with self.lock:
+            all_choices = list(self._choices.values())
+        return unique(
+            user_id for choices in all_choices for user_id in choices.user_ids
+        )
+
+    def session_ids(self):
+        with self.lock:
+            all_choices = list(self._choices.values())
+        return unique(
+            session_id
+            for choices in all_choices
+            for session_id in choices.session_ids
+        )
+
+    def refresh_run(self, name, force=False):
+        """Re-list a run that was loaded before, if its storage changed.
+
+        Returns True when the run's contents differ from the indexed ones.
+        """
+        entry = self.runs.get(name)
+        if entry is None:
+            return False
+        with entry.lock:
+            if not entry.loaded:
+                return False
+            signature = storage_signature(entry.run, entry.voxel_spacings)
+            if (
+                not force
+                and signature is not None
+                and signature == entry.signature
+            ):
+                return False
+
+            old_keys = entry.keys()
+            loaded_voxel_sizes = [
+                voxel_size
+                for voxel_size, voxel_spacing_entry in entry.voxel_spacings.items()
+                if voxel_spacing_entry.loaded
+            ]
+            entry.run.refresh()
+            self._list_run(entry, loaded_voxel_sizes)
+            changed = entry.keys() != old_keys
+            if changed:
+                with self.lock:
+                    self._choices.pop(name, None)
+                    self._names.pop(name, None)
+                    self._search_index = None
+            return changed
+
+    def run_entities(self, name):
+        """Entities of a run by key, with all its voxel spacings listed."""
+        entry = self.load_run(name, deep=True)
+        with entry.lock:
+            return entry.entities()
+
+    def diff_run(self, name, before):
+        """Re-list a run if its storage changed and diff it against
+        `before`, the result of an earlier `run_entities`.
+
+        Returns the added entities by key and the keys of removed ones.
+        """
+        self.refresh_run(name)
+        # Voxel spacings added since are listed too
+        after = self.run_entities(name)
+        added = {key: e for key, e in after.items() if key not in before}
+        removed = [key for key in before if key not in after]
+        return added, removed
+
+    def refresh(self):
+        """Diff the index against storage.
+
+        Returns the names of added, removed and changed runs. Only runs that
+        were loaded before are re-listed, and only when their directories
+        changed.
+        """
+        with self.profiler.span("list_runs", "copick"):
+            self.root.refresh()
+            runs = {run.meta.name: run for run in self.root.runs}
+
+        added = [name for name in runs if name not in self.runs]
+        removed = [name for name in self.runs if name not in runs]
+        changed = [
+            name
+            for name in self.runs
+            if name in runs and self.refresh_run(name)
+        ]
+
+        with self.lock:
+            # Keep the entries of existing runs, and the run objects the tree
+            # refers to. Those of removed runs are dropped with their choices
+            # and names.
+            self.runs = {
+                name: self.runs.get(name) or RunEntry(run)
+                for name, run in runs.items()
+            }
+            self._choices = {
+                name: choices
+                for name, choices in self._choices.items()
+                if name in runs
+            }
+            self._names = {
+                name: names
+                for name, names in self._names.items()
+                if name in runs
+            }
+            if added or removed:
+                self._search_index = None
+        return added, removed, changed
@@ -0,0 +1,308 @@
+import itertools
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from qtpy.QtCore import QObject, Signal
+from qtpy.QtWidgets import (
+    QAbstractItemView,
+    QHBoxLayout,
+    QHeaderView,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    def __init__(self, job_id, description, args=None):
+        self.job_id = job_id
+        self.description = description
+        self.args = args or {}
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.future = None
+        # Set on cancel, interrupts waits between retries
+        self.cancel_event = threading.Event()
+        self.batch = None
+        self.attempts = 0
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def cancel_requested(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.started_at
+
+
+class Batch:
+    """Jobs running one solution over many runs."""
+
+    def __init__(self, batch_id, description, max_concurrency):
+        self.batch_id = batch_id
+        self.description = description
+        self.max_concurrency = max_concurrency
+        self.jobs = []
+        self.started_at = time.time()
+
+    def count(self, *states):
+        return sum(job.state in states for job in self.jobs)
+
+    @property
+    def done(self):
+        return self.count(DONE)
+
+    @property
+    def failed(self):
+        return self.count(FAILED)
+
+    @property
+    def cancelled(self):
+        return self.count(CANCELLED)
+
+    @property
+    def remaining(self):
+        return len(self.jobs) - self.count(*FINISHED_STATES)
+
+    @property
+    def finished(self):
+        return not self.remaining
+
+    def throughput(self):
+        """Finished jobs per minute."""
+        finished = [job.finished_at for job in self.jobs if job.finished]
+        if not finished:
+            return 0.0
+        elapsed = max(finished) - self.started_at
+        return 60 * len(finished) / elapsed if elapsed > 0 else 0.0
+
+
+def retrying(fn, job, retries=2, backoff=1.0, retry_on=None):
+    """Wrap `fn` to retry `retries` times, waiting `backoff` seconds doubled
+    after every attempt. Only errors accepted by `retry_on` are retried.
+    Cancelling the job stops waiting and skips the remaining attempts."""
+
+    def run(*args, **kwargs):
+        for attempt in range(retries + 1):
+            if job.cancel_requested:
+                raise CancelledError
+            job.attempts = attempt + 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:  # noqa: BLE001
+                if (
+                    attempt == retries
+                    or job.cancel_requested
+                    or (retry_on is not None and not retry_on(e))
+                ):
+                    raise
+                job.cancel_event.wait(backoff * 2**attempt)
+
+    return run
+
+
+class JobManager(QObject):
+    """Runs jobs on a worker pool and reports their state through signals.
+
+    Signals are emitted from the worker threads; Qt queues them onto the
+    thread the manager lives in, so slots can safely touch widgets.
+    """
+
+    job_added = Signal(object)
+    job_state_changed = Signal(object)
+    job_finished = Signal(object)
+    batch_progress = Signal(object)
+
+    def __init__(self, max_workers=2, parent=None):
+        super().__init__(parent)
+        self.max_workers = max_workers
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._batch_ids = itertools.count(1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="cellcanvas-job"
+        )
+        self._batch_executors = []
+
+    def submit(self, description, fn, *args, job_args=None, **kwargs):
+        job = Job(next(self._ids), description, job_args)
+        return self._submit(self._executor, job, fn, args, kwargs)
+
+    def _submit(self, executor, job, fn, args, kwargs):
+        self.jobs[job.job_id] = job
+        self.job_added.emit(job)
+        job.future = executor.submit(self._run, job, fn, args, kwargs)
+        job.future.add_done_callback(lambda future: self._done(job, future))
+        return job
+
+    def submit_batch(
+        self,
+        description,
+        fn,
+        items,
+        max_concurrency=4,
+        retries=2,
+        backoff=1.0,
+        retry_on=None,
+    ):
+        """Run `fn` for each (label, args, job_args) of `items`, at most
+        `max_concurrency` at a time and independently of the other jobs.
+        Failed calls are retried with exponential backoff, see `retrying`.
+        """
+        batch = Batch(next(self._batch_ids), description, max_concurrency)
+        executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix=f"cellcanvas-batch{batch.batch_id}",
+        )
+        self._batch_executors.append(executor)
+        for label, args, job_args in items:
+            job = Job(next(self._ids), f"{description} [{label}]", job_args)
+            job.batch = batch
+            batch.jobs.append(job)
+            self._submit(
+                executor,
+                job,
+                retrying(fn, job, retries, backoff, retry_on),
+                args,
+                {},
+            )
+        # Queued jobs still run, the threads exit once the batch is done
+        executor.shutdown(wait=False)
+        self.batch_progress.emit(batch)
+        return batch
+
+    def _run(self, job, fn, args, kwargs):
+        job.started_at = time.time()
+        job.state = RUNNING
+        self.job_state_changed.emit(job)
+        return fn(*args, **kwargs)
+
+    def _done(self, job, future):
+        job.finished_at = time.time()
+        try:
+            job.result = future.result()
+            # A running request cannot be interrupted, so a cancel issued
+            # while it was in flight only discards its result
+            job.state = CANCELLED if job.cancel_requested else DONE
+        except CancelledError:
+            job.state = CANCELLED
+        except Exception as e:  # noqa: BLE001
+            job.error = e
+            job.state = FAILED
+        self.job_state_changed.emit(job)
+        self.job_finished.emit(job)
+        if job.batch is not None:
+            self.batch_progress.emit(job.batch)
+
+    def cancel_batch(self, batch):
+        for job in batch.jobs:
+            self.cancel(job.job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        job.future.cancel()
+        return True
+
+    def clear_finished(self):
+        for job_id in [j.job_id for j in self.jobs.values() if j.finished]:
+            del self.jobs[job_id]
+
+    def active_jobs(self):
+        return [job for job in self.jobs.values() if not job.finished]
+
+    def shutdown(self, wait=False):
+        for executor in self._batch_executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class JobsWidget(QWidget):
+    COLUMNS = ("Job", "Solution", "State", "Time (s)")
+
+    def __init__(self, job_manager, parent=None):
+        super().__init__(parent)
+        self.job_manager = job_manager
+        self.setWindowTitle("CellCanvas Jobs")
+        self._rows = {}
+
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(
+            1, QHeaderView.Stretch
+        )
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.cancel_button = QPushButton("Cancel", self)
+        self.cancel_button.clicked.connect(self.cancel_selected)
+        buttons.addWidget(self.cancel_button)
+        self.clear_button = QPushButton("Clear Finished", self)
+        self.clear_button.clicked.connect(self.clear_finished)
+        buttons.addWidget(self.clear_button)
+        layout.addLayout(buttons)
+
+        job_manager.job_added.connect(self.add_job)
+        job_manager.job_state_changed.connect(self.update_job)
+
+    def add_job(self, job):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self._rows[job.job_id] = row
+        self.table.setItem(row, 0, QTableWidgetItem(str(job.job_id)))
+        self.table.setItem(row, 1, QTableWidgetItem(job.description))
+        self.table.setItem(row, 2, QTableWidgetItem(job.state))
+        self.table.setItem(row, 3, QTableWidgetItem(""))
+
+    def update_job(self, job):
+        row = self._rows.get(job.job_id)
+        if row is None:
+            return
+        self.table.item(row, 2).setText(job.state)
+        if job.error is not None:
+            self.table.item(row, 2).setToolTip(str(job.error))
+        if job.finished:
+            self.table.item(row, 3).setText(f"{job.elapsed():.1f}")
+
+    def selected_job_ids(self):
+        rows = {index.row() for index in self.table.selectedIndexes()}
+        return [int(self.table.item(row, 0).text()) for row in sorted(rows)]
+
+    def cancel_selected(self):
+        for job_id in self.selected_job_ids():
+            self.job_manager.cancel(job_id)
+
+    def clear_finished(self):
+        self.job_manager.clear_finished()
+        self.table.setRowCount(0)
+        self._rows = {}
+        for job in self.job_manager.jobs.values():
+            self.add_job(job)
+            self.update_job(job)
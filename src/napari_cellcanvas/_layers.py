@@ -0,0 +1,140 @@
+from collections import OrderedDict
+
+import numpy as np
+from qtpy.QtCore import QObject, QTimer
+
+# Default memory budget of all layers opened from copick
+MEMORY_BUDGET = 4 * 2**30
+
+
+def layer_stores(layer):
+    """Distinct zarr stores behind the data of a layer."""
+    levels = (
+        layer.data if getattr(layer, "multiscale", False) else [layer.data]
+    )
+    stores = {}
+    for level in levels:
+        store = getattr(level, "store", None)
+        if store is not None:
+            stores[id(store)] = store
+    return list(stores.values())
+
+
+def layer_memory(layer):
+    """Resident memory of a layer in bytes: its in-memory arrays, features
+    and the chunks cached for its zarr data."""
+    nbytes = 0
+    levels = (
+        layer.data if getattr(layer, "multiscale", False) else [layer.data]
+    )
+    for level in levels:
+        if isinstance(level, np.ndarray):
+            nbytes += level.nbytes
+    features = getattr(layer, "features", None)
+    if features is not None and len(features.columns):
+        nbytes += int(features.memory_usage(deep=True).sum())
+    for store in layer_stores(layer):
+        # Bytes held by a zarr LRUStoreCache
+        nbytes += getattr(store, "_current_size", 0)
+    return nbytes
+
+
+class LayerRegistry(QObject):
+    """Layers opened from copick objects, by key, least recently used first.
+
+    Opening an object that already has a layer selects that layer instead.
+    Above `memory_budget` bytes, chunk caches of the least recently used
+    layers are dropped first, then those layers are closed. Their pending
+    edits are flushed by `writeback` before either.
+    """
+
+    def __init__(
+        self,
+        viewer,
+        writeback,
+        memory_budget=MEMORY_BUDGET,
+        check_interval=5,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.viewer = viewer
+        self.writeback = writeback
+        self.memory_budget = memory_budget
+        self._layers = OrderedDict()
+        self._keys = {}
+
+        # Caches grow while browsing, not only when layers are opened
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.enforce_budget)
+        if memory_budget and check_interval:
+            self._timer.start(int(check_interval * 1000))
+
+    def __len__(self):
+        return len(self._layers)
+
+    def get(self, key):
+        layer = self._layers.get(key)
+        if layer is None:
+            return None
+        if layer not in self.viewer.layers:
+            self.discard(layer)
+            return None
+        self._layers.move_to_end(key)
+        return layer
+
+    def focus(self, key):
+        """Select and show the layer of `key`, if it is open."""
+        layer = self.get(key)
+        if layer is not None:
+            layer.visible = True
+            self.viewer.layers.selection.active = layer
+        return layer
+
+    def add(self, key, layer):
+        self._layers[key] = layer
+        self._layers.move_to_end(key)
+        self._keys[id(layer)] = key
+        self.enforce_budget()
+
+    def discard(self, layer):
+        key = self._keys.pop(id(layer), None)
+        if key is not None and self._layers.get(key) is layer:
+            del self._layers[key]
+
+    def memory(self):
+        return sum(layer_memory(layer) for layer in self._layers.values())
+
+    def unload(self, layer):
+        """Drop the cached chunks of a layer, returning the bytes freed.
+        Displayed chunks are read again."""
+        self.writeback.flush(layer)
+        freed = 0
+        for store in layer_stores(layer):
+            if hasattr(store, "invalidate_values"):
+                freed += getattr(store, "_current_size", 0)
+                store.invalidate_values()
+        return freed
+
+    def close(self, layer):
+        # Unregistering submits the flush of pending edits
+        self.writeback.unregister(layer)
+        self.viewer.layers.remove(layer)
+        self.discard(layer)
+
+    def enforce_budget(self):
+        if not self.memory_budget:
+            return
+        total = self.memory()
+        if total <= self.memory_budget:
+            return
+        # The most recently used layer is kept as is
+        candidates = list(self._layers.values())[:-1]
+        for layer in candidates:
+            if total <= self.memory_budget:
+                return
+            total -= self.unload(layer)
+        for layer in candidates:
+            if total <= self.memory_budget:
+                return
+            total -= layer_memory(layer)
+            self.close(layer)
@@ -0,0 +1,435 @@
+import itertools
+from functools import partial
+
+import numpy as np
+
+FEATURE_NAMES = ("pickable_object_name", "user_id", "session_id")
+# `point_index` of the points added since the last flush
+ADDED = -1
+
+
+def pick_set_coordinates(pick_set):
+    """(N, 3) array of the z, y, x locations of a pick set."""
+    points = pick_set.points or []
+    coordinates = np.fromiter(
+        itertools.chain.from_iterable(
+            (p.location.z, p.location.y, p.location.x) for p in points
+        ),
+        dtype=float,
+        count=3 * len(points),
+    )
+    return coordinates.reshape(len(points), 3)
+
+
+def pick_sets_to_points(pick_sets):
+    """Coordinates of several pick sets merged into one array, with the
+    object name, user and session of each point as features.
+
+    The `point_index` feature is the index of each point in its pick set.
+    """
+    coordinates = [pick_set_coordinates(pick_set) for pick_set in pick_sets]
+    counts = [len(c) for c in coordinates]
+    features = {
+        name: np.repeat(
+            np.array(
+                [getattr(pick_set.meta, name) for pick_set in pick_sets],
+                dtype=object,
+            ),
+            counts,
+        )
+        for name in FEATURE_NAMES
+    }
+    features["point_index"] = np.concatenate(
+        [np.arange(count, dtype=int) for count in counts] or [[]]
+    ).astype(int)
+    if coordinates:
+        coordinates = np.concatenate(coordinates)
+    else:
+        coordinates = np.empty((0, 3))
+    return coordinates, features
+
+
+def object_colors(pickable_objects, default=(255, 255, 255, 255)):
+    """Colormap from object name to RGBA in [0, 1]."""
+    return {
+        obj.name: np.array(obj.color or default) / 255.0
+        for obj in pickable_objects
+    }
+
+
+def point_sizes(object_names, pickable_objects, default=1.0):
+    """Per-point sizes from the radii of the objects, mapped in one pass
+    over the unique names."""
+    radii = {obj.name: obj.radius or default for obj in pickable_objects}
+    names, inverse = np.unique(
+        np.asarray(object_names, dtype=str), return_inverse=True
+    )
+    sizes = np.array([radii.get(name, default) for name in names], dtype=float)
+    return sizes[inverse.reshape(-1)]
+
+
+def store_new_picks(run, object_name, positions, user_id, session_id):
+    """Write (N, 3) z, y, x positions to a new pick set of `run`."""
+    from copick.models import CopickLocation, CopickPoint
+
+    pick_set = run.new_picks(
+        object_name=object_name, session_id=session_id, user_id=user_id
+    )
+    pick_set.points = [
+        CopickPoint(location=CopickLocation(x=x, y=y, z=z))
+        for z, y, x in np.asarray(positions).tolist()
+    ]
+    pick_set.store()
+    return pick_set
+
+
+class PickIndex:
+    """Pick locations with the object and radius of each point, to find
+    and merge duplicates through KD-trees of the points of each object."""
+
+    def __init__(self, coordinates, object_names, radii):
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+        self.object_names = np.asarray(object_names, dtype=str)
+        self.radii = np.asarray(radii, dtype=float)
+
+    @classmethod
+    def from_pick_sets(cls, pick_sets, pickable_objects):
+        coordinates, features = pick_sets_to_points(pick_sets)
+        names = features["pickable_object_name"]
+        return cls(coordinates, names, point_sizes(names, pickable_objects))
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def duplicate_pairs(self, scale=1.0):
+        """(K, 2) index pairs of points of the same object closer than
+        `scale` times its radius."""
+        from scipy.spatial import cKDTree
+
+        pairs = [np.empty((0, 2), dtype=int)]
+        for name in np.unique(self.object_names):
+            indices = np.flatnonzero(self.object_names == name)
+            if len(indices) < 2:
+                continue
+            tree = cKDTree(self.coordinates[indices])
+            found = tree.query_pairs(
+                scale * self.radii[indices].max(), output_type="ndarray"
+            )
+            pairs.append(indices[found])
+        return np.concatenate(pairs)
+
+    def merge_duplicates(self, scale=1.0):
+        """Replace groups of duplicate points by their mean location.
+
+        Points are grouped through chains of `duplicate_pairs`. Returns the
+        (M, 3) merged locations, their object names and the number of points
+        merged into each.
+        """
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        if not len(self):
+            return np.empty((0, 3)), self.object_names, np.empty(0, dtype=int)
+        pairs = self.duplicate_pairs(scale)
+        graph = coo_matrix(
+            (np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+            shape=(len(self), len(self)),
+        )
+        _, labels = connected_components(graph, directed=False)
+        counts = np.bincount(labels)
+        sums = np.stack(
+            [
+                np.bincount(labels, weights=self.coordinates[:, axis])
+                for axis in range(3)
+            ],
+            axis=1,
+        )
+        names = np.empty(len(counts), dtype=self.object_names.dtype)
+        names[labels] = self.object_names
+        return sums / counts[:, None], names, counts
+
+
+def _flushing_index(index):
+    """`point_index` of the added points being written, below `ADDED`, from
+    their order among those of their pick set, and back."""
+    return ADDED - 1 - index
+
+
+def _stored_index(deleted_index, count, point_index):
+    """`point_index` values once a flush deleting `deleted_index` from a
+    pick set of `count` points is stored. Points after a deleted one shift
+    down, added points are appended."""
+    point_index = np.asarray(point_index, dtype=int)
+    return np.where(
+        point_index >= 0,
+        point_index - np.searchsorted(deleted_index, point_index),
+        count - len(deleted_index) + _flushing_index(point_index),
+    )
+
+
+def pick_set_key(pick_set):
+    return tuple(getattr(pick_set.meta, name) for name in FEATURE_NAMES)
+
+
+class PicksLayerLink:
+    """Links a points layer to the pick sets it shows, recording edits as a
+    diff against them.
+
+    Moved and deleted points are tracked through the layer's data events,
+    added points are the rows without a `point_index`. Flushing applies
+    only the diff to the loaded points of the affected pick sets, though
+    copick stores each of them whole.
+
+    Points are renumbered as stored once the write succeeded. Until then,
+    added points being written have a `point_index` below -1, and a failed
+    write leaves its edits unsaved.
+
+    Large layers can hold only the points of a slab along Z with
+    `show_slab`, the others are kept aside and are part of the flushes.
+    """
+
+    def __init__(self, layer, pick_sets, run):
+        self.layer = layer
+        self.run = run
+        self.pick_sets = {
+            pick_set_key(pick_set): pick_set for pick_set in pick_sets
+        }
+        self.moved = set()
+        self.deleted = set()
+        # Plan of the flush being written, and the keys it stored
+        self._flushing = None
+        # Data, features and sizes of the points outside the slab
+        self.hidden = None
+        self.slab = None
+
+        if pick_sets:
+            defaults = dict(zip(FEATURE_NAMES, pick_set_key(pick_sets[0])))
+            defaults["point_index"] = ADDED
+            layer.feature_defaults = defaults
+        layer.events.data.connect(self.on_data)
+
+    def _row_keys(self, rows):
+        features = self.layer.features
+        columns = [features[name].to_numpy()[rows] for name in FEATURE_NAMES]
+        point_index = features["point_index"].to_numpy()[rows]
+        return [
+            (key, int(index))
+            for *key, index in zip(*columns, point_index)
+            if index != ADDED
+        ]
+
+    def on_data(self, event):
+        rows = np.asarray(list(event.data_indices or ()), dtype=int)
+        if not len(rows):
+            return
+        # Rows are still present while they are being removed
+        if event.action == "removing":
+            self.deleted.update(
+                (tuple(key), index) for key, index in self._row_keys(rows)
+            )
+        elif event.action == "changed":
+            self.moved.update(
+                (tuple(key), index) for key, index in self._row_keys(rows)
+            )
+        elif event.action == "added":
+            # napari copies the features of the selected point to new ones
+            point_index = self.layer.features["point_index"].to_numpy().copy()
+            point_index[rows] = ADDED
+            self.layer.features["point_index"] = point_index
+
+    def _rows(self):
+        """Data, features and sizes of all points, those of the layer
+        first."""
+        data = np.asarray(self.layer.data)
+        features = self.layer.features
+        sizes = np.asarray(self.layer.size)
+        if self.hidden is None:
+            return data, features, sizes
+        import pandas as pd
+
+        hidden_data, hidden_features, hidden_sizes = self.hidden
+        return (
+            np.concatenate([data, hidden_data]),
+            pd.concat([features, hidden_features], ignore_index=True),
+            np.concatenate([sizes, hidden_sizes]),
+        )
+
+    def _set_point_index(self, point_index):
+        count = len(self.layer.data)
+        self.layer.features["point_index"] = point_index[:count]
+        if self.hidden is not None:
+            self.hidden[1]["point_index"] = point_index[count:]
+
+    def show_slab(self, low=None, high=None, axis=0):
+        """Keep in the layer only the points from `low` to `high` along
+        `axis`, or all points without bounds.
+
+        The layer's data is replaced without data events, which would
+        otherwise be recorded as edits. The selection is cleared.
+        """
+        data, features, sizes = self._rows()
+        if low is None:
+            mask = np.ones(len(data), dtype=bool)
+        else:
+            mask = (data[:, axis] >= low) & (data[:, axis] <= high)
+        self.slab = None if low is None else (low, high)
+        self.hidden = None
+        if not mask.all():
+            self.hidden = (
+                data[~mask],
+                features[~mask].reset_index(drop=True),
+                sizes[~mask],
+            )
+        layer = self.layer
+        layer.selected_data = set()
+        with layer.events.data.blocker():
+            layer.data = data[mask]
+            layer.features = features[mask].reset_index(drop=True)
+            layer.size = sizes[mask]
+        layer.refresh_colors()
+
+    @property
+    def dirty_count(self):
+        added = int((self.layer.features["point_index"].to_numpy() < 0).sum())
+        if self.hidden is not None:
+            added += int((self.hidden[1]["point_index"].to_numpy() < 0).sum())
+        return len(self.moved) + len(self.deleted) + added
+
+    def prepare_flush(self):
+        """Snapshot the diff on the main thread and mark the added points
+        it writes. Returns the function that writes the diff, to be run in
+        the background, after which `finish_flush` is called."""
+        data, features, _ = self._rows()
+        point_index = features["point_index"].to_numpy().astype(int)
+        columns = [features[name].to_numpy() for name in FEATURE_NAMES]
+        moved, self.moved = self.moved, set()
+        deleted, self.deleted = self.deleted, set()
+
+        added_rows = np.flatnonzero(point_index == ADDED)
+        keys = {key for key, _ in moved | deleted}
+        keys |= {
+            tuple(column[row] for column in columns) for row in added_rows
+        }
+
+        plan = {}
+        flush_index = point_index.copy()
+        for key in keys:
+            mask = np.ones(len(point_index), dtype=bool)
+            for column, value in zip(columns, key):
+                mask &= column == value
+            rows = np.flatnonzero(mask)
+            kept = rows[point_index[rows] >= 0]
+            added = rows[point_index[rows] < 0]
+
+            deleted_index = np.array(
+                sorted(index for k, index in deleted if k == key), dtype=int
+            )
+            moved_index = {index for k, index in moved if k == key} - set(
+                deleted_index.tolist()
+            )
+            moved_rows = kept[np.isin(point_index[kept], list(moved_index))]
+
+            # Added points are appended, in this order
+            flush_index[added] = _flushing_index(np.arange(len(added)))
+            pick_set = self.pick_sets.get(key)
+            plan[key] = (
+                deleted_index,
+                dict(zip(point_index[moved_rows].tolist(), data[moved_rows])),
+                data[added],
+                len(pick_set.meta.points or []) if pick_set else 0,
+            )
+
+        self._set_point_index(flush_index)
+        stored = []
+        self._flushing = (plan, stored)
+        return partial(self.flush, plan, stored)
+
+    def flush(self, plan, stored, progress=None):
+        """Store the pick sets changed by `plan`, appending their keys to
+        `stored` as they are written. Runs in the background."""
+        from copick.models import CopickLocation, CopickPoint
+
+        for i, (key, (deleted_index, moved, added, _)) in enumerate(
+            plan.items(), 1
+        ):
+            pick_set = self.pick_sets.get(key)
+            if pick_set is None:
+                object_name, user_id, session_id = key
+                pick_set = self.run.new_picks(
+                    object_name=object_name,
+                    session_id=session_id,
+                    user_id=user_id,
+                )
+                self.pick_sets[key] = pick_set
+
+            previous = pick_set.meta.points
+            points = list(previous or [])
+            # Moved indices refer to the points before deletion. The loaded
+            # points are left as they are until stored
+            for index, (z, y, x) in moved.items():
+                points[index] = points[index].model_copy(
+                    update={"location": CopickLocation(x=x, y=y, z=z)}
+                )
+            if len(deleted_index):
+                drop = set(deleted_index.tolist())
+                points = [p for j, p in enumerate(points) if j not in drop]
+            points.extend(
+                CopickPoint(location=CopickLocation(x=x, y=y, z=z))
+                for z, y, x in added
+            )
+            # copick writes the whole pick set
+            pick_set.points = points
+            try:
+                pick_set.store()
+            except BaseException:
+                pick_set.points = previous
+                raise
+            stored.append(key)
+            if progress is not None:
+                progress(i, len(plan))
+        return len(plan)
+
+    def finish_flush(self, error=None):
+        """Renumber the points of the pick sets the last flush stored, on
+        the main thread. Edits of those it failed to store are unsaved
+        again."""
+        if self._flushing is None:
+            return
+        plan, stored = self._flushing
+        self._flushing = None
+        _, features, _ = self._rows()
+        point_index = features["point_index"].to_numpy().astype(int)
+        columns = [features[name].to_numpy() for name in FEATURE_NAMES]
+        moved, deleted = self.moved, self.deleted
+        for key, (deleted_index, plan_moved, _, count) in plan.items():
+            mask = np.ones(len(point_index), dtype=bool)
+            for column, value in zip(columns, key):
+                mask &= column == value
+            rows = np.flatnonzero(mask)
+            flushing = rows[point_index[rows] < ADDED]
+            if key not in stored:
+                # Points added before the flush are still added, the edits
+                # it wrote are unsaved again
+                point_index[flushing] = ADDED
+                moved = {(k, i) for k, i in moved if k != key or i >= 0}
+                deleted = {(k, i) for k, i in deleted if k != key or i >= 0}
+                moved |= {(key, index) for index in plan_moved}
+                deleted |= {(key, int(index)) for index in deleted_index}
+                continue
+
+            renumber = partial(_stored_index, deleted_index, count)
+            point_index[rows] = np.where(
+                point_index[rows] == ADDED,
+                ADDED,
+                renumber(point_index[rows]),
+            )
+            # Edits made while flushing
+            moved = {
+                (k, int(renumber(i))) if k == key else (k, i) for k, i in moved
+            }
+            deleted = {
+                (k, int(renumber(i))) if k == key else (k, i)
+                for k, i in deleted
+            }
+        self.moved, self.deleted = moved, deleted
+        self._set_point_index(point_index)
@@ -0,0 +1,196 @@
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, np.inf)
+
+
+def timed(name=None, category="widget"):
+    """Decorator timing a method with the `profiler` of its instance."""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.span(name or method.__name__, category):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class OperationStats:
+    def __init__(self, category, max_samples=10000):
+        self.category = category
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.histogram = [0] * len(BUCKETS_MS)
+        # Recent durations, for percentiles
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, duration, nbytes=0):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.bytes += nbytes
+        self.histogram[bisect_left(BUCKETS_MS, duration * 1000)] += 1
+        self.samples.append(duration)
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        return float(np.percentile(self.samples, q))
+
+    def to_dict(self):
+        return {
+            "category": self.category,
+            "count": self.count,
+            "total_s": self.total,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.percentile(50),
+            "p95_ms": 1000 * self.percentile(95),
+            "max_ms": 1000 * self.max,
+            "bytes": self.bytes,
+            "histogram_ms": dict(
+                zip([str(b) for b in BUCKETS_MS], self.histogram)
+            ),
+        }
+
+
+class Span:
+    __slots__ = ("name", "category", "args", "bytes")
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.bytes = 0
+
+
+class Profiler:
+    """Opt-in timings and byte counts of widget operations.
+
+    Operations are timed with `span`, which is a no-op unless the profiler
+    is enabled. Durations are aggregated per operation into histograms and
+    kept as events that can be exported as a Chrome trace, to be opened in
+    chrome://tracing or Perfetto. Enabled by default when the
+    CELLCANVAS_PROFILE environment variable is set.
+    """
+
+    def __init__(self, enabled=None, max_events=100000):
+        if enabled is None:
+            enabled = bool(os.environ.get("CELLCANVAS_PROFILE"))
+        self.enabled = enabled
+        self.events = deque(maxlen=max_events)
+        self.operations = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, category="widget", **args):
+        span = Span(name, category, args)
+        if not self.enabled:
+            yield span
+            return
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.add(
+                span.name,
+                span.category,
+                start,
+                time.perf_counter(),
+                span.bytes,
+                **span.args,
+            )
+
+    def add(self, name, category, start, end, nbytes=0, **args):
+        """Record an operation timed with `time.perf_counter`."""
+        if not self.enabled:
+            return
+        if nbytes:
+            args["bytes"] = nbytes
+        with self._lock:
+            stats = self.operations.get(name)
+            if stats is None:
+                stats = self.operations[name] = OperationStats(category)
+            stats.add(end - start, nbytes)
+            self.events.append(
+                (
+                    name,
+                    category,
+                    start,
+                    end,
+                    threading.get_ident(),
+                    threading.current_thread().name,
+                    args,
+                )
+            )
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.operations.clear()
+            self._origin = time.perf_counter()
+
+    def summary(self):
+        with self._lock:
+            return {
+                name: stats.to_dict()
+                for name, stats in sorted(self.operations.items())
+            }
+
+    def chrome_trace(self):
+        with self._lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = [
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": {k: str(v) for k, v in args.items()},
+            }
+            for name, category, start, end, tid, _, args in events
+        ]
+        threads = {tid: thread for _, _, _, _, tid, thread, _ in events}
+        trace += [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": thread},
+            }
+            for tid, thread in threads.items()
+        ]
+        return {
+            "traceEvents": trace,
+            "displayTimeUnit": "ms",
+            "otherData": {"summary": self.summary()},
+        }
+
+    def export_trace(self, path):
+        """Write the events as a Chrome trace, with the per-operation
+        summary under `otherData`."""
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def export_summary(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
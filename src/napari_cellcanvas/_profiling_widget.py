@@ -0,0 +1,115 @@
+from qtpy.QtCore import QTimer
+from qtpy.QtWidgets import (
+    QCheckBox,
+    QFileDialog,
+    QHBoxLayout,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+    QWidget,
+)
+
+from ._profiling import BUCKETS_MS
+
+COLUMNS = (
+    "Operation",
+    "Category",
+    "Count",
+    "Mean (ms)",
+    "p50 (ms)",
+    "p95 (ms)",
+    "Max (ms)",
+    "Bytes",
+    "Histogram",
+)
+
+BARS = " ▁▂▃▄▅▆▇█"
+
+
+def format_bytes(nbytes):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TiB"
+
+
+def sparkline(histogram):
+    peak = max(histogram) or 1
+    return "".join(
+        BARS[round(count / peak * (len(BARS) - 1))] for count in histogram
+    )
+
+
+class ProfilerWidget(QWidget):
+    """Per-operation latency statistics of a profiler, refreshed while
+    shown."""
+
+    def __init__(self, profiler, parent=None):
+        super().__init__(parent)
+        self.profiler = profiler
+
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, len(COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeaderItem(len(COLUMNS) - 1).setToolTip(
+            "Latency buckets up to "
+            + ", ".join(f"{b} ms" for b in BUCKETS_MS[:-1])
+            + " and above"
+        )
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.enabled_checkbox = QCheckBox("Record", self)
+        self.enabled_checkbox.setChecked(profiler.enabled)
+        self.enabled_checkbox.toggled.connect(self.set_enabled)
+        buttons.addWidget(self.enabled_checkbox)
+        self.reset_button = QPushButton("Reset", self)
+        self.reset_button.clicked.connect(self.reset)
+        buttons.addWidget(self.reset_button)
+        self.export_button = QPushButton("Export Trace…", self)
+        self.export_button.clicked.connect(self.export_trace)
+        buttons.addWidget(self.export_button)
+        layout.addLayout(buttons)
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.update_table)
+        self._timer.start(1000)
+
+    def set_enabled(self, enabled):
+        self.profiler.enabled = enabled
+
+    def reset(self):
+        self.profiler.reset()
+        self.update_table()
+
+    def update_table(self):
+        if not self.isVisible():
+            return
+        summary = self.profiler.summary()
+        self.table.setRowCount(len(summary))
+        for row, (name, stats) in enumerate(summary.items()):
+            values = (
+                name,
+                stats["category"],
+                str(stats["count"]),
+                f"{stats['mean_ms']:.1f}",
+                f"{stats['p50_ms']:.1f}",
+                f"{stats['p95_ms']:.1f}",
+                f"{stats['max_ms']:.1f}",
+                format_bytes(stats["bytes"]) if stats["bytes"] else "",
+                sparkline(list(stats["histogram_ms"].values())),
+            )
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Trace", "cellcanvas-trace.json", "JSON (*.json)"
+        )
+        if path:
+            try:
+                self.profiler.export_trace(path)
+            except OSError as e:
+                print(f"Error exporting trace: {e}")
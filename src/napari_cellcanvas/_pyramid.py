@@ -0,0 +1,264 @@
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from ._zarr import read_multiscales, reopen_array
+
+FACTOR = 2
+# Updates of at most this many chunks per level are computed in-process
+INPROCESS_CHUNKS = 8
+
+
+def downsample_mode(block, factor=FACTOR):
+    """Downsample a label block to the most frequent label of each
+    `factor`**3 window.
+
+    Ties go to the larger label, so that thin painted structures are not
+    lost to the background. Blocks are padded at the upper border by
+    repeating the edge.
+    """
+    shape = [-(-size // factor) * factor for size in block.shape]
+    block = np.pad(
+        block,
+        [(0, padded - size) for size, padded in zip(block.shape, shape)],
+        mode="edge",
+    )
+    # One strided view per voxel offset in the windows, compared in the
+    # label dtype, so that only a few arrays of the downsampled size are
+    # allocated
+    views = [
+        block[tuple(slice(o, None, factor) for o in offset)]
+        for offset in itertools.product(range(factor), repeat=block.ndim)
+    ]
+    best = views[0].copy()
+    best_count = np.zeros(best.shape, dtype=np.uint16)
+    count = np.empty_like(best_count)
+    for view in views:
+        count[...] = 0
+        for other in views:
+            count += view == other
+        better = (count > best_count) | ((count == best_count) & (view > best))
+        np.copyto(best, view, where=better)
+        np.copyto(best_count, count, where=better)
+    return best
+
+
+def base_level(group):
+    """Path, scale and translation of the full resolution labels."""
+    levels = read_multiscales(group)
+    if levels:
+        return levels[0]
+    for path in ("data", "0"):
+        if path in group:
+            return path, None, None
+    raise ValueError(f"No label array found in zarr group {group.store}")
+
+
+def level_paths(group):
+    levels = read_multiscales(group)
+    return (
+        [path for path, _, _ in levels] if levels else [base_level(group)[0]]
+    )
+
+
+def has_pyramid(group):
+    return len(level_paths(group)) > 1
+
+
+def chunk_regions(array, keys):
+    """Voxel boxes of the chunks of `array` among the store `keys`, as
+    (start, stop) tuples."""
+    prefix = f"{array.path}/" if array.path else ""
+    separator = array._dimension_separator or "."
+    regions = []
+    for key in keys:
+        if not key.startswith(prefix):
+            continue
+        coords = key[len(prefix) :].split(separator)
+        if len(coords) != array.ndim or not all(c.isdigit() for c in coords):
+            continue
+        start = tuple(int(c) * s for c, s in zip(coords, array.chunks))
+        stop = tuple(
+            min(b + s, size)
+            for b, s, size in zip(start, array.chunks, array.shape)
+        )
+        regions.append((start, stop))
+    return regions
+
+
+def _downsample_region(region, factor=FACTOR):
+    start, stop = region
+    return (
+        tuple(b // factor for b in start),
+        tuple(-(-e // factor) for e in stop),
+    )
+
+
+def _chunks_in(array, regions):
+    chunks = set()
+    for start, stop in regions:
+        ranges = [
+            range(b // c, -(-min(e, size) // c))
+            for b, e, c, size in zip(start, stop, array.chunks, array.shape)
+        ]
+        chunks.update(itertools.product(*ranges))
+    return sorted(chunks)
+
+
+def downsample_chunk(source, target, chunk, factor=FACTOR):
+    """Compute one chunk of `target` from `source`. Runs in worker
+    threads or processes, to which the arrays are pickled with their
+    stores."""
+    selection = tuple(
+        slice(c * size, min((c + 1) * size, shape))
+        for c, size, shape in zip(chunk, target.chunks, target.shape)
+    )
+    block = source[
+        tuple(
+            slice(s.start * factor, min(s.stop * factor, shape))
+            for s, shape in zip(selection, source.shape)
+        )
+    ]
+    target[selection] = downsample_mode(block, factor)
+    return chunk
+
+
+def _executor(max_workers, processes):
+    if processes:
+        # Forking would copy the locks held by the caller's other threads
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="cellcanvas-pyramid"
+    )
+
+
+def _multiscales_metadata(paths, scale, translation, name):
+    datasets = []
+    for i, path in enumerate(paths):
+        factor = FACTOR**i
+        datasets.append(
+            {
+                "path": path,
+                "coordinateTransformations": [
+                    {"type": "scale", "scale": [s * factor for s in scale]},
+                    {
+                        "type": "translation",
+                        "translation": [
+                            t + s * (factor - 1) / 2
+                            for s, t in zip(scale, translation)
+                        ],
+                    },
+                ],
+            }
+        )
+    return [
+        {
+            "version": "0.4",
+            "name": name,
+            "axes": [
+                {"name": axis, "type": "space", "unit": "angstrom"}
+                for axis in "zyx"
+            ],
+            "datasets": datasets,
+        }
+    ]
+
+
+def build_label_pyramid(
+    group,
+    voxel_size,
+    regions=None,
+    max_workers=None,
+    progress=None,
+):
+    """Build the mode-downsampled levels of a label group, or update them.
+
+    Levels are halved until they fit in one chunk and written as OME-Zarr
+    multiscales next to the full resolution array. With `regions`, a list
+    of (start, stop) voxel boxes of the full resolution labels that
+    changed, only the chunks of the existing levels covering them are
+    recomputed.
+
+    Chunks of a level are computed in parallel: in worker processes for a
+    full build, started once and spawned rather than forked from the
+    threaded caller, and in threads for an update, unless it covers only a
+    few chunks. `max_workers=0` computes them all in this process. Returns
+    the paths of the levels.
+    """
+    path, scale, translation = base_level(group)
+    if scale is None:
+        scale, translation = [voxel_size] * 3, [0.0] * 3
+    source = group[path]
+
+    processes = regions is None
+    if processes:
+        paths = [path]
+        shape = source.shape
+        while max(shape) > max(source.chunks):
+            shape = tuple(-(-size // FACTOR) for size in shape)
+            level_path = str(len(paths))
+            if level_path == path:
+                level_path = f"{path}_{len(paths)}"
+            group.create_dataset(
+                level_path,
+                shape=shape,
+                dtype=source.dtype,
+                chunks=source.chunks,
+                fill_value=0,
+                compressor=source.compressor,
+                write_empty_chunks=False,
+                overwrite=True,
+            )
+            paths.append(level_path)
+        # Every chunk of every level
+        regions = [((0, 0, 0), source.shape)]
+    else:
+        paths = level_paths(group)
+        if len(paths) < 2:
+            return paths
+
+    # The option is not stored in the array metadata, levels would
+    # otherwise be written with a chunk per all-zero window
+    arrays = [
+        reopen_array(group[level_path], write_empty_chunks=False)
+        for level_path in paths
+    ]
+    executor = None
+    try:
+        for level, (source, target) in enumerate(zip(arrays, arrays[1:]), 1):
+            regions = [_downsample_region(region) for region in regions]
+            # Coarser levels depend on the finer ones, only chunks of one
+            # level are computed concurrently
+            chunks = _chunks_in(target, regions)
+            if max_workers == 0 or (
+                not processes and len(chunks) <= INPROCESS_CHUNKS
+            ):
+                for chunk in chunks:
+                    downsample_chunk(source, target, chunk)
+            elif chunks:
+                if executor is None:
+                    executor = _executor(max_workers, processes)
+                list(
+                    executor.map(
+                        partial(downsample_chunk, source, target), chunks
+                    )
+                )
+            if progress is not None:
+                progress(level, len(arrays) - 1)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if read_multiscales(group) is None or len(level_paths(group)) != len(
+        paths
+    ):
+        group.attrs["multiscales"] = _multiscales_metadata(
+            paths, scale, translation, group.name
+        )
+    return paths
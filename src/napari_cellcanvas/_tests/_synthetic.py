@@ -0,0 +1,263 @@
+"""Synthetic copick projects and a stand-in CellCanvas server."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import copick
+import numpy as np
+import zarr
+from qtpy.QtCore import QThreadPool
+
+from .._zarr import create_label_array
+
+PICKABLE_OBJECTS = [
+    {
+        "name": "ribosome",
+        "is_particle": True,
+        "label": 1,
+        "color": [255, 0, 0, 255],
+        "radius": 60,
+    },
+    {
+        "name": "membrane",
+        "is_particle": False,
+        "label": 2,
+        "color": [0, 255, 0, 255],
+        "radius": 10,
+    },
+]
+
+
+def write_multiscale(group, data, voxel_size, levels, chunks):
+    """Write `data` and its power-of-two downsamplings as OME-Zarr."""
+    datasets = []
+    for level in range(levels):
+        factor = 2**level
+        group.create_dataset(
+            str(level),
+            data=data[::factor, ::factor, ::factor],
+            chunks=chunks,
+            overwrite=True,
+        )
+        datasets.append(
+            {
+                "path": str(level),
+                "coordinateTransformations": [
+                    {"type": "scale", "scale": [voxel_size * factor] * 3},
+                    {
+                        "type": "translation",
+                        "translation": [voxel_size * (factor - 1) / 2] * 3,
+                    },
+                ],
+            }
+        )
+    group.attrs["multiscales"] = [
+        {
+            "version": "0.4",
+            "axes": [
+                {"name": axis, "type": "space", "unit": "angstrom"}
+                for axis in "zyx"
+            ],
+            "datasets": datasets,
+        }
+    ]
+
+
+def make_project(
+    path,
+    runs=10,
+    voxel_spacings=1,
+    tomograms=1,
+    features=1,
+    segmentations=1,
+    pick_sets=2,
+    points=100,
+    shape=(64, 64, 64),
+    chunks=(32, 32, 32),
+    levels=2,
+    seed=0,
+):
+    """Create a local copick project of `runs` runs with `voxel_spacings`
+    voxel spacings each, holding `tomograms` tomograms of `shape` with
+    `features` feature maps each and `segmentations` segmentations. Each
+    run gets `pick_sets` pick sets of `points` points.
+
+    Returns the path of the project configuration.
+    """
+    path = Path(path)
+    (path / "overlay").mkdir(parents=True, exist_ok=True)
+    (path / "static").mkdir(parents=True, exist_ok=True)
+    config = {
+        "config_type": "filesystem",
+        "name": "synthetic",
+        "description": "Synthetic project for benchmarks",
+        "version": "0.5.0",
+        "pickable_objects": PICKABLE_OBJECTS,
+        "overlay_root": f"local://{path / 'overlay'}",
+        "static_root": f"local://{path / 'static'}",
+        "overlay_fs_args": {"auto_mkdir": True},
+    }
+    config_path = path / "config.json"
+    config_path.write_text(json.dumps(config))
+
+    rng = np.random.default_rng(seed)
+    tomogram_data = rng.random(shape, dtype=np.float32)
+    root = copick.from_file(str(config_path))
+    for r in range(runs):
+        run = root.new_run(f"TS_{r:04d}")
+        for v in range(voxel_spacings):
+            voxel_size = 10.0 * (v + 1)
+            voxel_spacing = run.new_voxel_spacing(voxel_size)
+            for t in range(tomograms):
+                tomogram = voxel_spacing.new_tomogram(f"tomo{t}")
+                write_multiscale(
+                    zarr.open(tomogram.zarr(), "w"),
+                    tomogram_data,
+                    voxel_size,
+                    levels,
+                    chunks,
+                )
+                for f in range(features):
+                    feature = tomogram.new_features(f"feature{f}")
+                    zarr.open(feature.zarr(), "w").create_dataset(
+                        "0",
+                        data=np.stack([tomogram_data] * 2),
+                        chunks=(2, *chunks),
+                    )
+            for s in range(segmentations):
+                segmentation = run.new_segmentation(
+                    voxel_size=voxel_size,
+                    name=f"segmentation{s}",
+                    session_id="0",
+                    is_multilabel=True,
+                    user_id="benchmark",
+                )
+                labels = create_label_array(
+                    zarr.open(segmentation.zarr(), "w"),
+                    "data",
+                    shape,
+                    dtype="uint8",
+                    chunks=chunks,
+                )
+                labels[: shape[0] // 4] = 1
+        for p in range(pick_sets):
+            pick_set = run.new_picks(
+                PICKABLE_OBJECTS[p % len(PICKABLE_OBJECTS)]["name"],
+                str(p // len(PICKABLE_OBJECTS)),
+                "benchmark",
+            )
+            pick_set.from_numpy(rng.random((points, 3)) * np.array(shape))
+    return str(config_path)
+
+
+def wait_for_workers(qtbot):
+    # Background listings must not outlive the widget they report to
+    pool = QThreadPool.globalInstance()
+    qtbot.waitUntil(lambda: pool.activeThreadCount() == 0, timeout=60000)
+
+
+def load_widget(qtbot, widget):
+    """Load the project and catalog of a widget that is not shown."""
+    widget.start_loading()
+    qtbot.waitUntil(lambda: widget.index is not None, timeout=60000)
+    qtbot.waitUntil(
+        lambda: bool(widget.solution_dropdown.count()), timeout=60000
+    )
+    wait_for_workers(qtbot)
+
+
+SOLUTION_ARGS = [
+    "copick_config_path",
+    "run_name",
+    "voxel_spacing",
+    "tomo_type",
+    "feature_types",
+    "painting_segmentation_names",
+    "user_id",
+    "session_id",
+    "model_path",
+]
+
+
+class MockCellCanvasServer:
+    """Serves `/index`, `/info`, `/models` and `/run` like the CellCanvas
+    server, from a background thread. `latency` seconds are added to every
+    response."""
+
+    def __init__(self, solutions=10, models=5, latency=0.0):
+        self.latency = latency
+        self.requests = []
+        self.solutions = {
+            f"cellcanvas:benchmark:solution{i}:0.0.1": {
+                "catalog": "cellcanvas",
+                "group": "benchmark",
+                "name": f"solution{i}",
+                "version": "0.0.1",
+            }
+            for i in range(solutions)
+        }
+        self.models = [f"model{i}" for i in range(models)]
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True
+        )
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, payload, status=200):
+                time.sleep(server.latency)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server.requests.append(("GET", self.path))
+                if self.path == "/index":
+                    self.reply({"index": server.solutions})
+                elif self.path.startswith("/info/"):
+                    args = [{"name": name} for name in SOLUTION_ARGS]
+                    self.reply({"info": {"args": args}})
+                elif self.path == "/models":
+                    self.reply({"models": server.models})
+                else:
+                    self.reply({"error": "not found"}, 404)
+
+            def do_POST(self):
+                server.requests.append(("POST", self.path))
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.startswith("/run/"):
+                    self.reply({"result": "ok", "args": payload.get("args")})
+                else:
+                    self.reply({"error": "not found"}, 404)
+
+        return Handler
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
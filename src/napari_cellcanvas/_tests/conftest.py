@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from ._synthetic import (
+    MockCellCanvasServer,
+    load_widget,
+    make_project,
+    wait_for_workers,
+)
+
+
+def _shape():
+    size = int(os.environ.get("CELLCANVAS_BENCHMARK_SIZE", 128))
+    return (size, size, size)
+
+
+@pytest.fixture(scope="session")
+def synthetic_project(tmp_path_factory):
+    """Project size is set with the CELLCANVAS_BENCHMARK_RUNS and
+    CELLCANVAS_BENCHMARK_SIZE environment variables."""
+    return make_project(
+        tmp_path_factory.mktemp("project"),
+        runs=int(os.environ.get("CELLCANVAS_BENCHMARK_RUNS", 50)),
+        voxel_spacings=2,
+        tomograms=2,
+        features=1,
+        segmentations=2,
+        pick_sets=4,
+        points=500,
+        shape=_shape(),
+    )
+
+
+@pytest.fixture
+def small_project(tmp_path):
+    """Project of a few small runs, for tests that modify it."""
+    return make_project(
+        tmp_path / "project",
+        runs=2,
+        segmentations=1,
+        pick_sets=2,
+        points=20,
+        shape=(32, 32, 32),
+        chunks=(16, 16, 16),
+    )
+
+
+@pytest.fixture
+def gl_context(qapp):
+    """Skips tests that draw image layers when vispy gets no OpenGL
+    context, as on headless CI runners."""
+    from napari._vispy.utils.gl import get_gl_extensions
+
+    try:
+        get_gl_extensions()
+    except AttributeError:
+        # glGetString returned None
+        pytest.skip("No OpenGL context")
+
+
+@pytest.fixture(scope="session")
+def mock_server():
+    with MockCellCanvasServer() as server:
+        yield server
+
+
+@pytest.fixture
+def cellcanvas_widget(
+    qtbot, make_napari_viewer, synthetic_project, mock_server, tmp_path
+):
+    from napari_cellcanvas import CellCanvasWidget
+
+    viewer = make_napari_viewer()
+    widget = CellCanvasWidget(
+        viewer=viewer,
+        copick_config_path=synthetic_project,
+        port=mock_server.port,
+        flush_interval=0,
+        stats_cache_path=str(tmp_path / "contrast.json"),
+        disk_cache_path=str(tmp_path / "chunks"),
+    )
+    load_widget(qtbot, widget)
+    yield widget
+    wait_for_workers(qtbot)
+    widget.close()
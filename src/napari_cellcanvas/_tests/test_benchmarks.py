@@ -0,0 +1,345 @@
+"""Benchmarks of the widget against a synthetic project.
+
+Run with `tox -e benchmark`. On pull requests, CI compares them against
+the baseline recorded on main and fails on regressions.
+"""
+
+import itertools
+from functools import partial
+
+import pytest
+from qtpy.QtWidgets import QWidget
+
+from napari_cellcanvas._index import ProjectIndex
+
+from ._synthetic import load_widget, wait_for_workers
+
+pytest.importorskip("pytest_benchmark")
+
+ROUNDS = 5
+
+
+def first_run(widget):
+    return widget.index.get_run(widget.index.run_names()[0])
+
+
+def first_tomogram(widget):
+    run_name = widget.index.run_names()[0]
+    return widget.index.tomograms(run_name)[0]
+
+
+def wait_for_expansion(qtbot, widget):
+    qtbot.waitUntil(lambda: not widget._expansion_workers, timeout=60000)
+
+
+def test_widget_construction(
+    benchmark, qtbot, make_napari_viewer, synthetic_project, mock_server
+):
+    from napari_cellcanvas import CellCanvasWidget
+
+    viewer = make_napari_viewer()
+    widgets = []
+
+    def construct():
+        widget = CellCanvasWidget(
+            viewer=viewer,
+            copick_config_path=synthetic_project,
+            port=mock_server.port,
+            flush_interval=0,
+        )
+        widgets.append(widget)
+
+    benchmark.pedantic(construct, rounds=ROUNDS, warmup_rounds=1)
+    wait_for_workers(qtbot)
+    for widget in widgets:
+        widget.close()
+
+
+def test_project_loading(
+    benchmark, qtbot, make_napari_viewer, synthetic_project, mock_server
+):
+    from napari_cellcanvas import CellCanvasWidget
+
+    viewer = make_napari_viewer()
+    widgets = []
+
+    def setup():
+        widget = CellCanvasWidget(
+            viewer=viewer,
+            copick_config_path=synthetic_project,
+            port=mock_server.port,
+            flush_interval=0,
+        )
+        widgets.append(widget)
+        return (qtbot, widget), {}
+
+    benchmark.pedantic(load_widget, setup=setup, rounds=ROUNDS)
+    for widget in widgets:
+        widget.close()
+
+
+def test_populate_tree(benchmark, cellcanvas_widget):
+    benchmark(cellcanvas_widget.populate_tree)
+
+
+def test_expand_run(benchmark, qtbot, cellcanvas_widget):
+    widget = cellcanvas_widget
+
+    def setup():
+        # A cold index, so that the run is listed from storage
+        widget.index = ProjectIndex(widget.root)
+        widget.populate_tree()
+        index = widget.tree_model.index(0, 0)
+        return (index,), {}
+
+    def expand(index):
+        widget.tree_model.fetchMore(index)
+        wait_for_expansion(qtbot, widget)
+
+    benchmark.pedantic(expand, setup=setup, rounds=ROUNDS, warmup_rounds=1)
+
+
+@pytest.mark.usefixtures("gl_context")
+def test_load_tomogram(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    tomogram = first_tomogram(widget)
+    benchmark.pedantic(
+        widget.load_tomogram,
+        args=(tomogram,),
+        setup=widget.viewer.layers.clear,
+        rounds=ROUNDS,
+        warmup_rounds=1,
+    )
+
+
+@pytest.mark.usefixtures("gl_context")
+def test_reopen_tomogram(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    tomogram = first_tomogram(widget)
+    layer = widget.load_tomogram(tomogram)
+    assert benchmark(widget.load_tomogram, tomogram) is layer
+    assert len(widget.viewer.layers) == 1
+
+
+def test_compute_stats(benchmark, cellcanvas_widget):
+    import zarr
+
+    from napari_cellcanvas._contrast import compute_stats
+    from napari_cellcanvas._zarr import lazy_levels
+
+    tomogram = first_tomogram(cellcanvas_widget)
+    data, _, _ = lazy_levels(
+        zarr.open(tomogram.zarr(), "r"), tomogram.voxel_spacing.meta.voxel_size
+    )
+    stats = benchmark(compute_stats, data[-1])
+    assert stats.contrast_limits[0] < stats.contrast_limits[1]
+
+
+def test_disk_cache_read(benchmark, tmp_path):
+    import numpy as np
+    import zarr
+
+    from napari_cellcanvas._diskcache import DiskChunkCache
+    from napari_cellcanvas._zarr import DiskCacheStore, warm_cache
+
+    remote = zarr.MemoryStore()
+    expected = np.arange(128**3, dtype="uint16").reshape((128,) * 3)
+    zarr.array(expected, chunks=(32,) * 3, store=remote)
+    cache = DiskChunkCache(str(tmp_path / "chunks"))
+    assert warm_cache(DiskCacheStore(remote, cache, "memory://bench")) == 64
+
+    # A later session reads the chunks from the cache only
+    for key in [key for key in remote if key != ".zarray"]:
+        del remote[key]
+    array = zarr.open(DiskCacheStore(remote, cache, "memory://bench"), "r")
+    data = benchmark(lambda: array[:])
+    np.testing.assert_array_equal(data, expected)
+
+
+def test_pca_slice(benchmark, cellcanvas_widget):
+    from napari_cellcanvas._features import (
+        PCAProjection,
+        fit_pca,
+        projection_executor,
+    )
+
+    widget = cellcanvas_widget
+    run_name = widget.index.run_names()[0]
+    features = widget.index.features(run_name)[0]
+    _, data, _, _ = widget.open_features(features)
+    pca = fit_pca(data[-1])
+    executor = projection_executor()
+
+    def setup():
+        # A projection without projected chunks
+        return (PCAProjection(data[0], pca, executor),), {}
+
+    def project_slice(projection):
+        return projection[projection.shape[0] // 2]
+
+    rgb = benchmark.pedantic(project_slice, setup=setup, rounds=ROUNDS)
+    assert rgb.shape == (*data[0].shape[2:], 3)
+    executor.shutdown()
+
+
+def test_load_segmentation(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    segmentation = widget.index.segmentations(widget.index.run_names()[0])[0]
+    benchmark.pedantic(
+        widget.load_segmentation,
+        args=(segmentation,),
+        setup=widget.viewer.layers.clear,
+        rounds=ROUNDS,
+        warmup_rounds=1,
+    )
+
+
+def test_connected_components(benchmark, cellcanvas_widget):
+    import zarr
+
+    from napari_cellcanvas._components import connected_components
+    from napari_cellcanvas._zarr import lazy_levels
+
+    widget = cellcanvas_widget
+    segmentation = widget.index.segmentations(widget.index.run_names()[0])[0]
+    data, _, _ = lazy_levels(
+        zarr.open(segmentation.zarr(), "r"), segmentation.meta.voxel_size
+    )
+    components = benchmark.pedantic(
+        connected_components, args=(data[0],), rounds=ROUNDS
+    )
+    # The synthetic slab spans several chunks, merged into one component
+    centroids, sizes = components[1]
+    assert len(centroids) == 1
+    assert sizes[0] == (data[0][:] == 1).sum()
+
+
+def test_load_picks(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    run = first_run(widget)
+    pick_set = widget.index.picks(run.meta.name)[0]
+    benchmark.pedantic(
+        widget.load_picks,
+        args=(pick_set, run),
+        setup=widget.viewer.layers.clear,
+        rounds=ROUNDS,
+        warmup_rounds=1,
+    )
+
+
+def test_show_slab(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    run = first_run(widget)
+    layer = widget.load_run_picks(run)
+    link = widget.writeback.stores[layer]
+    total = len(layer.data)
+    z = float(layer.data[:, 0].mean())
+
+    benchmark(link.show_slab, z - 5, z + 5)
+    hidden = len(link.hidden[0]) if link.hidden is not None else 0
+    assert len(layer.data) + hidden == total
+    link.show_slab()
+    assert len(layer.data) == total
+
+
+def test_merge_duplicate_picks(benchmark, cellcanvas_widget):
+    from napari_cellcanvas._picks import PickIndex
+
+    widget = cellcanvas_widget
+    pick_sets = widget.index.picks(widget.index.run_names()[0])
+    index = PickIndex.from_pick_sets(
+        pick_sets, widget.root.config.pickable_objects
+    )
+    coordinates, names, counts = benchmark(index.merge_duplicates)
+    assert counts.sum() == len(index)
+    assert len(coordinates) == len(names) <= len(index)
+
+
+def test_update_solution_args(benchmark, qtbot, cellcanvas_widget):
+    widget = cellcanvas_widget
+    widget.index.build_choices()
+    widget.solution_dropdown.setCurrentIndex(0)
+    benchmark(widget.update_solution_args)
+    assert widget.scroll_layout.rowCount()
+
+
+def test_create_segmentation(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    run = first_run(widget)
+    voxel_size = widget.index.voxel_sizes(run.meta.name)[0]
+    names = (f"created{i}" for i in itertools.count())
+
+    def setup():
+        # The creation form, closed once the segmentation is created
+        return (
+            QWidget(),
+            run,
+            next(names),
+            0,
+            "benchmark",
+            voxel_size,
+        ), {}
+
+    benchmark.pedantic(
+        widget.create_segmentation, setup=setup, rounds=ROUNDS, warmup_rounds=1
+    )
+
+
+def test_create_in_runs(benchmark, cellcanvas_widget):
+    from napari_cellcanvas.widget import create_in_runs, new_segmentation
+
+    widget = cellcanvas_widget
+    run_names = widget.index.run_names()
+    voxel_size = widget.index.voxel_sizes(run_names[0])[0]
+    names = (f"bulk{i}" for i in itertools.count())
+
+    def create():
+        fn = partial(
+            new_segmentation,
+            name=next(names),
+            session_id=0,
+            user_id="benchmark",
+            voxel_size=voxel_size,
+        )
+        return list(create_in_runs(widget.index, fn, run_names))
+
+    results = benchmark.pedantic(create, rounds=ROUNDS)
+    assert len(results) == len(run_names)
+    assert all(error is None for _, _, error in results)
+
+
+def test_ingest_outputs(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    run = first_run(widget)
+    run_name = run.meta.name
+    widget.tree_model.fetchMore(
+        widget.tree_model.index_of(widget.find_run_node(run_name))
+    )
+    sessions = (f"output{i}" for i in itertools.count())
+
+    def setup():
+        # A pick set written by a solution
+        before = widget.index.run_entities(run_name)
+        run.new_picks("ribosome", next(sessions), "benchmark").store()
+        return (before,), {}
+
+    def ingest(before):
+        outputs = {run_name: widget.index.diff_run(run_name, before)}
+        widget.ingest_outputs(outputs, {"run_name": run_name})
+
+    benchmark.pedantic(ingest, setup=setup, rounds=ROUNDS, warmup_rounds=1)
+
+
+def test_search(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    widget.index.build_choices()
+    results = benchmark(widget.index.search, "segmentation1")
+    assert results
+
+
+def test_filter_tree(benchmark, cellcanvas_widget):
+    widget = cellcanvas_widget
+    widget.index.build_choices()
+    widget.filter_input.setText("tomo0")
+    benchmark(widget.filter_tree)
+    assert widget.search_model.rowCount()
@@ -0,0 +1,64 @@
+import numpy as np
+import zarr
+
+from napari_cellcanvas._components import (
+    chunk_regions_of,
+    connected_components,
+)
+
+
+def test_chunk_regions_of():
+    regions = dict(chunk_regions_of((5, 4), (2, 4)))
+    assert regions == {
+        (0, 0): (slice(0, 2), slice(0, 4)),
+        (1, 0): (slice(2, 4), slice(0, 4)),
+        (2, 0): (slice(4, 5), slice(0, 4)),
+    }
+
+
+def test_connected_components():
+    labels = np.zeros((12, 12, 12), dtype="uint8")
+    # Crosses the borders of several chunks
+    labels[2:10, 3:5, 3:5] = 1
+    # Touches the first component, but with another label
+    labels[2:10, 5:7, 3:5] = 2
+    # A second component of label 1, across one border only
+    labels[1, 8:10, 2:6] = 1
+    # Below the minimum size
+    labels[11, 11, 11] = 2
+    array = zarr.array(labels, chunks=(4, 4, 4))
+
+    components = connected_components(array, min_size=2, max_workers=2)
+    assert sorted(components) == [1, 2]
+
+    centroids, sizes = components[1]
+    order = np.argsort(sizes)
+    assert sizes[order].tolist() == [8, 32]
+    assert np.allclose(centroids[order[0]], (1, 8.5, 3.5))
+    assert np.allclose(centroids[order[1]], (5.5, 3.5, 3.5))
+
+    centroids, sizes = components[2]
+    assert sizes.tolist() == [32]
+    assert np.allclose(centroids[0], (5.5, 5.5, 3.5))
+
+
+def test_connected_components_empty():
+    array = zarr.zeros((8, 8, 8), chunks=(4, 4, 4), dtype="uint8")
+    assert connected_components(array) == {}
+
+
+def test_connected_components_match_whole_volume():
+    from scipy import ndimage
+
+    rng = np.random.default_rng(0)
+    labels = (rng.random((20, 17, 23)) < 0.35) * rng.integers(
+        1, 3, (20, 17, 23)
+    )
+    array = zarr.array(labels.astype("uint8"), chunks=(5, 4, 6))
+
+    components = connected_components(array, max_workers=2)
+    for value in (1, 2):
+        expected, count = ndimage.label(labels == value)
+        sizes = np.bincount(expected.ravel())[1:]
+        assert sorted(components[value][1]) == sorted(sizes)
+        assert len(components[value][0]) == count
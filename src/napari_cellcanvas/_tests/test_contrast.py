@@ -0,0 +1,93 @@
+import copick
+import numpy as np
+import zarr
+from zarr.storage import FSStore
+
+from napari_cellcanvas import _contrast
+from napari_cellcanvas._contrast import (
+    StatsCache,
+    compute_stats,
+    default_contrast_limits,
+    store_url,
+)
+
+
+def test_compute_stats():
+    data = np.arange(1000, dtype=np.float32).reshape(10, 10, 10)
+    stats = compute_stats(data, percentiles=(10, 90), bins=10)
+    low, high = stats.contrast_limits
+    assert np.isclose(low, 99.9) and np.isclose(high, 899.1)
+    assert stats.range == (0.0, 999.0)
+    assert stats.counts == [100] * 10
+
+
+def test_compute_stats_subsamples():
+    data = np.zeros((64, 64, 64), dtype=np.uint8)
+    stats = compute_stats(data, max_samples=8**3)
+    assert sum(stats.counts) == 8**3
+
+
+def test_compute_stats_degenerate():
+    # Constant images still get a usable range
+    stats = compute_stats(np.full((4, 4), 3.0))
+    assert stats.contrast_limits == (3.0, 4.0)
+    # Non-finite values are ignored
+    stats = compute_stats(np.array([np.nan, np.inf]))
+    assert stats.contrast_limits == (0.0, 1.0)
+
+
+def test_default_contrast_limits():
+    assert default_contrast_limits("uint8") == (0.0, 255.0)
+    assert default_contrast_limits("float32") == (0.0, 1.0)
+
+
+def test_stats_cache(tmp_path):
+    path = str(tmp_path / "contrast.json")
+    stats = compute_stats(np.arange(10.0))
+    cache = StatsCache(path)
+    cache.put("file:///a.zarr/0", 1.0, stats)
+
+    # Read back from the sidecar file by another session
+    cache = StatsCache(path)
+    cached = cache.get("file:///a.zarr/0", 1.0, check_mtime=True)
+    assert cached.contrast_limits == stats.contrast_limits
+    assert cached.counts == stats.counts
+    assert cache.get("file:///a.zarr/0", 2.0, check_mtime=True) is None
+    assert cache.get("file:///a.zarr/0", 2.0) is not None
+    assert cache.get(None) is None
+
+
+def test_stats_cache_max_entries(tmp_path):
+    cache = StatsCache(str(tmp_path / "contrast.json"), max_entries=2)
+    stats = compute_stats(np.arange(10.0))
+    for name in "abc":
+        cache.put(name, None, stats)
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is not None
+
+
+def test_store_url():
+    store = FSStore("memory://bucket/tomogram.zarr")
+    assert store_url(store, "0") == "memory:///bucket/tomogram.zarr/0"
+    assert store_url(zarr.MemoryStore(), "0") is None
+
+
+def test_stats_read_from_sidecar(monkeypatch, small_project, tmp_path):
+    path = str(tmp_path / "contrast.json")
+    computed = []
+
+    def count_stats(array):
+        computed.append(array)
+        return compute_stats(array)
+
+    monkeypatch.setattr(_contrast, "compute_stats", count_stats)
+    # Each session opens the tomogram again
+    for _ in range(2):
+        root = copick.from_file(small_project)
+        tomogram = root.get_run("TS_0000").voxel_spacings[0].tomograms[0]
+        store = tomogram.zarr()
+        array = zarr.open(store, "r")["1"]
+        stats = StatsCache(path).stats(store, "1", array)
+    assert len(computed) == 1
+    assert stats.contrast_limits == compute_stats(array).contrast_limits
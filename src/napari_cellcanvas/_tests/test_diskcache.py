@@ -0,0 +1,58 @@
+import os
+import time
+
+from napari_cellcanvas._diskcache import DiskChunkCache
+
+LOCATION = "s3://bucket/run/tomogram.zarr"
+
+
+def test_put_get(tmp_path):
+    cache = DiskChunkCache(str(tmp_path))
+    assert cache.get(LOCATION, "0/0.0.0") is None
+    cache.put(LOCATION, "0/0.0.0", b"chunk")
+    assert cache.get(LOCATION, "0/0.0.0") == b"chunk"
+    assert cache.contains(LOCATION, "0/0.0.0")
+    # Keys are per location
+    assert not cache.contains("s3://bucket/other.zarr", "0/0.0.0")
+
+    cache.discard(LOCATION, "0/0.0.0")
+    assert cache.get(LOCATION, "0/0.0.0") is None
+
+
+def test_max_age(tmp_path):
+    cache = DiskChunkCache(str(tmp_path))
+    cache.put(LOCATION, "0.0", b"chunk")
+    path = cache._file(LOCATION, "0.0")
+    old = time.time() - 100
+    os.utime(path, (old, old))
+    assert cache.get(LOCATION, "0.0", max_age=10) is None
+    assert not cache.contains(LOCATION, "0.0", max_age=10)
+    # Reads of expiring entries keep the time they were cached
+    assert cache.get(LOCATION, "0.0", max_age=1000) == b"chunk"
+    assert os.path.getmtime(path) == old
+
+
+def test_invalidate(tmp_path):
+    cache = DiskChunkCache(str(tmp_path))
+    cache.put(LOCATION, "0.0", b"a")
+    cache.put(LOCATION, "0.1", b"b")
+    cache.invalidate(LOCATION)
+    assert cache.size() == 0
+    assert cache.get(LOCATION, "0.1") is None
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = DiskChunkCache(str(tmp_path), max_size=1000)
+    past = time.time() - 100
+    for i in range(3):
+        cache.put(LOCATION, str(i), bytes(300))
+        os.utime(cache._file(LOCATION, str(i)), (past + i, past + i))
+    # Reads mark entries as recently used
+    assert cache.get(LOCATION, "0") is not None
+
+    # Above the size, evicts down to 90% of it
+    cache.put(LOCATION, "3", bytes(300))
+    assert cache.size() <= 900
+    assert cache.contains(LOCATION, "0")
+    assert not cache.contains(LOCATION, "1")
+    assert cache.contains(LOCATION, "3")
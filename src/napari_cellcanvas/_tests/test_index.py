@@ -0,0 +1,117 @@
+import shutil
+from pathlib import Path
+
+import copick
+
+from napari_cellcanvas._index import ProjectIndex
+
+
+def open_index(config_path):
+    return ProjectIndex(copick.from_file(config_path))
+
+
+def test_runs_listed_on_access(small_project):
+    index = open_index(small_project)
+    assert index.run_names() == ["TS_0000", "TS_0001"]
+    assert not index.is_loaded("TS_0000")
+
+    tomograms = index.tomograms("TS_0000", 10.0)
+    assert [t.meta.tomo_type for t in tomograms] == ["tomo0"]
+    assert index.is_loaded("TS_0000", 10.0)
+    assert not index.is_loaded("TS_0001")
+    assert index.volume_shape("TS_0000", 10.0) == (32, 32, 32)
+
+
+def test_run_choices(small_project):
+    index = open_index(small_project)
+    choices = index.run_choices("TS_0000")
+    assert choices.voxel_sizes == [10.0]
+    assert choices.tomo_types == ["tomo0"]
+    assert choices.feature_types == ["feature0"]
+    assert choices.segmentation_names == ["segmentation0"]
+    assert choices.user_ids == ["benchmark"]
+    assert index.has_choices("TS_0000")
+    assert not index.choices_complete()
+
+
+def test_refresh_run(small_project):
+    index = open_index(small_project)
+    assert len(index.segmentations("TS_0000")) == 1
+    index.run_choices("TS_0000")
+
+    index.get_run("TS_0000").new_segmentation(
+        voxel_size=10.0,
+        name="added",
+        session_id="0",
+        is_multilabel=True,
+        user_id="test",
+    )
+    assert index.refresh_run("TS_0000", force=True)
+    names = [s.meta.name for s in index.segmentations("TS_0000")]
+    assert sorted(names) == ["added", "segmentation0"]
+    # Choices are listed again
+    assert not index.has_choices("TS_0000")
+    assert "added" in index.run_choices("TS_0000").segmentation_names
+    assert not index.refresh_run("TS_0000", force=True)
+
+
+def test_search(small_project):
+    index = open_index(small_project)
+    # Runs not listed yet match by their name only
+    assert [label for label, _ in index.search("ts_0001")] == ["TS_0001"]
+    assert not index.search("segmentation0")
+
+    index.build_choices()
+    results = index.search("segmentation0 ts_0001")
+    assert len(results) == 1
+    label, segmentation = results[0]
+    assert segmentation.meta.name == "segmentation0"
+    assert segmentation.run.meta.name == "TS_0001"
+    assert len(index.search("picks", limit=3)) == 3
+
+
+def test_search_index_follows_listings(small_project):
+    index = open_index(small_project)
+    index.build_choices()
+    assert len(index.search("segmentation0")) == 2
+
+    index.get_run("TS_0000").new_segmentation(
+        voxel_size=10.0,
+        name="added",
+        session_id="0",
+        is_multilabel=True,
+        user_id="test",
+    )
+    index.refresh_run("TS_0000", force=True)
+    # Listed again on first use
+    index.search_names("TS_0000")
+    assert [s.meta.name for _, s in index.search("added")] == ["added"]
+    assert not index.search("added missing")
+
+
+def test_refresh_drops_removed_runs(monkeypatch, small_project):
+    index = open_index(small_project)
+    index.build_choices()
+    runs = Path(small_project).parent / "overlay" / "ExperimentRuns"
+    shutil.rmtree(runs / "TS_0000")
+
+    assert index.refresh() == ([], ["TS_0000"], [])
+    assert index.run_names() == ["TS_0001"]
+    assert not index.has_choices("TS_0000")
+    assert index.choices_complete()
+    assert not index.search("ts_0000")
+
+    # A run removed while its choices are listed in a worker
+    load_run = index.load_run
+
+    def load_then_remove(name, deep=False):
+        entry = load_run(name, deep)
+        shutil.rmtree(runs / name)
+        index.refresh()
+        return entry
+
+    index = open_index(small_project)
+    monkeypatch.setattr(index, "load_run", load_then_remove)
+    index.run_choices("TS_0001")
+    assert not index.run_names()
+    assert not index.has_choices("TS_0001")
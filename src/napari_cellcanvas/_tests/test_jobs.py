@@ -0,0 +1,52 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from napari_cellcanvas._jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    Batch,
+    Job,
+    retrying,
+)
+
+
+def test_retrying_stops_waiting_when_cancelled():
+    job = Job(1, "test")
+    calls = []
+
+    def fail():
+        calls.append(time.time())
+        raise ConnectionError
+
+    run = retrying(fail, job, retries=3, backoff=60)
+    threading.Timer(0.1, job.cancel_event.set).start()
+    started = time.time()
+    with pytest.raises(CancelledError):
+        run()
+    assert time.time() - started < 10
+    assert len(calls) == 1
+
+
+def test_retrying_skips_cancelled_jobs():
+    job = Job(1, "test")
+    job.cancel_event.set()
+    run = retrying(lambda: pytest.fail("called"), job)
+    with pytest.raises(CancelledError):
+        run()
+    assert job.attempts == 0
+
+
+def test_batch_counts_cancelled_jobs_apart():
+    batch = Batch(1, "test", 2)
+    for state in (DONE, FAILED, CANCELLED, CANCELLED):
+        job = Job(len(batch.jobs), "test")
+        job.state = state
+        batch.jobs.append(job)
+    batch.jobs.append(Job(len(batch.jobs), "test"))
+    assert (batch.done, batch.failed, batch.cancelled) == (1, 1, 2)
+    assert batch.remaining == 1
+    assert not batch.finished
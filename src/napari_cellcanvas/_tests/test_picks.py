@@ -0,0 +1,134 @@
+from types import SimpleNamespace
+
+import copick
+import numpy as np
+import pytest
+
+from napari_cellcanvas._picks import (
+    PickIndex,
+    pick_sets_to_points,
+    point_sizes,
+    store_new_picks,
+)
+
+
+def fake_pick_set(name, coordinates, user_id="user", session_id="0"):
+    points = [
+        SimpleNamespace(location=SimpleNamespace(z=z, y=y, x=x))
+        for z, y, x in coordinates
+    ]
+    meta = SimpleNamespace(
+        pickable_object_name=name, user_id=user_id, session_id=session_id
+    )
+    return SimpleNamespace(points=points, meta=meta)
+
+
+def test_pick_sets_to_points():
+    pick_sets = [
+        fake_pick_set("ribosome", [(1, 2, 3), (4, 5, 6)]),
+        fake_pick_set("membrane", [(7, 8, 9)], session_id="1"),
+        fake_pick_set("membrane", []),
+    ]
+    coordinates, features = pick_sets_to_points(pick_sets)
+    assert coordinates.tolist() == [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert list(features["pickable_object_name"]) == [
+        "ribosome",
+        "ribosome",
+        "membrane",
+    ]
+    assert list(features["session_id"]) == ["0", "0", "1"]
+    assert list(features["point_index"]) == [0, 1, 0]
+
+    coordinates, features = pick_sets_to_points([])
+    assert coordinates.shape == (0, 3)
+    assert not len(features["point_index"])
+
+
+def test_point_sizes():
+    objects = [SimpleNamespace(name="ribosome", radius=60)]
+    sizes = point_sizes(["ribosome", "unknown", "ribosome"], objects)
+    assert sizes.tolist() == [60.0, 1.0, 60.0]
+
+
+def test_pick_index():
+    index = PickIndex(
+        [(0, 0, 0), (0, 0, 5), (0, 0, 50), (0, 0, 52)],
+        ["a", "a", "a", "b"],
+        [10, 10, 10, 10],
+    )
+    # Points of different objects are never duplicates
+    assert index.duplicate_pairs().tolist() == [[0, 1]]
+
+    coordinates, names, counts = index.merge_duplicates()
+    order = np.argsort(coordinates[:, 2])
+    assert coordinates[order, 2].tolist() == [2.5, 50, 52]
+    assert names[order].tolist() == ["a", "a", "b"]
+    assert counts[order].tolist() == [2, 1, 1]
+
+
+def test_store_new_picks(small_project):
+    run = copick.from_file(small_project).get_run("TS_0000")
+    pick_set = store_new_picks(
+        run, "ribosome", np.array([[1.0, 2.0, 3.0]]), "test", "0"
+    )
+    run.refresh()
+    stored = run.get_picks(object_name="ribosome", user_id="test")
+    assert len(stored) == 1
+    assert stored[0].numpy()[0].tolist() == [[3.0, 2.0, 1.0]]
+    assert pick_set.meta.user_id == "test"
+
+
+def test_failed_flush_keeps_edits(monkeypatch, small_project):
+    from napari.layers import Points
+    from napari.layers.base._base_constants import ActionType
+
+    from napari_cellcanvas._picks import PicksLayerLink, pick_set_coordinates
+
+    run = copick.from_file(small_project).get_run("TS_0000")
+    pick_set = run.get_picks()[0]
+    coordinates, features = pick_sets_to_points([pick_set])
+    layer = Points(coordinates, features=features)
+    link = PicksLayerLink(layer, [pick_set], run)
+
+    layer.selected_data = {0}
+    layer.remove_selected()
+    # As when dragging a point
+    layer.data[1] = (1.0, 2.0, 3.0)
+    layer.events.data(
+        value=layer.data,
+        action=ActionType.CHANGED,
+        data_indices=(1,),
+        vertex_indices=((),),
+    )
+    layer.add((4.0, 5.0, 6.0))
+    expected = np.asarray(layer.data).copy()
+    assert link.dirty_count == 3
+
+    def fail():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pick_set, "store", fail)
+    with pytest.raises(OSError):
+        link.prepare_flush()()
+    link.finish_flush(OSError("disk full"))
+    assert link.dirty_count == 3
+    assert len(pick_set.points) == len(coordinates)
+    monkeypatch.undo()
+
+    # Edited while the flush is running
+    flush = link.prepare_flush()
+    layer.add((7.0, 8.0, 9.0))
+    expected = np.concatenate([expected, [(7.0, 8.0, 9.0)]])
+    flush()
+    link.finish_flush()
+    assert link.dirty_count == 1
+    assert layer.features["point_index"].tolist() == [
+        *range(len(coordinates)),
+        -1,
+    ]
+
+    link.prepare_flush()()
+    link.finish_flush()
+    assert not link.dirty_count
+    pick_set.refresh()
+    assert np.allclose(pick_set_coordinates(pick_set), expected)
@@ -0,0 +1,75 @@
+import numpy as np
+import zarr
+
+from napari_cellcanvas._pyramid import build_label_pyramid, downsample_mode
+
+
+def test_downsample_mode():
+    block = np.zeros((4, 4, 4), dtype=np.uint16)
+    # Most frequent label of the first window
+    block[:2, :2, :2] = 3
+    block[0, 0, 0] = 1
+    # A tie with the background goes to the label
+    block[2, 2:, 2:] = 5
+    block[2:, 2:, :2] = 0
+
+    result = downsample_mode(block)
+    assert result.dtype == block.dtype
+    assert result[0, 0, 0] == 3
+    assert result[1, 1, 1] == 5
+    assert result[1, 1, 0] == 0
+
+
+def test_downsample_mode_pads_edges():
+    block = np.ones((3, 5, 1), dtype=np.uint8)
+    assert downsample_mode(block).shape == (2, 3, 1)
+    assert (downsample_mode(block) == 1).all()
+
+
+def test_pyramid_skips_empty_chunks():
+    group = zarr.group(zarr.MemoryStore())
+    labels = group.create_dataset(
+        "0",
+        shape=(64, 64, 64),
+        chunks=(16, 16, 16),
+        dtype="uint8",
+        fill_value=0,
+        write_empty_chunks=False,
+    )
+    labels[:8] = 1
+
+    paths = build_label_pyramid(group, 10.0, max_workers=0)
+    assert paths == ["0", "1", "2"]
+    # Only the chunks covering the painted slab are written
+    assert group["1"].nchunks_initialized == 4
+    assert (group["1"][:4] == 1).all()
+    assert not group["1"][4:].any()
+
+
+def test_pyramid_workers_match_in_process(tmp_path):
+    from napari_cellcanvas._pyramid import chunk_regions
+
+    groups = []
+    for name in ("workers", "in_process"):
+        # Worker processes open the arrays from their store
+        group = zarr.open_group(str(tmp_path / name), "w")
+        labels = group.create_dataset(
+            "0", shape=(64, 64, 64), chunks=(8, 8, 8), dtype="uint8"
+        )
+        labels[:, :20] = 2
+        groups.append(group)
+
+    build_label_pyramid(groups[0], 10.0, max_workers=2)
+    build_label_pyramid(groups[1], 10.0, max_workers=0)
+
+    # Updates of many chunks are computed in threads
+    for group in groups:
+        group["0"][:, 20:40] = 3
+    keys = [key for key in groups[0].store if key.startswith("0/")]
+    regions = chunk_regions(groups[0]["0"], keys)
+    build_label_pyramid(groups[0], 10.0, regions=regions, max_workers=2)
+    build_label_pyramid(groups[1], 10.0, regions=regions, max_workers=0)
+
+    for path in ("1", "2", "3"):
+        np.testing.assert_array_equal(groups[0][path][:], groups[1][path][:])
+    assert (groups[0]["1"][:, 10:20] == 3).all()
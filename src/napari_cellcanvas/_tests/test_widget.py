@@ -0,0 +1,158 @@
+from ._synthetic import SOLUTION_ARGS, wait_for_workers
+
+
+def first_run(widget):
+    return widget.index.get_run(widget.index.run_names()[0])
+
+
+def test_pick_set_edited_in_one_layer(cellcanvas_widget):
+    widget = cellcanvas_widget
+    run = first_run(widget)
+    run_layer = widget.load_run_picks(run)
+    pick_set = widget.index.picks(run.meta.name)[0]
+    layer = widget.load_picks(pick_set, run)
+
+    # The pick set is already saved from the run's layer
+    assert run_layer in widget.writeback.stores
+    assert layer not in widget.writeback.stores
+    assert not layer.editable
+
+    widget.viewer.layers.remove(run_layer)
+    widget.viewer.layers.remove(layer)
+    layer = widget.load_picks(pick_set, run)
+    assert layer in widget.writeback.stores
+
+
+def test_solution_form_after_loading(qtbot, cellcanvas_widget):
+    widget = cellcanvas_widget
+    widget.solution_dropdown.setCurrentIndex(0)
+    widget.index._choices.pop(widget.run_dropdown.currentText(), None)
+    widget.update_solution_args()
+    assert widget.form_status_label.isVisibleTo(widget)
+    wait_for_workers(qtbot)
+    qtbot.waitUntil(
+        lambda: not widget.form_status_label.isVisibleTo(widget),
+        timeout=60000,
+    )
+    assert list(widget.solution_form_args()) == SOLUTION_ARGS[1:]
+
+
+def test_single_level_segmentations_skip_pyramid_updates(cellcanvas_widget):
+    widget = cellcanvas_widget
+    run_name = widget.index.run_names()[0]
+    segmentation = widget.index.segmentations(run_name)[0]
+    widget.load_segmentation(segmentation)
+    widget.load_segmentation(segmentation, paint=True)
+    # The synthetic segmentations have a single level
+    assert not widget._pyramid_stores
+
+
+def test_reload_asks_before_discarding_edits(monkeypatch, cellcanvas_widget):
+    from qtpy.QtWidgets import QMessageBox
+
+    widget = cellcanvas_widget
+    run_name = widget.index.run_names()[0]
+    segmentation = widget.index.segmentations(run_name)[0]
+    layer = widget.load_segmentation(segmentation, paint=True)
+    store = widget.writeback.stores[layer]
+    layer.data[0, 0, 0] = 2
+    assert store.dirty_count
+    args = {"segmentation_name": segmentation.meta.name}
+
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.No)
+    widget.open_outputs(run_name, {}, args)
+    assert store.dirty_count
+
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: QMessageBox.Yes)
+    widget.open_outputs(run_name, {}, args)
+    assert not store.dirty_count
+    assert layer.data[0, 0, 0] == 1
+
+
+def test_remote_stores_are_disk_cached(cellcanvas_widget):
+    import numpy as np
+    import zarr
+    from zarr.storage import FSStore
+
+    from napari_cellcanvas._zarr import DiskCacheStore, warm_cache
+
+    widget = cellcanvas_widget
+    raw_store = FSStore("memory://cellcanvas-test/tomogram.zarr")
+    data = np.arange(64).reshape(8, 8)
+    zarr.array(data, chunks=(4, 4), store=raw_store, overwrite=True)
+    store = widget.cached_store(raw_store, "test")
+    assert isinstance(store, DiskCacheStore)
+    assert warm_cache(store) == 4
+    assert warm_cache(store) == 0
+    assert (zarr.open(store, "r")[:] == data).all()
+
+    tomogram = widget.index.tomograms(widget.index.run_names()[0])[0]
+    local_store = widget.cached_store(tomogram.zarr(), "test")
+    assert not isinstance(local_store, DiskCacheStore)
+
+
+def test_bulk_create_reads_shared_shape_once(monkeypatch, small_project):
+    from functools import partial
+
+    import copick
+    import zarr
+
+    from napari_cellcanvas._index import ProjectIndex
+    from napari_cellcanvas.widget import (
+        create_in_runs,
+        new_segmentation,
+        shared_volume_shape,
+    )
+
+    index = ProjectIndex(copick.from_file(small_project))
+    read = []
+    volume_shape = index.volume_shape
+    monkeypatch.setattr(
+        index,
+        "volume_shape",
+        lambda *args: read.append(args) or volume_shape(*args),
+    )
+    run_names = index.run_names()
+    shape = shared_volume_shape(index, run_names, 10.0)
+    assert shape == (32, 32, 32)
+    assert shared_volume_shape(index, run_names, 5.0) is None
+
+    fn = partial(
+        new_segmentation,
+        name="bulk",
+        session_id=0,
+        user_id="test",
+        voxel_size=10.0,
+        shape=shape,
+    )
+    results = list(create_in_runs(index, fn, run_names))
+    assert all(error is None for _, _, error in results)
+    assert read == [("TS_0000", 10.0)]
+    for _, segmentation, _ in results:
+        assert zarr.open(segmentation.zarr(), "r")["data"].shape == shape
+
+
+def test_solution_form_fetches_info_on_a_worker(qtbot, cellcanvas_widget):
+    widget = cellcanvas_widget
+    widget.index.build_choices()
+    widget.solution_dropdown.setCurrentIndex(0)
+    wait_for_workers(qtbot)
+    widget.client.invalidate()
+    widget.update_solution_args()
+    # Built once the info is fetched
+    assert widget.form_status_label.isVisibleTo(widget)
+    assert (
+        widget.client.cached_info(
+            *widget.solution_dropdown.currentText().split(":")
+        )
+        is None
+    )
+    # Replaces the pending update
+    widget.update_solution_args()
+    wait_for_workers(qtbot)
+    qtbot.waitUntil(
+        lambda: not widget.form_status_label.isVisibleTo(widget),
+        timeout=60000,
+    )
+    assert widget.scroll_layout.rowCount() == len(SOLUTION_ARGS) - 1
+    assert list(widget.solution_form_args()) == SOLUTION_ARGS[1:]
@@ -0,0 +1,143 @@
+import numpy as np
+import zarr
+from zarr.storage import KVStore, MemoryStore
+
+from napari_cellcanvas._diskcache import DiskChunkCache
+from napari_cellcanvas._profiling import Profiler
+from napari_cellcanvas._zarr import (
+    DiskCacheStore,
+    WriteBehindStore,
+    create_label_array,
+    label_dtype,
+    lazy_levels,
+    multiscale_levels,
+    open_cached,
+    profiled,
+)
+
+from ._synthetic import write_multiscale
+
+
+class CountingStore(KVStore):
+    """Records the keys of every `getitems` call."""
+
+    def __init__(self):
+        super().__init__({})
+        self.batches = []
+
+    def getitems(self, keys, *, contexts):
+        self.batches.append(sorted(keys))
+        return super().getitems(keys, contexts=contexts)
+
+
+def test_multiscale_levels():
+    group = zarr.group(MemoryStore())
+    write_multiscale(group, np.zeros((8, 8, 8)), 10.0, 2, (4, 4, 4))
+    levels = multiscale_levels(group, 10.0)
+    assert [path for path, _, _ in levels] == ["0", "1"]
+    assert levels[1][1] == [20.0] * 3
+    assert levels[1][2] == [5.0] * 3
+
+    # Numbered arrays without metadata
+    del group.attrs["multiscales"]
+    assert multiscale_levels(group, 10.0) == levels
+
+
+def test_lazy_levels_legacy_layout():
+    group = zarr.group(MemoryStore())
+    group.zeros("data", shape=(4, 4, 4), chunks=(2, 2, 2))
+    arrays, scale, translation = lazy_levels(
+        group, 10.0, write_empty_chunks=False
+    )
+    assert len(arrays) == 1
+    assert scale == [10.0] * 3
+    assert translation == [0.0] * 3
+    assert not arrays[0].write_empty_chunks
+
+
+def test_label_dtype():
+    assert label_dtype(2) == "uint8"
+    assert label_dtype(300) == "uint16"
+    assert label_dtype(2**20) == "int32"
+
+
+def test_create_label_array_skips_empty_chunks():
+    group = zarr.group(MemoryStore())
+    labels = create_label_array(group, "labels", (8, 8, 8), chunks=(4, 4, 4))
+    labels[:4] = 1
+    labels[:4, :4] = 0
+    assert labels.nchunks_initialized == 2
+
+
+def test_open_cached_batches_misses():
+    store = CountingStore()
+    array = zarr.zeros((8, 8), chunks=(4, 4), dtype="i4", store=store)
+    expected = np.arange(64).reshape(8, 8)
+    array[:] = expected
+
+    cached = open_cached(store, "r")
+    store.batches.clear()
+    assert (cached[:4] == expected[:4]).all()
+    assert store.batches == [["0.0", "0.1"]]
+
+    # Hits are served from memory, only the misses are read
+    store.batches.clear()
+    assert (cached[:] == expected).all()
+    assert store.batches == [["1.0", "1.1"]]
+
+
+def test_profiling_enabled_after_open():
+    profiler = Profiler(enabled=False)
+    array = zarr.array(
+        np.arange(64), chunks=(16,), store=profiled(MemoryStore(), profiler)
+    )
+    array[:]
+    assert not profiler.operations
+
+    # Enabled from the stats widget while the array is open
+    profiler.enabled = True
+    array[:]
+    array[:16] = 0
+    assert profiler.operations["read_chunks"].count == 1
+    assert profiler.operations["write_chunk"].count == 1
+
+
+def test_disk_cache_store_serves_cached_chunks(tmp_path):
+    store = CountingStore()
+    array = zarr.zeros((8, 8), chunks=(4, 4), dtype="i4", store=store)
+    expected = np.arange(64).reshape(8, 8)
+    array[:] = expected
+    cache = DiskChunkCache(str(tmp_path))
+    cached = DiskCacheStore(store, cache, "s3://bucket/array.zarr")
+
+    store.batches.clear()
+    assert (zarr.open(cached, "r")[:4] == expected[:4]).all()
+    assert store.batches == [["0.0", "0.1"]]
+    assert "0.0" in cached and cached.is_cached("0.0")
+    assert not cached.is_cached(".zarray")
+
+    # Cached chunks are not read from the store, even if deleted there
+    del store["0.0"]
+    store.batches.clear()
+    assert "0.0" in cached
+    assert (zarr.open(cached, "r")[:] == expected).all()
+    assert store.batches == [["1.0", "1.1"]]
+
+
+def test_write_behind_store():
+    backing = MemoryStore()
+    array = zarr.zeros((8,), chunks=(4,), dtype="i4", store=backing)
+    array[:] = 1
+    store = WriteBehindStore(backing)
+    edited = zarr.open(store, "a")
+
+    edited[:4] = 2
+    del store["1"]
+    assert store.dirty_count == 2
+    assert list(edited[:]) == [2] * 4 + [0] * 4
+    assert list(array[:]) == [1] * 8
+
+    assert store.flush() == 2
+    assert store.dirty_count == 0
+    assert list(array[:]) == [2] * 4 + [0] * 4
+    assert store.pop_flushed_keys() == {"0", "1"}
@@ -0,0 +1,199 @@
+from qtpy.QtCore import QAbstractItemModel, QModelIndex, Qt, Signal
+
+# Number of rows exposed to the view per fetch
+PAGE_SIZE = 200
+
+
+class TreeNode:
+    def __init__(self, text, data=None, lazy=False, enabled=True):
+        self.text = text
+        self.data = data
+        # Lazy nodes have their children listed on first fetch
+        self.lazy = lazy
+        self.enabled = enabled
+        self.parent = None
+        self.row = 0
+        self.children = []
+        # Children exposed to the view, the others are fetched when scrolled
+        # to
+        self.fetched = 0
+        self.opened = False
+
+    def child(self, text):
+        for child in self.children:
+            if child.text == text:
+                return child
+        return None
+
+    def path(self):
+        node = self
+        while node is not None:
+            yield node
+            node = node.parent
+
+
+class ProjectTreeModel(QAbstractItemModel):
+    """Tree of nodes whose rows are exposed a page at a time.
+
+    Children of lazy nodes are requested through `fetch_requested` when the
+    node is first expanded, and added with `add_children`.
+    """
+
+    fetch_requested = Signal(object)
+
+    def __init__(self, header="", page_size=PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.header = header
+        self.page_size = page_size
+        self.root = TreeNode(header)
+        self.root.opened = True
+
+    def node(self, index):
+        # Invalid and missing indices are the root
+        if index is not None and index.isValid():
+            return index.internalPointer()
+        return self.root
+
+    def index_of(self, node):
+        if node is self.root or node.parent is None:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def index(self, row, column, parent=None):
+        node = self.node(parent)
+        if column != 0 or not 0 <= row < node.fetched:
+            return QModelIndex()
+        return self.createIndex(row, 0, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.index_of(index.internalPointer().parent)
+
+    def rowCount(self, parent=None):
+        if parent is not None and parent.column() > 0:
+            return 0
+        return self.node(parent).fetched
+
+    def columnCount(self, parent=None):
+        return 1
+
+    def hasChildren(self, parent=None):
+        node = self.node(parent)
+        return node.lazy or bool(node.children)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return node.text
+        if role == Qt.UserRole:
+            return node.data
+        return None
+
+    def flags(self, index):
+        if not index.isValid() or not index.internalPointer().enabled:
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.header
+        return None
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node.lazy or node.fetched < len(node.children)
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        node.opened = True
+        if node.lazy:
+            node.lazy = False
+            self.fetch_requested.emit(node)
+            return
+        self._expose(node, node.fetched + self.page_size)
+
+    def _expose(self, node, count):
+        count = min(count, len(node.children))
+        if count <= node.fetched:
+            return
+        self.beginInsertRows(self.index_of(node), node.fetched, count - 1)
+        node.fetched = count
+        self.endInsertRows()
+
+    def _renumber(self, node, start=0):
+        for row in range(start, len(node.children)):
+            node.children[row].row = row
+
+    def add_children(self, parent, nodes, position=None):
+        """Add `nodes` to `parent`, at the end or at `position`.
+
+        Rows of an opened node are shown right away up to the first page,
+        or when inserted among shown rows. Others are fetched later.
+        """
+        if not nodes:
+            return
+        start = len(parent.children) if position is None else position
+        for node in nodes:
+            node.parent = parent
+        parent.children[start:start] = nodes
+        self._renumber(parent, start)
+        if not parent.opened:
+            return
+        if start < parent.fetched:
+            self.beginInsertRows(
+                self.index_of(parent), start, start + len(nodes) - 1
+            )
+            parent.fetched += len(nodes)
+            self.endInsertRows()
+        elif start == parent.fetched:
+            self._expose(parent, max(parent.fetched, self.page_size))
+
+    def group(self, parent, text):
+        """The child of `parent` labelled `text`, added if missing."""
+        node = parent.child(text)
+        if node is None:
+            node = TreeNode(text)
+            self.add_children(parent, [node])
+        return node
+
+    def remove(self, node):
+        parent = node.parent
+        if node.row < parent.fetched:
+            self.beginRemoveRows(self.index_of(parent), node.row, node.row)
+            del parent.children[node.row]
+            parent.fetched -= 1
+            self.endRemoveRows()
+        else:
+            del parent.children[node.row]
+        self._renumber(parent, node.row)
+        node.parent = None
+
+    def clear(self, node, lazy=None):
+        """Remove the children of `node`, which is fetched again when
+        `lazy`."""
+        for child in node.children:
+            child.parent = None
+        if node.fetched:
+            self.beginRemoveRows(self.index_of(node), 0, node.fetched - 1)
+            node.children = []
+            node.fetched = 0
+            self.endRemoveRows()
+        else:
+            node.children = []
+        if lazy is not None:
+            node.lazy = lazy
+
+    def reset(self, nodes=()):
+        """Replace all top-level nodes."""
+        self.beginResetModel()
+        self.root = TreeNode(self.header)
+        self.root.opened = True
+        for node in nodes:
+            node.parent = self.root
+        self.root.children = list(nodes)
+        self._renumber(self.root)
+        self.root.fetched = min(len(nodes), self.page_size)
+        self.endResetModel()
@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from qtpy.QtCore import QObject, QTimer, Signal
+from qtpy.QtWidgets import (
+    QHBoxLayout,
+    QLabel,
+    QProgressBar,
+    QPushButton,
+    QWidget,
+)
+
+
+class WriteBackManager(QObject):
+    """Flushes edited segmentations and picks in the background.
+
+    Registered objects provide `dirty_count`, `prepare_flush`, which is
+    called on the main thread and returns the function that writes their
+    edits, and `finish_flush`, called on the main thread with the error of
+    that write, if any. They are flushed every `flush_interval` seconds, on
+    `flush_all` and when they are unregistered.
+    """
+
+    progress = Signal(int, int)
+    status_changed = Signal(str)
+    flushed = Signal(object, str, object)
+
+    def __init__(self, flush_interval=10, parent=None):
+        super().__init__(parent)
+        self.stores = {}
+        self._names = {}
+        self._pending = set()
+        # Flushes requested while the same store was flushing, by store id
+        self._queued = {}
+        # Store and future of the running flushes, by store id
+        self._running = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="cellcanvas-flush"
+        )
+        self.flushed.connect(self._on_flushed)
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.timeout.connect(self.flush_all)
+        if flush_interval:
+            self._flush_timer.start(int(flush_interval * 1000))
+
+        # Dirty counts change with every edit, poll them cheaply
+        self._status_timer = QTimer(self)
+        self._status_timer.timeout.connect(self.update_status)
+        self._status_timer.start(1000)
+
+    def register(self, key, store, name=None):
+        self.stores[key] = store
+        self._names[key] = name or str(key)
+
+    def unregister(self, key, flush=True):
+        store = self.stores.pop(key, None)
+        name = self._names.pop(key, None)
+        if store is not None and flush and store.dirty_count:
+            return self._submit(store, name)
+        return None
+
+    def dirty_count(self):
+        return sum(store.dirty_count for store in self.stores.values())
+
+    def flush(self, key):
+        store = self.stores.get(key)
+        if store is None or not store.dirty_count:
+            return None
+        return self._submit(store, self._names[key])
+
+    def flush_all(self):
+        return [
+            future
+            for future in (self.flush(key) for key in list(self.stores))
+            if future is not None
+        ]
+
+    def _submit(self, store, name):
+        # Stores are mappings and not hashable, track them by identity
+        if id(store) in self._pending:
+            # Edits made after that flush started are written after it
+            self._queued[id(store)] = (store, name)
+            return None
+        self._pending.add(id(store))
+        self.status_changed.emit(f"Saving {name}…")
+        future = self._executor.submit(
+            store.prepare_flush(),
+            lambda done, total: self.progress.emit(done, total),
+        )
+        self._running[id(store)] = (store, future)
+        future.add_done_callback(
+            lambda future: self.flushed.emit(store, name, future.exception())
+        )
+        return future
+
+    def _on_flushed(self, store, name, error):
+        self._pending.discard(id(store))
+        self._running.pop(id(store), None)
+        store.finish_flush(error)
+        queued = self._queued.pop(id(store), None)
+        if error is not None:
+            print(f"Error saving {name}: {error}")
+            self.status_changed.emit(f"Error saving {name}: {error}")
+        if queued is not None and store.dirty_count:
+            self._submit(*queued)
+        elif error is None:
+            self.update_status()
+
+    def update_status(self):
+        if self._pending:
+            return
+        dirty = self.dirty_count()
+        if dirty:
+            self.status_changed.emit(f"{dirty} unsaved changes")
+        else:
+            self.status_changed.emit("All edits saved")
+
+    def shutdown(self, wait=True):
+        # Running flushes are finished first, so that the remaining edits are
+        # written after them before the executor shuts down
+        for store, future in self._running.values():
+            store.finish_flush(future.exception())
+        self._running.clear()
+        stores = {id(store): store for store in self.stores.values()}
+        stores.update({key: store for key, (store, _) in self._queued.items()})
+        self._queued.clear()
+        for store in stores.values():
+            if store.dirty_count:
+                self._executor.submit(store.prepare_flush())
+        self._flush_timer.stop()
+        self._status_timer.stop()
+        self._executor.shutdown(wait=wait)
+
+
+class WriteBackStatusWidget(QWidget):
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.status_label = QLabel("All edits saved", self)
+        layout.addWidget(self.status_label)
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setMaximumWidth(100)
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+        self.save_button = QPushButton("Save", self)
+        self.save_button.clicked.connect(manager.flush_all)
+        layout.addWidget(self.save_button)
+
+        manager.status_changed.connect(self.status_label.setText)
+        manager.progress.connect(self.update_progress)
+
+    def update_progress(self, done, total):
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+        self.progress_bar.setVisible(done < total)
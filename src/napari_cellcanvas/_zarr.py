@@ -0,0 +1,648 @@
+import contextlib
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import zarr
+from numcodecs import Blosc, Zlib
+from zarr.storage import Store, listdir, rmdir
+
+# Default memory budget of the chunk cache of each opened store
+CHUNK_CACHE_SIZE = 512 * 2**20
+
+LABEL_DTYPES = ("uint8", "uint16", "int32")
+
+# Label volumes are mostly zeros and runs of equal values, which bit
+# shuffling compresses particularly well
+COMPRESSORS = {
+    "blosc-zstd": Blosc(cname="zstd", clevel=5, shuffle=Blosc.BITSHUFFLE),
+    "blosc-lz4": Blosc(cname="lz4", clevel=5, shuffle=Blosc.BITSHUFFLE),
+    "zlib": Zlib(level=5),
+    "none": None,
+}
+
+
+class LRUChunkCache(zarr.LRUStoreCache):
+    """`zarr.LRUStoreCache` that reads the chunks missing from the cache with
+    one `getitems` call of the wrapped store, which remote stores fetch
+    concurrently."""
+
+    def getitems(self, keys, *, contexts):
+        values = {}
+        missing = []
+        with self._mutex:
+            for key in keys:
+                value = self._values_cache.get(key)
+                if value is None:
+                    missing.append(key)
+                    continue
+                self.hits += 1
+                self._values_cache.move_to_end(key)
+                values[key] = value
+        if not missing:
+            return values
+
+        fetched = self._store.getitems(missing, contexts=contexts)
+        with self._mutex:
+            self.misses += len(missing)
+            for key, value in fetched.items():
+                if key not in self._values_cache:
+                    self._cache_value(key, value)
+        values.update(fetched)
+        return values
+
+
+def open_cached(store, mode="r", cache_size=None):
+    """Open a zarr group/array through a bounded LRU chunk cache of
+    `cache_size` bytes, `CHUNK_CACHE_SIZE` by default and disabled by 0."""
+    if cache_size is None:
+        cache_size = CHUNK_CACHE_SIZE
+    if cache_size:
+        store = LRUChunkCache(store, max_size=cache_size)
+    return zarr.open(store, mode)
+
+
+def _transforms(transformations, ndim):
+    scale = [1.0] * ndim
+    translation = [0.0] * ndim
+    for transformation in transformations or []:
+        if transformation.get("type") == "scale":
+            scale = list(transformation["scale"])[-ndim:]
+        elif transformation.get("type") == "translation":
+            translation = list(transformation["translation"])[-ndim:]
+    return scale, translation
+
+
+def read_multiscales(group, ndim=3):
+    """Paths, scales and translations of the levels of an OME-Zarr group.
+
+    Returns a list of (path, scale, translation) tuples ordered from the
+    highest to the lowest resolution, or None if the group has no
+    multiscales metadata.
+    """
+    multiscales = group.attrs.get("multiscales")
+    if not multiscales:
+        return None
+
+    metadata = multiscales[0]
+    global_scale, global_translation = _transforms(
+        metadata.get("coordinateTransformations"), ndim
+    )
+    levels = []
+    for dataset in metadata["datasets"]:
+        scale, translation = _transforms(
+            dataset.get("coordinateTransformations"), ndim
+        )
+        levels.append(
+            (
+                dataset["path"],
+                [s * gs for s, gs in zip(scale, global_scale)],
+                [
+                    t * gs + gt
+                    for t, gs, gt in zip(
+                        translation, global_scale, global_translation
+                    )
+                ],
+            )
+        )
+    return levels
+
+
+def multiscale_levels(group, voxel_size, ndim=3):
+    """Like `read_multiscales`, falling back to the numbered arrays of the
+    group with power-of-two downsampling when there is no metadata."""
+    levels = read_multiscales(group, ndim)
+    if levels:
+        return levels
+
+    paths = sorted((key for key in group if key.isdigit()), key=int)
+    return [
+        (
+            path,
+            [voxel_size * 2 ** int(path)] * ndim,
+            [voxel_size * (2 ** int(path) - 1) / 2] * ndim,
+        )
+        for path in paths
+    ]
+
+
+def reopen_array(array, **kwargs):
+    """Reopen a zarr array with different runtime options, e.g.
+    `write_empty_chunks`, which is not stored in the array metadata."""
+    return zarr.Array(
+        array.store,
+        path=array.path,
+        read_only=array.read_only,
+        chunk_store=array.chunk_store,
+        synchronizer=array.synchronizer,
+        **kwargs,
+    )
+
+
+def lazy_levels(node, voxel_size, ndim=3, **kwargs):
+    """Lazy arrays of a zarr array or (multiscale) group, with the scale and
+    translation of the highest resolution.
+
+    Nothing is read besides metadata, chunks are loaded on access. Keyword
+    arguments are runtime options the arrays are reopened with.
+    """
+    if isinstance(node, zarr.Array):
+        arrays = [node]
+        scale, translation = [voxel_size] * ndim, [0.0] * ndim
+    # Legacy single-resolution layout written by create_segmentation
+    elif read_multiscales(node, ndim) is None and "data" in node:
+        arrays = [node["data"]]
+        scale, translation = [voxel_size] * ndim, [0.0] * ndim
+    else:
+        levels = multiscale_levels(node, voxel_size, ndim)
+        if not levels:
+            raise ValueError(f"No arrays found in zarr group {node.store}")
+        _, scale, translation = levels[0]
+        arrays = [node[path] for path, _, _ in levels]
+
+    if kwargs:
+        arrays = [reopen_array(array, **kwargs) for array in arrays]
+    return arrays, scale, translation
+
+
+def label_dtype(max_label):
+    """Smallest of `LABEL_DTYPES` that holds `max_label`."""
+    for dtype in LABEL_DTYPES:
+        if max_label <= np.iinfo(dtype).max:
+            return dtype
+    return LABEL_DTYPES[-1]
+
+
+def create_label_array(
+    group,
+    name,
+    shape,
+    dtype="int32",
+    chunks=(128, 128, 128),
+    compressor="blosc-zstd",
+):
+    """Create an empty label array. Chunks that only hold zeros are never
+    written."""
+    if isinstance(compressor, str):
+        compressor = COMPRESSORS[compressor]
+    return group.create_dataset(
+        name,
+        shape=shape,
+        dtype=dtype,
+        chunks=chunks,
+        fill_value=0,
+        compressor=compressor,
+        write_empty_chunks=False,
+    )
+
+
+class ZChunkPrefetcher:
+    """Reads the chunks around a Z slice of a multiscale array in a
+    background thread, so they are in the chunk cache when scrolled to."""
+
+    def __init__(self, arrays, radius=1, max_workers=1):
+        self.arrays = arrays
+        self.radius = radius
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="cellcanvas-prefetch"
+        )
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._requested = None
+
+    def prefetch(self, level, z):
+        array = self.arrays[level]
+        chunk_z = int(z) // array.chunks[0]
+        if (level, chunk_z) == self._requested:
+            return
+        self._requested = (level, chunk_z)
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        self._executor.submit(self._fetch, generation, array, chunk_z)
+
+    def _fetch(self, generation, array, chunk_z):
+        grid = [
+            range((size + chunk - 1) // chunk)
+            for size, chunk in zip(array.shape[1:], array.chunks[1:])
+        ]
+        # Nearest slabs first
+        offsets = sorted(range(-self.radius, self.radius + 1), key=abs)
+        for offset in offsets:
+            index = chunk_z + offset
+            if offset == 0 or not 0 <= index < array.cdata_shape[0]:
+                continue
+            for coords in itertools.product(*grid):
+                # Superseded by a newer slice position
+                if generation != self._generation:
+                    return
+                with contextlib.suppress(KeyError):
+                    array.store[array._chunk_key((index, *coords))]
+
+    def shutdown(self):
+        with self._lock:
+            self._generation += 1
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProfiledStore(Store):
+    """Store wrapper that records the time and size of every chunk read and
+    write with a profiler, while it is enabled."""
+
+    def __init__(self, store, profiler, name=""):
+        self.store = store
+        self.profiler = profiler
+        self.name = name
+
+    def __getitem__(self, key):
+        if not self.profiler.enabled:
+            return self.store[key]
+        start = time.perf_counter()
+        value = self.store[key]
+        self.profiler.add(
+            "read_chunk",
+            "zarr",
+            start,
+            time.perf_counter(),
+            len(value),
+            store=self.name,
+            key=key,
+        )
+        return value
+
+    def getitems(self, keys, *, contexts):
+        if not self.profiler.enabled:
+            return self.store.getitems(keys, contexts=contexts)
+        # Batches are fetched concurrently, and recorded as one operation
+        start = time.perf_counter()
+        values = self.store.getitems(keys, contexts=contexts)
+        self.profiler.add(
+            "read_chunks",
+            "zarr",
+            start,
+            time.perf_counter(),
+            sum(len(value) for value in values.values()),
+            store=self.name,
+            chunks=len(values),
+        )
+        return values
+
+    def __setitem__(self, key, value):
+        if not self.profiler.enabled:
+            self.store[key] = value
+            return
+        start = time.perf_counter()
+        self.store[key] = value
+        self.profiler.add(
+            "write_chunk",
+            "zarr",
+            start,
+            time.perf_counter(),
+            len(value),
+            store=self.name,
+            key=key,
+        )
+
+    def __delitem__(self, key):
+        del self.store[key]
+
+    def __contains__(self, key):
+        return key in self.store
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __len__(self):
+        return len(self.store)
+
+    def listdir(self, path=None):
+        return listdir(self.store, path)
+
+    def rmdir(self, path=None):
+        rmdir(self.store, path)
+
+
+def profiled(store, profiler, name=""):
+    """Wrap `store` in a `ProfiledStore`, also when profiling is disabled,
+    as it can be enabled while the store is open."""
+    if profiler is None:
+        return store
+    return ProfiledStore(store, profiler, name)
+
+
+# Chunks of writable stores cached longer ago are read again, in case they
+# were written by someone else
+WRITABLE_CACHE_AGE = 600
+
+
+class DiskCacheStore(Store):
+    """Read-through wrapper of a remote store that keeps its chunks in a
+    `DiskChunkCache`, across sessions.
+
+    Metadata is always read from the store. Writes go to the store and
+    update the cache. Chunks of writable stores expire `max_age` seconds
+    after they were cached, and are dropped with `invalidate` when they are
+    known to have changed.
+    """
+
+    def __init__(self, store, cache, location, max_age=None):
+        self.store = store
+        self.cache = cache
+        self.location = location
+        self.max_age = max_age
+
+    def _is_metadata(self, key):
+        return key.rsplit("/", 1)[-1] in METADATA_KEYS
+
+    def __getitem__(self, key):
+        if self._is_metadata(key):
+            return self.store[key]
+        value = self.cache.get(self.location, key, self.max_age)
+        if value is None:
+            value = self.store[key]
+            self.cache.put(self.location, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        self.store[key] = value
+        if not self._is_metadata(key):
+            self.cache.put(self.location, key, value)
+
+    def __delitem__(self, key):
+        try:
+            del self.store[key]
+        finally:
+            self.cache.discard(self.location, key)
+
+    def getitems(self, keys, *, contexts):
+        values = {}
+        missing = []
+        for key in keys:
+            value = None
+            if not self._is_metadata(key):
+                value = self.cache.get(self.location, key, self.max_age)
+            if value is None:
+                missing.append(key)
+            else:
+                values[key] = value
+        if not missing:
+            return values
+
+        fetched = self.store.getitems(missing, contexts=contexts)
+        for key, value in fetched.items():
+            if not self._is_metadata(key):
+                self.cache.put(self.location, key, value)
+        values.update(fetched)
+        return values
+
+    def __contains__(self, key):
+        # Cached chunks are not looked up in the store
+        if self.is_cached(key):
+            return True
+        return key in self.store
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __len__(self):
+        return len(self.store)
+
+    def listdir(self, path=None):
+        return listdir(self.store, path)
+
+    def rmdir(self, path=None):
+        rmdir(self.store, path)
+        self.invalidate()
+
+    def is_cached(self, key):
+        if self._is_metadata(key):
+            return False
+        return self.cache.contains(self.location, key, self.max_age)
+
+    def invalidate(self):
+        self.cache.invalidate(self.location)
+
+
+def disk_cached(store, cache, location, max_age=None):
+    """Wrap `store`, found at `location`, in a `DiskCacheStore`. Local
+    stores, unknown locations and a None cache are returned as is."""
+    if cache is None or location is None:
+        return store
+    if location.startswith(("file://", "local://")):
+        return store
+    return DiskCacheStore(store, cache, location, max_age=max_age)
+
+
+def wrapped_stores(store):
+    """`store` and the stores it wraps, outermost first."""
+    seen = set()
+    while store is not None and id(store) not in seen:
+        seen.add(id(store))
+        yield store
+        # zarr.LRUStoreCache keeps its store private
+        store = getattr(store, "store", getattr(store, "_store", None))
+
+
+def invalidate_disk_cache(store):
+    for wrapped in wrapped_stores(store):
+        if isinstance(wrapped, DiskCacheStore):
+            wrapped.invalidate()
+
+
+def warm_cache(store, max_workers=8):
+    """Read the chunks of all arrays below a `DiskCacheStore` that are not
+    in its cache yet, smallest, i.e. coarsest, arrays first.
+
+    Returns the number of chunks fetched.
+    """
+    node = zarr.open(store, "r")
+    if isinstance(node, zarr.Array):
+        arrays = [node]
+    else:
+        arrays = [array for _, array in node.arrays(recurse=True)]
+    arrays.sort(key=lambda array: array.nbytes)
+
+    def fetch(key):
+        try:
+            store[key]
+        except KeyError:
+            # Chunks never written are read as the fill value
+            return 0
+        return 1
+
+    fetched = 0
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="cellcanvas-warm"
+    ) as executor:
+        for array in arrays:
+            keys = [
+                key
+                for key in (
+                    array._chunk_key(coords)
+                    for coords in itertools.product(
+                        *(range(n) for n in array.cdata_shape)
+                    )
+                )
+                if not store.is_cached(key)
+            ]
+            fetched += sum(executor.map(fetch, keys))
+    return fetched
+
+
+_DELETED = object()
+
+METADATA_KEYS = (".zarray", ".zgroup", ".zattrs", ".zmetadata")
+
+
+class WriteBehindStore(Store):
+    """Store wrapper that keeps written chunks in memory until flushed.
+
+    Chunk writes and deletions are recorded as dirty keys and served from
+    memory, `flush` writes only those to the wrapped store. Metadata is
+    written through immediately. Flushed keys are collected until
+    `pop_flushed_keys`, so derived data can be updated for them.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._dirty = {}
+        self._flushed = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _is_metadata(self, key):
+        return key.rsplit("/", 1)[-1] in METADATA_KEYS
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = self._dirty.get(key)
+        if value is _DELETED:
+            raise KeyError(key)
+        if value is not None:
+            return value
+        return self.store[key]
+
+    def getitems(self, keys, *, contexts):
+        values = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                value = self._dirty.get(key)
+                if value is None:
+                    missing.append(key)
+                elif value is not _DELETED:
+                    values[key] = value
+        if missing:
+            values.update(self.store.getitems(missing, contexts=contexts))
+        return values
+
+    def __setitem__(self, key, value):
+        if self._is_metadata(key):
+            self.store[key] = value
+            return
+        with self._lock:
+            self._dirty[key] = value
+
+    def __delitem__(self, key):
+        if self._is_metadata(key):
+            del self.store[key]
+            return
+        if key not in self:
+            raise KeyError(key)
+        with self._lock:
+            self._dirty[key] = _DELETED
+
+    def __contains__(self, key):
+        with self._lock:
+            value = self._dirty.get(key)
+        if value is not None:
+            return value is not _DELETED
+        return key in self.store
+
+    def _dirty_keys(self):
+        with self._lock:
+            written = {k for k, v in self._dirty.items() if v is not _DELETED}
+            deleted = {k for k, v in self._dirty.items() if v is _DELETED}
+        return written, deleted
+
+    def __iter__(self):
+        written, deleted = self._dirty_keys()
+        for key in self.store:
+            if key not in deleted and key not in written:
+                yield key
+        yield from written
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def listdir(self, path=None):
+        written, deleted = self._dirty_keys()
+        prefix = f"{path.rstrip('/')}/" if path else ""
+        names = set(listdir(self.store, path))
+        for key in written | deleted:
+            if key.startswith(prefix):
+                name = key[len(prefix) :].split("/", 1)[0]
+                if key in written:
+                    names.add(name)
+                elif key == prefix + name:
+                    names.discard(name)
+        return sorted(names)
+
+    def rmdir(self, path=None):
+        prefix = f"{path.rstrip('/')}/" if path else ""
+        with self._lock:
+            for key in [k for k in self._dirty if k.startswith(prefix)]:
+                del self._dirty[key]
+        self.store.rmdir(path)
+
+    @property
+    def dirty_count(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def dirty_chunks(self):
+        with self._lock:
+            return list(self._dirty)
+
+    def discard(self):
+        """Drop the dirty chunks, after a running flush, e.g. when the
+        stored data was replaced."""
+        with self._flush_lock, self._lock:
+            self._dirty.clear()
+
+    def pop_flushed_keys(self):
+        with self._lock:
+            keys, self._flushed = self._flushed, set()
+        return keys
+
+    def prepare_flush(self):
+        return self.flush
+
+    def finish_flush(self, error=None):
+        # Chunks stay dirty until written, there is nothing to undo
+        pass
+
+    def flush(self, progress=None):
+        """Write the dirty chunks to the wrapped store.
+
+        Chunks written again while flushing stay dirty. Returns the number
+        of chunks flushed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._dirty.items())
+            for i, (key, value) in enumerate(items, 1):
+                if value is _DELETED:
+                    with contextlib.suppress(KeyError):
+                        del self.store[key]
+                else:
+                    self.store[key] = value
+                with self._lock:
+                    self._flushed.add(key)
+                    if self._dirty.get(key) is value:
+                        del self._dirty[key]
+                if progress is not None:
+                    progress(i, len(items))
+            return len(items)
@@ -1,15 +1,262 @@
-import napari
+import os
+from typing import TYPE_CHECKING
+
 import numpy as np
 from qtpy.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QComboBox, QLabel, 
-                            QLineEdit, QFormLayout, QScrollArea, QTreeWidget, QTreeWidgetItem,
-                            QHBoxLayout, QMenu, QAction, QSpinBox, QCheckBox, QListWidget,
-                            QListWidgetItem)
-from qtpy.QtCore import Qt
-import requests
-import copick
-import zarr
+                            QLineEdit, QFormLayout, QScrollArea, QTreeView,
+                            QHBoxLayout, QMenu, QAction, QSpinBox, QDoubleSpinBox, QCheckBox, QListWidget,
+                            QListWidgetItem, QFileDialog, QMessageBox)
+from qtpy.QtCore import Qt, QTimer
+from functools import partial
+from napari.qt.threading import create_worker
 from napari.utils import DirectLabelColormap
 
+# copick, zarr and requests take a second to import. They are imported
+# where first used, from the project and catalog loading workers, so that
+# opening the widget does not block napari
+from ._client import CellCanvasClient
+from ._contrast import StatsCache
+from ._diskcache import DISK_CACHE_SIZE, DiskChunkCache
+from ._index import ProjectIndex, RunChoices
+from ._jobs import DONE, JobManager, JobsWidget
+from ._layers import MEMORY_BUDGET, LayerRegistry
+from ._picks import (PicksLayerLink, object_colors, pick_sets_to_points,
+                     point_sizes)
+from ._profiling import Profiler, timed
+from ._profiling_widget import ProfilerWidget
+from ._tree import ProjectTreeModel, TreeNode
+from ._writeback import WriteBackManager, WriteBackStatusWidget
+
+if TYPE_CHECKING:
+    import napari
+
+# Number of children added to the tree per batch during expansion
+EXPAND_BATCH_SIZE = 50
+# Delay between the last key typed in the filter box and the search
+FILTER_DELAY_MS = 150
+LOADING_TEXT = "Loading\u2026"
+NO_PROJECT_TEXT = "No project, use Open Project\u2026"
+SERVER_UNAVAILABLE_TEXT = "Server unavailable, Refresh to retry"
+# Points layers with more points only hold those near the Z slice
+CULL_POINTS = 20000
+# Margin of their slab past the largest point, in point sizes, so that it
+# only moves every few slices
+SLAB_MARGIN = 4
+# Copick configuration opened when none is passed to the widget
+CONFIG_ENV = "CELLCANVAS_COPICK_CONFIG"
+
+
+def load_project(path, profiler):
+    with profiler.span("load_project", "copick"):
+        import copick
+
+        root = copick.from_file(path)
+        return path, root, ProjectIndex(root, profiler=profiler)
+
+
+def solution_runs(solution_args):
+    """Names of the runs a solution reads or writes, from its arguments."""
+    run_names = []
+    for arg_name in ("run_name", "run_names", "train_run_names", "val_run_names"):
+        value = solution_args.get(arg_name)
+        if value:
+            run_names += [name for name in value.split(", ") if name]
+    return list(dict.fromkeys(run_names))
+
+
+def takes_model(solution_info):
+    """Whether a solution has a `model_path` argument, chosen from the
+    models of the server."""
+    args = (solution_info or {}).get("args", [])
+    return any(arg.get("name") == "model_path" for arg in args)
+
+
+def run_with_outputs(index, fn, catalog, group, name, version, solution_args):
+    """Run a solution and diff the listings of its runs before and after.
+
+    Returns the solution result and, for each indexed run, the entities it
+    added and the keys of those it removed.
+    """
+    run_names = [
+        run_name
+        for run_name in solution_runs(solution_args)
+        if run_name in index.runs
+    ]
+    # Listed in full before the solution runs, which is only slow the first
+    # time a run is listed
+    before = {run_name: index.run_entities(run_name) for run_name in run_names}
+    result = fn(catalog, group, name, version, solution_args)
+    outputs = {
+        run_name: index.diff_run(run_name, before[run_name])
+        for run_name in run_names
+    }
+    return result, outputs
+
+
+def new_segmentation(
+    index,
+    run_name,
+    name,
+    session_id,
+    user_id,
+    voxel_size,
+    dtype="int32",
+    chunks=(128, 128, 128),
+    compressor="blosc-zstd",
+    shape=None,
+):
+    """Create an empty multilabel segmentation of a run, shaped like its
+    tomograms at `voxel_size` unless `shape` is given."""
+    import zarr
+
+    from ._zarr import create_label_array
+
+    if voxel_size not in index.voxel_sizes(run_name):
+        raise ValueError(f"No voxel size {voxel_size} in {run_name}")
+    if shape is None:
+        shape = index.volume_shape(run_name, voxel_size)
+    if shape is None:
+        raise ValueError(
+            f"No tomogram found at voxel size {voxel_size} in {run_name}"
+        )
+    segmentation = index.get_run(run_name).new_segmentation(
+        voxel_size=voxel_size,
+        name=name,
+        session_id=str(session_id),
+        is_multilabel=True,
+        user_id=user_id,
+    )
+    create_label_array(
+        zarr.open(segmentation.zarr(), mode="w"),
+        "data",
+        shape,
+        dtype=dtype,
+        chunks=chunks,
+        compressor=compressor,
+    )
+    return segmentation
+
+
+def shared_volume_shape(index, run_names, voxel_size):
+    """Shape of the tomograms at `voxel_size` of the first of `run_names`
+    that has any, for runs all reconstructed with the same shape. None if
+    none has."""
+    for run_name in run_names:
+        if voxel_size not in index.voxel_sizes(run_name):
+            continue
+        shape = index.volume_shape(run_name, voxel_size)
+        if shape is not None:
+            return shape
+    return None
+
+
+def new_picks(index, run_name, object_name, session_id, user_id):
+    return index.get_run(run_name).new_picks(
+        object_name=object_name,
+        session_id=str(session_id),
+        user_id=user_id,
+    )
+
+
+def create_in_runs(index, fn, run_names, max_workers=None):
+    """Call `fn(index, run_name)` for each run on a thread pool, and re-list
+    the runs it changed.
+
+    Yields the run name, the result and the error of each run as they
+    finish.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    def create(run_name):
+        result = fn(index, run_name)
+        index.refresh_run(run_name, force=True)
+        return result
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="cellcanvas-create"
+    ) as executor:
+        futures = {
+            executor.submit(create, run_name): run_name
+            for run_name in run_names
+        }
+        for future in as_completed(futures):
+            error = future.exception()
+            result = None if error is not None else future.result()
+            yield futures[future], result, error
+
+
+def tomogram_key(tomogram):
+    return (
+        "tomogram",
+        tomogram.voxel_spacing.run.meta.name,
+        tomogram.voxel_spacing.meta.voxel_size,
+        tomogram.meta.tomo_type,
+    )
+
+
+def features_key(features):
+    return (
+        "features",
+        *tomogram_key(features.tomogram)[1:],
+        features.meta.feature_type,
+    )
+
+
+def picks_key(pick_set):
+    return (
+        "picks",
+        pick_set.run.meta.name,
+        pick_set.meta.user_id,
+        pick_set.meta.session_id,
+        pick_set.meta.pickable_object_name,
+    )
+
+
+def segmentation_key(segmentation):
+    return (
+        segmentation.run.meta.name,
+        segmentation.meta.voxel_size,
+        segmentation.meta.user_id,
+        segmentation.meta.session_id,
+        segmentation.meta.name,
+    )
+
+
+def iter_batches(items, size=EXPAND_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def iter_run_children(index, run_name):
+    # Listing happens on first access only, later expansions are served from
+    # the index without touching storage
+    entry = index.load_run(run_name)
+    yield "voxel_spacings", []
+    for batch in iter_batches(index.voxel_spacings(run_name)):
+        yield "voxel_spacings", batch
+    yield "picks", []
+    for batch in iter_batches(list(entry.picks)):
+        yield "picks", batch
+
+
+def iter_voxel_spacing_children(index, run_name, voxel_size):
+    voxel_spacing_entry = index.load_voxel_spacing(run_name, voxel_size)
+    yield "tomograms", []
+    for batch in iter_batches(list(voxel_spacing_entry.tomograms)):
+        yield "tomograms", batch
+    yield "segmentations", []
+    for batch in iter_batches(index.segmentations(run_name, voxel_size)):
+        yield "segmentations", batch
+    # Shown under their tomograms
+    features = [
+        feature
+        for tomogram_features in voxel_spacing_entry.features.values()
+        for feature in tomogram_features
+    ]
+    for batch in iter_batches(features):
+        yield "features", batch
+
+
 class MultiSelectComboBox(QComboBox):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -35,45 +282,137 @@ class MultiSelectComboBox(QComboBox):
         return ", ".join(self.selectedItems())
 
 class CellCanvasWidget(QWidget):
-    def __init__(self, viewer=None, copick_config_path="/Users/kharrington/Data/copick/cellcanvas_server/local_sshOverlay_localStatic.json", hostname="localhost", port=8082, parent=None):
+    def __init__(self, viewer: "napari.viewer.Viewer" = None, copick_config_path=None, hostname="localhost", port=8082, max_jobs=2, request_timeout=(3.05, 30), chunk_cache_size=None, prefetch_radius=1, flush_interval=10, pyramid_workers=None, stats_cache_path=None, memory_budget=MEMORY_BUDGET, disk_cache_path=None, disk_cache_size=DISK_CACHE_SIZE, profile=None, parent=None):
         super().__init__(parent)
         self.viewer = viewer
         self.setWindowTitle("CellCanvas Widget")
         self.hostname = hostname
         self.port = port
-        self.copick_config_path = copick_config_path
+        self.copick_config_path = copick_config_path or os.environ.get(
+            CONFIG_ENV
+        )
+        # Opt-in timings of listings, chunk reads, requests and layer
+        # creation, also enabled by the CELLCANVAS_PROFILE environment variable
+        self.profiler = Profiler(enabled=profile)
+        self.client = CellCanvasClient(
+            hostname, port, timeout=request_timeout, profiler=self.profiler
+        )
+        self.chunk_cache_size = chunk_cache_size
+        # Contrast limits and histograms of opened tomograms, persisted in
+        # `stats_cache_path`
+        self.stats_cache = StatsCache(stats_cache_path)
+        # Chunks of remote stores, kept on disk across sessions up to
+        # `disk_cache_size` bytes, disabled by 0
+        self.disk_cache = (
+            DiskChunkCache(disk_cache_path, disk_cache_size)
+            if disk_cache_size
+            else None
+        )
+        self.prefetch_radius = prefetch_radius
+        self._prefetchers = {}
+        # Slab updates of the culled points layers
+        self._culled_layers = {}
+        # Layer whose edits are saved to each pick set, by picks_key
+        self._pick_set_layers = {}
+        # Thread pool projecting feature chunks of PCA views, started with
+        # the first one
+        self._pca_executor = None
+        self.pyramid_max_workers = pyramid_workers
+        # Label pyramids updated from painted chunks, and the running and
+        # queued pyramid builds
+        self._pyramid_stores = {}
+        self._pyramid_workers = {}
+        self._pending_pyramid_regions = {}
         self.layout = QVBoxLayout(self)
+
+        # Pending expansions, keyed by the copick object being expanded
+        self._expansion_workers = {}
+        # Tree nodes of the runs, by name
+        self._run_nodes = {}
         
-        # Load Copick project
-        self.root = copick.from_file(self.copick_config_path)
-        
+        # The project and the solution catalog are loaded in the background
+        # once the widget is shown, see `start_loading`
+        self.root = None
+        self.index = None
+        self._loading_started = False
+
+        project_layout = QHBoxLayout()
+        self.project_label = QLabel(self)
+        project_layout.addWidget(self.project_label, 1)
+        self.open_project_button = QPushButton("Open Project\u2026", self)
+        self.open_project_button.clicked.connect(self.choose_project)
+        project_layout.addWidget(self.open_project_button)
+        self.layout.addLayout(project_layout)
+
         # Add refresh button
         self.refresh_button = QPushButton("Refresh", self)
         self.refresh_button.clicked.connect(self.refresh_tree)
         self.layout.addWidget(self.refresh_button)
-        
-        # Hierarchical tree view
-        self.tree_view = QTreeWidget()
-        self.tree_view.setHeaderLabel("Copick Project")
-        self.tree_view.itemExpanded.connect(self.handle_item_expand)
-        self.tree_view.itemClicked.connect(self.handle_item_click)
-        self.tree_view.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tree_view.customContextMenuRequested.connect(
-            self.open_context_menu
+        # The same segmentation or pick set created in many runs at once
+        self.bulk_create_button = QPushButton("Create in Runs\u2026", self)
+        self.bulk_create_button.clicked.connect(
+            lambda: self.show_bulk_create_widget()
         )
+        self.layout.addWidget(self.bulk_create_button)
+        
+        # Runs, tomograms, segmentations and pick sets are found by name
+        # from the search index, the results replace the tree while filtering
+        self.filter_input = QLineEdit(self)
+        self.filter_input.setPlaceholderText("Filter\u2026")
+        self.filter_input.setClearButtonEnabled(True)
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(FILTER_DELAY_MS)
+        self._filter_timer.timeout.connect(lambda: self.filter_tree())
+        self.filter_input.textChanged.connect(self.schedule_filter)
+        self.layout.addWidget(self.filter_input)
+
+        # Hierarchical tree view. The model only exposes a page of rows at a
+        # time and lists runs and voxel spacings when first expanded
+        self.tree_model = ProjectTreeModel("Copick Project", parent=self)
+        self.tree_model.fetch_requested.connect(self.fetch_node)
+        self.tree_view = QTreeView(self)
+        self.tree_view.setModel(self.tree_model)
+        self.tree_view.setUniformRowHeights(True)
         self.layout.addWidget(self.tree_view)
 
+        self.search_model = ProjectTreeModel("Search Results", parent=self)
+        self.search_view = QTreeView(self)
+        self.search_view.setModel(self.search_model)
+        self.search_view.setUniformRowHeights(True)
+        self.search_view.setRootIsDecorated(False)
+        self.search_view.hide()
+        self.layout.addWidget(self.search_view)
+
+        for view in (self.tree_view, self.search_view):
+            view.clicked.connect(self.handle_item_click)
+            view.setContextMenuPolicy(Qt.CustomContextMenu)
+            view.customContextMenuRequested.connect(
+                partial(self.open_context_menu, view)
+            )
+
+        # Painted segmentations and edited picks are written back in the
+        # background
+        self.writeback = WriteBackManager(flush_interval, parent=self)
+        self.writeback_status = WriteBackStatusWidget(self.writeback, self)
+        self.writeback.flushed.connect(self.handle_flushed)
+        self.layout.addWidget(self.writeback_status)
+
+        # Objects opened again select their layer. Least recently used layers
+        # are unloaded, then closed, above `memory_budget` bytes
+        self.layer_registry = LayerRegistry(
+            self.viewer, self.writeback, memory_budget=memory_budget, parent=self
+        )
+
         # Run selection dropdown
         self.run_dropdown = QComboBox(self)
         self.layout.addWidget(QLabel("Select Run:"))
         self.layout.addWidget(self.run_dropdown)
-        self.populate_run_dropdown()
         
         # Solution selection dropdown
         self.solution_dropdown = QComboBox(self)
         self.layout.addWidget(QLabel("Select Solution:"))
         self.layout.addWidget(self.solution_dropdown)
-        self.populate_solution_dropdown()
         
         # Scroll area for solution arguments
         self.scroll_area = QScrollArea(self)
@@ -81,158 +420,750 @@ class CellCanvasWidget(QWidget):
         self.scroll_content = QWidget()
         self.scroll_layout = QFormLayout(self.scroll_content)
         self.scroll_area.setWidget(self.scroll_content)
+        # Shown instead of the form while the selected run is indexed, rows
+        # of the form are label/field pairs only
+        self.form_status_label = QLabel(LOADING_TEXT, self)
+        self.form_status_label.setVisible(False)
+        self.layout.addWidget(self.form_status_label)
         self.layout.addWidget(self.scroll_area)
         
         # Run solution button
         self.run_button = QPushButton("Run Solution", self)
-        self.run_button.clicked.connect(self.run_solution)
+        self.run_button.clicked.connect(lambda: self.run_solution())
         self.layout.addWidget(self.run_button)
+
+        # Entities created by a finished solution are added to the tree, and
+        # optionally opened. Open layers of its runs are re-read
+        self.open_outputs_checkbox = QCheckBox("Open Solution Outputs", self)
+        self.layout.addWidget(self.open_outputs_checkbox)
+
+        # Batch mode runs the solution once per selected run, with the other
+        # arguments of the form
+        batch_layout = QFormLayout()
+        self.batch_runs = MultiSelectComboBox(self)
+        batch_layout.addRow("Batch Runs:", self.batch_runs)
+        self.batch_concurrency = QSpinBox(self)
+        self.batch_concurrency.setRange(1, 64)
+        self.batch_concurrency.setValue(4)
+        batch_layout.addRow("Concurrency:", self.batch_concurrency)
+        self.batch_retries = QSpinBox(self)
+        self.batch_retries.setRange(0, 10)
+        self.batch_retries.setValue(2)
+        batch_layout.addRow("Retries:", self.batch_retries)
+        self.layout.addLayout(batch_layout)
+        batch_buttons = QHBoxLayout()
+        self.batch_button = QPushButton("Run on Selected Runs", self)
+        self.batch_button.clicked.connect(lambda: self.run_batch())
+        batch_buttons.addWidget(self.batch_button)
+        self.cancel_batch_button = QPushButton("Cancel Batch", self)
+        self.cancel_batch_button.setEnabled(False)
+        self.cancel_batch_button.clicked.connect(self.cancel_batch)
+        batch_buttons.addWidget(self.cancel_batch_button)
+        self.layout.addLayout(batch_buttons)
+        self.batch_status = QLabel(self)
+        self.layout.addWidget(self.batch_status)
+        self._batch = None
+
+        # Solutions run in the background, tracked in the jobs panel
+        self.job_manager = JobManager(max_workers=max_jobs, parent=self)
+        self.job_manager.job_finished.connect(self.handle_job_finished)
+        self.job_manager.batch_progress.connect(self.update_batch_status)
+        self.jobs_widget = JobsWidget(self.job_manager)
+        if self.viewer is not None:
+            self.viewer.window.add_dock_widget(
+                self.jobs_widget, area="right", name="CellCanvas Jobs"
+            )
+            self.viewer.layers.events.removed.connect(
+                self.handle_layer_removed
+            )
+            if self.profiler.enabled:
+                self.profiler_widget = ProfilerWidget(self.profiler)
+                self.viewer.window.add_dock_widget(
+                    self.profiler_widget, area="right", name="CellCanvas Stats"
+                )
         
         self.setLayout(self.layout)
-        self.solution_dropdown.currentIndexChanged.connect(self.update_solution_args)
+        # Timed slots take no signal arguments
+        self.solution_dropdown.currentIndexChanged.connect(
+            lambda: self.update_solution_args()
+        )
+        self.run_dropdown.currentIndexChanged.connect(
+            lambda: self.update_solution_args()
+        )
+        self._form_complete = True
+        # Counts form updates, to drop solution info fetched for an older one
+        self._form_generation = 0
+        self.project_label.setText(self.copick_config_path or "")
+        self.show_tree_placeholder(
+            LOADING_TEXT if self.copick_config_path else NO_PROJECT_TEXT
+        )
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.start_loading()
+
+    def start_loading(self):
+        """Load the project and the solution catalog in the background,
+        once. Called when the widget is first shown."""
+        if self._loading_started:
+            return
+        self._loading_started = True
+        if self.copick_config_path:
+            self.open_project(self.copick_config_path)
+        self.populate_solution_dropdown()
+
+    def choose_project(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Open Copick Project", "", "Copick configuration (*.json)"
+        )
+        if path:
+            self._loading_started = True
+            self.open_project(path)
+
+    def open_project(self, path):
+        self.copick_config_path = path
+        self.project_label.setText(path)
+        self.refresh_button.setEnabled(False)
+        self.show_tree_placeholder(LOADING_TEXT)
+        worker = create_worker(load_project, path, self.profiler)
+        worker.returned.connect(self._on_project_loaded)
+        worker.errored.connect(partial(self._on_project_error, path))
+        worker.start()
+
+    def _on_project_loaded(self, result):
+        path, root, index = result
+        # Superseded by a project opened while this one was loading
+        if path != self.copick_config_path:
+            return
+        self.root = root
+        self.index = index
+        self.refresh_button.setEnabled(True)
+        self.populate_run_dropdown()
         self.populate_tree()
+        self.filter_tree()
+        # Choices for the solution arguments of all runs, listed once in the
+        # background
+        self.build_choices()
+        self.update_solution_args()
+
+    def _on_project_error(self, path, error):
+        print(f"Error loading project {path}: {error}")
+        if path == self.copick_config_path:
+            self.refresh_button.setEnabled(True)
+            self.show_tree_placeholder(f"Could not load {path}")
+
+    def show_tree_placeholder(self, text):
+        self._expansion_workers = {}
+        self._run_nodes = {}
+        self.tree_model.reset([TreeNode(text, enabled=False)])
 
     def populate_run_dropdown(self):
+        selected_run = self.run_dropdown.currentText()
         self.run_dropdown.clear()
-        for run in self.root.runs:
-            self.run_dropdown.addItem(run.meta.name)        
-
+        for run_name in self.index.run_names():
+            self.run_dropdown.addItem(run_name)
+        if selected_run:
+            self.run_dropdown.setCurrentText(selected_run)
+
+        batch_runs = set(self.batch_runs.selectedItems())
+        self.batch_runs.view().clear()
+        self.batch_runs.addItems(self.index.run_names())
+        for i in range(self.batch_runs.view().count()):
+            item = self.batch_runs.view().item(i)
+            if item.text() in batch_runs:
+                item.setCheckState(Qt.Checked)
+
+    @timed()
     def populate_tree(self):
-        self.tree_view.clear()
-        for run in self.root.runs:
-            run_item = QTreeWidgetItem(self.tree_view, [run.meta.name])
-            run_item.setData(0, Qt.UserRole, run)
-            run_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
-
-    def handle_item_expand(self, item):
-        data = item.data(0, Qt.UserRole)
-        if isinstance(data, copick.models.CopickRun):
-            self.expand_run(item, data)
-        elif isinstance(data, copick.models.CopickVoxelSpacing):
-            self.expand_voxel_spacing(item, data)
-
-    def expand_run(self, item, run):
-        if not item.childCount():
-            for voxel_spacing in run.voxel_spacings:
-                spacing_item = QTreeWidgetItem(
-                    item, [f"Voxel Spacing: {voxel_spacing.meta.voxel_size}"]
-                )
-                spacing_item.setData(0, Qt.UserRole, voxel_spacing)
-                spacing_item.setChildIndicatorPolicy(
-                    QTreeWidgetItem.ShowIndicator
-                )
+        # Pending expansions target nodes of the old tree, drop their results.
+        # Only the first page of runs is shown, the view fetches the others
+        # when scrolled to
+        self._expansion_workers = {}
+        self._run_nodes = {}
+        self.tree_model.reset(
+            [self.make_run_node(run_name) for run_name in self.index.run_names()]
+        )
 
-            # Add picks nested by user_id, session_id, and pickable_object_name
-            picks = run.picks
-            picks_item = QTreeWidgetItem(item, ["Picks"])
-            user_dict = {}
-            for pick in picks:
-                if pick.meta.user_id not in user_dict:
-                    user_dict[pick.meta.user_id] = {}
-                if pick.meta.session_id not in user_dict[pick.meta.user_id]:
-                    user_dict[pick.meta.user_id][pick.meta.session_id] = []
-                user_dict[pick.meta.user_id][pick.meta.session_id].append(pick)
-
-            for user_id, sessions in user_dict.items():
-                user_item = QTreeWidgetItem(picks_item, [f"User: {user_id}"])
-                for session_id, picks in sessions.items():
-                    session_item = QTreeWidgetItem(
-                        user_item, [f"Session: {session_id}"]
+    def make_run_node(self, run_name):
+        node = TreeNode(run_name, self.index.get_run(run_name), lazy=True)
+        self._run_nodes[run_name] = node
+        return node
+
+    def find_run_node(self, run_name):
+        return self._run_nodes.get(run_name)
+
+    def update_tree(self, added=(), removed=(), changed=()):
+        for run_name in removed:
+            node = self._run_nodes.pop(run_name, None)
+            if node is not None:
+                self.drop_expansion_workers(node)
+                self.tree_model.remove(node)
+
+        run_names = self.index.run_names()
+        for run_name in added:
+            self.tree_model.add_children(
+                self.tree_model.root,
+                [self.make_run_node(run_name)],
+                position=run_names.index(run_name),
+            )
+
+        for run_name in changed:
+            node = self.find_run_node(run_name)
+            if node is not None:
+                self.rebuild_run_node(node)
+
+    def rebuild_run_node(self, node):
+        # Only the subtree of this run is rebuilt, expanded voxel spacings
+        # are expanded again from the index
+        from copick.models import CopickVoxelSpacing
+
+        if node.lazy:
+            return
+        expanded = [
+            child.data.meta.voxel_size
+            for child in node.children
+            if isinstance(child.data, CopickVoxelSpacing)
+            and self.tree_view.isExpanded(self.tree_model.index_of(child))
+        ]
+        self.drop_expansion_workers(node)
+        self.tree_model.clear(node)
+        for kind, batch in iter_run_children(self.index, node.text):
+            self.add_tree_children(node, kind, batch)
+        for child in list(node.children):
+            if (
+                isinstance(child.data, CopickVoxelSpacing)
+                and child.data.meta.voxel_size in expanded
+            ):
+                index = self.tree_model.index_of(child)
+                self.tree_model.fetchMore(index)
+                self.tree_view.expand(index)
+
+    def drop_expansion_workers(self, run_node):
+        run = run_node.data
+        for data in list(self._expansion_workers):
+            if data is run or getattr(data, "run", None) is run:
+                del self._expansion_workers[data]
+
+    def has_expansion_workers(self, run_node):
+        run = run_node.data
+        return any(
+            data is run or getattr(data, "run", None) is run
+            for data in self._expansion_workers
+        )
+
+    def find_voxel_spacing_node(self, run_node, voxel_size):
+        from copick.models import CopickVoxelSpacing
+
+        for child in run_node.children:
+            if (
+                isinstance(child.data, CopickVoxelSpacing)
+                and child.data.meta.voxel_size == voxel_size
+            ):
+                return child
+        return None
+
+    def insert_run_entities(self, run_name, added, removed=()):
+        """Add the tree nodes of entities added to a run, by key."""
+        node = self.find_run_node(run_name)
+        # Unexpanded nodes are filled from the index when expanded
+        if node is None or node.lazy:
+            return
+        # Removals, new voxel spacings and pending expansions are rare, the
+        # run's subtree is rebuilt instead
+        if (
+            removed
+            or any(key[0] == "voxel_spacing" for key in added)
+            or self.has_expansion_workers(node)
+        ):
+            self.rebuild_run_node(node)
+            return
+        for key, entity in added.items():
+            kind = key[0]
+            if kind == "picks":
+                self.add_tree_children(node, "picks", [entity])
+            elif kind in ("tomogram", "segmentation", "features"):
+                spacing_node = self.find_voxel_spacing_node(node, key[1])
+                if spacing_node is not None and not spacing_node.lazy:
+                    kind = kind if kind == "features" else f"{kind}s"
+                    self.add_tree_children(spacing_node, kind, [entity])
+
+    def fetch_node(self, node):
+        # Requested by the model when a run or voxel spacing is first expanded
+        from copick.models import CopickRun, CopickVoxelSpacing
+
+        if isinstance(node.data, CopickRun):
+            self.expand_run(node, node.data)
+        elif isinstance(node.data, CopickVoxelSpacing):
+            self.expand_voxel_spacing(node, node.data)
+
+    def expand_run(self, node, run):
+        run_name = run.meta.name
+        self.expand_item(
+            node,
+            run,
+            partial(iter_run_children, self.index, run_name),
+            self.index.is_loaded(run_name),
+        )
+
+    def expand_voxel_spacing(self, node, voxel_spacing):
+        run_name = voxel_spacing.run.meta.name
+        voxel_size = voxel_spacing.meta.voxel_size
+        self.expand_item(
+            node,
+            voxel_spacing,
+            partial(iter_voxel_spacing_children, self.index, run_name, voxel_size),
+            self.index.is_loaded(run_name, voxel_size),
+        )
+
+    @timed()
+    def expand_item(self, node, data, iter_children, loaded):
+        if node.children:
+            return
+
+        if loaded:
+            for kind, batch in iter_children():
+                self.add_tree_children(node, kind, batch)
+            return
+
+        self.tree_model.add_children(
+            node, [TreeNode(LOADING_TEXT, enabled=False)]
+        )
+
+        worker = create_worker(iter_children)
+        worker.yielded.connect(
+            partial(self._on_children_fetched, node, data, worker)
+        )
+        worker.returned.connect(
+            partial(self._on_expand_done, node, data, worker)
+        )
+        worker.errored.connect(
+            partial(self._on_expand_error, node, data, worker)
+        )
+        self._expansion_workers[data] = worker
+        worker.start()
+
+    def _on_children_fetched(self, node, data, worker, result):
+        if self._expansion_workers.get(data) is worker:
+            self.add_tree_children(node, *result)
+
+    def _on_expand_done(self, node, data, worker, _=None):
+        if self._expansion_workers.get(data) is worker:
+            del self._expansion_workers[data]
+            self.remove_loading_placeholder(node)
+
+    def _on_expand_error(self, node, data, worker, error):
+        print(f"Error expanding {data}: {error}")
+        if self._expansion_workers.get(data) is worker:
+            del self._expansion_workers[data]
+            # Collapsed and made lazy again, so the next expansion retries
+            # the listing
+            self.tree_model.clear(node, lazy=True)
+            self.tree_view.collapse(self.tree_model.index_of(node))
+
+    def remove_loading_placeholder(self, node):
+        for child in list(node.children):
+            if child.text == LOADING_TEXT and not child.enabled:
+                self.tree_model.remove(child)
+
+    def add_tree_children(self, node, kind, batch):
+        model = self.tree_model
+        if kind == "voxel_spacings":
+            model.add_children(
+                node,
+                [
+                    TreeNode(
+                        f"Voxel Spacing: {voxel_spacing.meta.voxel_size}",
+                        voxel_spacing,
+                        lazy=True,
                     )
-                    for pick in picks:
-                        pick_child = QTreeWidgetItem(
-                            session_item, [pick.meta.pickable_object_name]
-                        )
-                        pick_child.setData(0, Qt.UserRole, pick)
-            item.addChild(picks_item)
-
-    def expand_voxel_spacing(self, item, voxel_spacing):
-        if not item.childCount():
-            tomogram_item = QTreeWidgetItem(item, ["Tomograms"])
-            for tomogram in voxel_spacing.tomograms:
-                tomo_child = QTreeWidgetItem(
-                    tomogram_item, [tomogram.meta.tomo_type]
+                    for voxel_spacing in batch
+                ],
+            )
+        elif kind == "picks":
+            # Add picks nested by user_id, session_id, and pickable_object_name
+            picks_node = model.group(node, "Picks")
+            sessions = {}
+            for pick in batch:
+                user_node = model.group(picks_node, f"User: {pick.meta.user_id}")
+                session_node = model.group(
+                    user_node, f"Session: {pick.meta.session_id}"
                 )
-                tomo_child.setData(0, Qt.UserRole, tomogram)
-            item.addChild(tomogram_item)
-
-            segmentation_item = QTreeWidgetItem(item, ["Segmentations"])
-            segmentations = voxel_spacing.run.get_segmentations(
-                voxel_size=voxel_spacing.meta.voxel_size
+                sessions.setdefault(session_node, []).append(
+                    TreeNode(pick.meta.pickable_object_name, pick)
+                )
+            for session_node, nodes in sessions.items():
+                model.add_children(session_node, nodes)
+        elif kind == "tomograms":
+            tomogram_node = model.group(node, "Tomograms")
+            model.add_children(
+                tomogram_node,
+                [TreeNode(tomogram.meta.tomo_type, tomogram) for tomogram in batch],
             )
-            for segmentation in segmentations:
-                seg_child = QTreeWidgetItem(
-                    segmentation_item, [segmentation.meta.name]
+        elif kind == "features":
+            tomogram_node = model.group(node, "Tomograms")
+            for features in batch:
+                tomo_node = tomogram_node.child(
+                    features.tomogram.meta.tomo_type
                 )
-                seg_child.setData(0, Qt.UserRole, segmentation)
-            item.addChild(segmentation_item)
+                if tomo_node is not None:
+                    model.add_children(
+                        tomo_node,
+                        [
+                            TreeNode(
+                                f"Features: {features.meta.feature_type}",
+                                features,
+                            )
+                        ],
+                    )
+        elif kind == "segmentations":
+            segmentation_node = model.group(node, "Segmentations")
+            model.add_children(
+                segmentation_node,
+                [
+                    TreeNode(segmentation.meta.name, segmentation)
+                    for segmentation in batch
+                ],
+            )
+
+    def schedule_filter(self):
+        # Searched once typing pauses
+        self._filter_timer.start()
 
-    def handle_item_click(self, item, column):
-        data = item.data(0, Qt.UserRole)
-        if isinstance(data, copick.models.CopickRun):
+    @timed()
+    def filter_tree(self):
+        text = self.filter_input.text().strip()
+        if not text or self.index is None:
+            self.search_view.hide()
+            self.tree_view.show()
+            return
+        self.search_model.reset(
+            [TreeNode(label, entity) for label, entity in self.index.search(text)]
+        )
+        self.tree_view.hide()
+        self.search_view.show()
+
+    def handle_item_click(self, index):
+        from copick.models import (
+            CopickFeatures,
+            CopickPicks,
+            CopickRun,
+            CopickSegmentation,
+            CopickTomogram,
+            CopickVoxelSpacing,
+        )
+
+        data = index.data(Qt.UserRole)
+        if isinstance(data, CopickRun):
             # self.info_label.setText(f"Run: {data.meta.name}")
             self.selected_run = data
-        elif isinstance(data, copick.models.CopickVoxelSpacing):
+        elif isinstance(data, CopickVoxelSpacing):
             # self.info_label.setText(f"Voxel Spacing: {data.meta.voxel_size}")
-            self.lazy_load_voxel_spacing(item, data)
-        elif isinstance(data, copick.models.CopickTomogram):
+            self.lazy_load_voxel_spacing(index)
+        elif isinstance(data, CopickTomogram):
             self.load_tomogram(data)
-        elif isinstance(data, copick.models.CopickSegmentation):
+        elif isinstance(data, CopickFeatures):
+            self.load_features(data)
+        elif isinstance(data, CopickSegmentation):
             self.load_segmentation(data)
-        elif isinstance(data, copick.models.CopickPicks):
-            parent_run = self.get_parent_run(item)
+        elif isinstance(data, CopickPicks):
+            # Search results have no run above them
+            parent_run = self.get_parent_run(index) or data.run
             self.load_picks(data, parent_run)
 
-    def get_parent_run(self, item):
-        while item:
-            data = item.data(0, Qt.UserRole)
-            if isinstance(data, copick.models.CopickRun):
+    def get_parent_run(self, index):
+        from copick.models import CopickRun
+
+        while index.isValid():
+            data = index.data(Qt.UserRole)
+            if isinstance(data, CopickRun):
                 return data
-            item = item.parent()
+            index = index.parent()
         return None
 
-    def lazy_load_voxel_spacing(self, item, voxel_spacing):
-        if not item.childCount():
-            self.expand_voxel_spacing(item, voxel_spacing)
+    def lazy_load_voxel_spacing(self, index):
+        model = index.model()
+        if model.canFetchMore(index):
+            model.fetchMore(index)
 
+    @timed()
     def load_tomogram(self, tomogram):
-        zarr_path = tomogram.zarr()
-        zarr_group = zarr.open(zarr_path, "r")
+        from ._zarr import lazy_levels, open_cached
 
-        # Determine the number of scale levels
-        scale_levels = [key for key in zarr_group.keys() if key.isdigit()]
-        scale_levels.sort(key=int)
+        layer = self.layer_registry.focus(tomogram_key(tomogram))
+        if layer is not None:
+            return layer
 
-        data = [zarr_group[level] for level in scale_levels]
-
-        # data = [da.from_zarr(str(zarr_path), level) * (int(level) + 1) / 2 for level in scale_levels]
+        raw_store = tomogram.zarr()
+        store = self.cached_store(
+            raw_store, f"tomogram {tomogram.meta.tomo_type}"
+        )
+        zarr_group = open_cached(store, "r", cache_size=self.chunk_cache_size)
 
-        # Highest scale level only
-        # data = zarr.open(tomogram.zarr(), 'r')["0"]
+        # Scale and translation of the highest resolution come from the
+        # OME-Zarr metadata, napari derives the lower levels from their shapes
+        data, scale, translate = lazy_levels(
+            zarr_group, tomogram.voxel_spacing.meta.voxel_size
+        )
 
-        # TODO scale needs to account for scale pyramid (4x for the lowest scale in this case)
-        
-        scale = [tomogram.voxel_spacing.meta.voxel_size] * 3
-        self.viewer.add_image(
-            data, name=f"Tomogram: {tomogram.meta.tomo_type}", scale=scale
+        layer = self.add_image_with_stats(
+            raw_store,
+            data,
+            name=f"Tomogram: {tomogram.meta.tomo_type}",
+            scale=scale,
+            translate=translate,
+        )
+        if self.prefetch_radius:
+            self.add_prefetcher(layer, data)
+        self.layer_registry.add(tomogram_key(tomogram), layer)
+        return layer
+
+    def cached_store(self, raw_store, name, writable=False):
+        """`raw_store` profiled, behind the on-disk chunk cache if it is
+        remote."""
+        from ._contrast import store_url
+        from ._zarr import WRITABLE_CACHE_AGE, disk_cached, profiled
+
+        return disk_cached(
+            profiled(raw_store, self.profiler, name),
+            self.disk_cache,
+            store_url(raw_store),
+            max_age=WRITABLE_CACHE_AGE if writable else None,
         )
-        # self.info_label.setText(
-        #     f"Loaded Tomogram: {tomogram.meta.tomo_type} with num scales = {len(scale_levels)}"
-        # )
 
-    def load_segmentation(self, segmentation):
-        zarr_data = zarr.open(segmentation.zarr(), "a")
-        if "data" in zarr_data:
-            data = zarr_data["data"]
+    def warm_run_cache(self, run):
+        """Fetch the chunks of all tomograms and feature maps of a run into
+        the on-disk chunk cache, in the background."""
+        from ._zarr import DiskCacheStore, warm_cache
+
+        if self.disk_cache is None:
+            print("The on-disk chunk cache is disabled")
+            return None
+        run_name = run.meta.name
+
+        def warm():
+            fetched = 0
+            for item in [
+                *self.index.tomograms(run_name),
+                *self.index.features(run_name),
+            ]:
+                store = self.cached_store(item.zarr(), "warm cache")
+                if isinstance(store, DiskCacheStore):
+                    fetched += warm_cache(store)
+            return fetched
+
+        worker = create_worker(warm)
+        worker.returned.connect(
+            lambda fetched: print(f"Cached {fetched} chunks of {run_name}")
+        )
+        worker.errored.connect(
+            lambda e: print(f"Error warming the chunk cache of {run_name}: {e}")
+        )
+        worker.start()
+        return worker
+
+    def add_image_with_stats(self, raw_store, data, **kwargs):
+        from ._contrast import default_contrast_limits, store_url
+
+        # Contrast limits are never estimated by napari, which would read
+        # the data. They come from the statistics of the coarsest level,
+        # cached from an earlier opening or computed in the background
+        stats = self.stats_cache.get(store_url(raw_store, data[-1].path))
+        if stats is not None:
+            contrast_limits = stats.contrast_limits
         else:
-            data = zarr_data[:]
+            contrast_limits = default_contrast_limits(data[0].dtype)
+        with self.profiler.span("add_image", "napari"):
+            layer = self.viewer.add_image(
+                data if len(data) > 1 else data[0],
+                multiscale=len(data) > 1,
+                contrast_limits=contrast_limits,
+                **kwargs,
+            )
+        if stats is not None:
+            self.apply_image_stats(layer, stats)
+
+        # Revalidated against the modification time of the data
+        worker = create_worker(
+            self.stats_cache.stats, raw_store, data[-1].path, data[-1]
+        )
+        worker.returned.connect(
+            partial(self.apply_image_stats, layer, initial=contrast_limits)
+        )
+        worker.errored.connect(
+            lambda e: print(f"Error computing contrast limits: {e}")
+        )
+        worker.start()
+        return layer
+
+    def open_features(self, features):
+        from ._zarr import lazy_levels, open_cached
+
+        raw_store = features.zarr()
+        store = self.cached_store(
+            raw_store, f"features {features.meta.feature_type}"
+        )
+        group = open_cached(store, "r", cache_size=self.chunk_cache_size)
+        data, scale, translate = lazy_levels(
+            group, features.tomogram.voxel_spacing.meta.voxel_size
+        )
+        return raw_store, data, scale, translate
+
+    @timed()
+    def load_features(self, features):
+        key = features_key(features)
+        layer = self.layer_registry.focus(key)
+        if layer is not None:
+            return layer
+
+        # Channels are the first axis, selected with its slider. Only the
+        # chunks of the displayed channel and region are read
+        raw_store, data, scale, translate = self.open_features(features)
+        layer = self.add_image_with_stats(
+            raw_store,
+            data,
+            name=f"Features: {features.meta.feature_type}",
+            scale=[1.0, *scale],
+            translate=[0.0, *translate],
+        )
+        self.layer_registry.add(key, layer)
+        return layer
+
+    @timed()
+    def load_features_pca(self, features):
+        from ._features import fit_pca
 
-        scale = [segmentation.meta.voxel_size] * 3
+        key = ("features_pca", *features_key(features)[1:])
+        if self.layer_registry.focus(key) is not None:
+            return
+
+        # Fitted on the coarsest level in the background, the projection is
+        # computed for the displayed chunks only
+        _, data, scale, translate = self.open_features(features)
+        worker = create_worker(fit_pca, data[-1])
+        worker.returned.connect(
+            partial(
+                self._add_pca_layer, key, features, data, scale, translate
+            )
+        )
+        worker.errored.connect(
+            lambda e: print(
+                f"Error fitting PCA of {features.meta.feature_type}: {e}"
+            )
+        )
+        worker.start()
+
+    def _add_pca_layer(self, key, features, data, scale, translate, pca):
+        from ._features import PCAProjection
+
+        if self._pca_executor is None:
+            from ._features import projection_executor
+
+            self._pca_executor = projection_executor()
+        levels = [
+            PCAProjection(level, pca, self._pca_executor) for level in data
+        ]
+        with self.profiler.span("add_image", "napari"):
+            layer = self.viewer.add_image(
+                levels if len(levels) > 1 else levels[0],
+                name=f"PCA: {features.meta.feature_type}",
+                rgb=True,
+                scale=scale,
+                translate=translate,
+                multiscale=len(levels) > 1,
+                contrast_limits=(0.0, 1.0),
+            )
+        self.layer_registry.add(key, layer)
+
+    def apply_image_stats(self, layer, stats, initial=None):
+        if self.viewer is not None and layer not in self.viewer.layers:
+            return
+        low, high = stats.contrast_limits
+        vmin, vmax = stats.range
+        layer.contrast_limits_range = (min(vmin, low), max(vmax, high))
+        # Limits the user adjusted meanwhile are kept
+        if initial is None or tuple(layer.contrast_limits) == tuple(initial):
+            layer.contrast_limits = stats.contrast_limits
+        layer.metadata["histogram"] = (stats.counts, stats.edges)
+
+    def add_prefetcher(self, layer, data):
+        from ._zarr import ZChunkPrefetcher
+
+        prefetcher = ZChunkPrefetcher(data, radius=self.prefetch_radius)
+        callback = partial(self.prefetch_slice, layer, prefetcher)
+        self._prefetchers[layer] = (prefetcher, callback)
+        self.viewer.dims.events.current_step.connect(callback)
+        callback()
+
+    def prefetch_slice(self, layer, prefetcher, event=None):
+        # Only a Z slice view reads chunk slabs along Z
+        if 0 not in self.viewer.dims.not_displayed:
+            return
+        level = layer.data_level if layer.multiscale else 0
+        z = layer.world_to_data(self.viewer.dims.point)[0]
+        z *= prefetcher.arrays[level].shape[0] / prefetcher.arrays[0].shape[0]
+        prefetcher.prefetch(level, max(z, 0))
+
+    def handle_layer_removed(self, event):
+        self.remove_prefetcher(event.value)
+        self.remove_slab_culling(event.value)
+        self.writeback.unregister(event.value)
+        self.release_pick_sets(event.value)
+        self.layer_registry.discard(event.value)
+
+    def remove_prefetcher(self, layer):
+        entry = self._prefetchers.pop(layer, None)
+        if entry is None:
+            return
+        prefetcher, callback = entry
+        self.viewer.dims.events.current_step.disconnect(callback)
+        prefetcher.shutdown()
+
+    @timed()
+    def load_segmentation(self, segmentation, paint=False):
+        from ._zarr import WriteBehindStore, lazy_levels, open_cached
+
+        # Painting layers show a single level, they are distinct layers
+        key = ("segmentation", *segmentation_key(segmentation), paint)
+        layer = self.layer_registry.focus(key)
+        if layer is not None:
+            return layer
+
+        # Always opened lazily, chunks are only read when displayed. Painted
+        # chunks are kept in memory until the write-back manager flushes them
+        store = WriteBehindStore(
+            self.cached_store(
+                segmentation.zarr(),
+                f"segmentation {segmentation.meta.name}",
+                writable=True,
+            )
+        )
+        zarr_data = open_cached(store, "a", cache_size=self.chunk_cache_size)
+        # Chunks painted back to zero are deleted instead of written
+        data, scale, translate = lazy_levels(
+            zarr_data, segmentation.meta.voxel_size, write_empty_chunks=False
+        )
+        # napari cannot paint multiscale labels. Painting layers show the
+        # full resolution only, and the pyramid, if any, is updated from the
+        # chunks they flush
+        if paint and len(data) > 1:
+            data = data[:1]
+            self._pyramid_stores[id(store)] = (store, segmentation, data[0])
 
         # Create a color map based on copick colors
         colormap = self.get_copick_colormap()
-        painting_layer = self.viewer.add_labels(
-            data, name=f"Segmentation: {segmentation.meta.name}", scale=scale
+        with self.profiler.span("add_labels", "napari"):
+            painting_layer = self.viewer.add_labels(
+                data if len(data) > 1 else data[0],
+                name=f"Segmentation: {segmentation.meta.name}",
+                scale=scale,
+                translate=translate,
+                multiscale=len(data) > 1,
+                metadata={
+                    "copick_segmentation": segmentation_key(segmentation)
+                },
+            )
+        self.writeback.register(
+            painting_layer, store, name=segmentation.meta.name
         )
         painting_layer.colormap = DirectLabelColormap(color_dict=colormap)
         painting_layer.painting_labels = [
@@ -241,11 +1172,96 @@ class CellCanvasWidget(QWidget):
         self.class_labels_mapping = {
             obj.label: obj.name for obj in self.root.config.pickable_objects
         }
+        self.layer_registry.add(key, painting_layer)
+        return painting_layer
 
         # self.info_label.setText(
         #     f"Loaded Segmentation: {segmentation.meta.name}"
         # )
 
+    def handle_flushed(self, store, name, error):
+        from ._pyramid import chunk_regions
+
+        entry = self._pyramid_stores.get(id(store))
+        if entry is None or entry[0] is not store:
+            return
+        _, segmentation, array = entry
+        if not any(s is store for s in self.writeback.stores.values()):
+            del self._pyramid_stores[id(store)]
+        regions = chunk_regions(array, store.pop_flushed_keys())
+        if regions:
+            self.update_label_pyramid(segmentation, regions)
+
+    def update_label_pyramid(self, segmentation, regions=None):
+        """Build the label pyramid of a segmentation in the background, or
+        update the chunks covering `regions` of the full resolution."""
+        key = segmentation_key(segmentation)
+        if key in self._pyramid_workers:
+            # Queued behind the running build, which may not have seen them
+            if key in self._pending_pyramid_regions:
+                pending = self._pending_pyramid_regions[key]
+                if pending is not None and regions is not None:
+                    pending.extend(regions)
+                else:
+                    self._pending_pyramid_regions[key] = None
+            else:
+                self._pending_pyramid_regions[key] = (
+                    list(regions) if regions is not None else None
+                )
+            return
+
+        import zarr
+
+        from ._pyramid import build_label_pyramid
+
+        group = zarr.open(segmentation.zarr(), "a")
+        worker = create_worker(
+            build_label_pyramid,
+            group,
+            segmentation.meta.voxel_size,
+            regions=regions,
+            max_workers=self.pyramid_max_workers,
+        )
+        worker.returned.connect(lambda _: self.refresh_segmentation_layers(key))
+        worker.errored.connect(
+            lambda e: print(
+                f"Error building label pyramid of {segmentation.meta.name}: {e}"
+            )
+        )
+        worker.finished.connect(
+            lambda: self._on_pyramid_finished(segmentation)
+        )
+        self._pyramid_workers[key] = worker
+        worker.start()
+
+    def _on_pyramid_finished(self, segmentation):
+        key = segmentation_key(segmentation)
+        self._pyramid_workers.pop(key, None)
+        if key in self._pending_pyramid_regions:
+            regions = self._pending_pyramid_regions.pop(key)
+            self.update_label_pyramid(segmentation, regions)
+
+    def refresh_segmentation_layers(self, key):
+        # Displayed pyramid levels were rewritten behind the chunk caches
+        for layer in self.viewer.layers:
+            if layer.metadata.get("copick_segmentation") != key:
+                continue
+            if not layer.multiscale:
+                continue
+            self.reload_layer(layer)
+
+    def reload_layer(self, layer):
+        from ._zarr import invalidate_disk_cache
+
+        # Cached chunks are dropped, and read again when displayed
+        levels = layer.data if layer.multiscale else [layer.data]
+        for level in levels:
+            store = getattr(level, "store", None)
+            invalidate_disk_cache(store)
+            if hasattr(store, "invalidate_values"):
+                store.invalidate_values()
+        layer.refresh()
+
     def get_copick_colormap(self, pickable_objects=None):
         if not pickable_objects:
             pickable_objects = self.root.config.pickable_objects
@@ -255,56 +1271,122 @@ class CellCanvasWidget(QWidget):
         colormap[None] = np.array([1, 1, 1, 1])
         return colormap
 
+    @timed()
     def load_picks(self, pick_set, parent_run):
-        if parent_run is not None:
-            if pick_set:
-                if pick_set.points:
-                    points = [
-                        (p.location.z, p.location.y, p.location.x)
-                        for p in pick_set.points
-                    ]
-                    color = (
-                        pick_set.color
-                        if pick_set.color
-                        else (255, 255, 255, 255)
-                    )  # Default to white if color is not set
-                    colors = np.tile(
-                        np.array(
-                            [
-                                color[0] / 255.0,
-                                color[1] / 255.0,
-                                color[2] / 255.0,
-                                color[3] / 255.0,
-                            ]
-                        ),
-                        (len(points), 1),
-                    )  # Create an array with the correct shape
-                    pickable_object = [
-                        obj
-                        for obj in self.root.pickable_objects
-                        if obj.name == pick_set.pickable_object_name
-                    ][0]
-                    point_size = pickable_object.radius
-                    self.viewer.add_points(
-                        points,
-                        name=f"Picks: {pick_set.meta.pickable_object_name}",
-                        size=point_size,
-                        face_color=colors,
-                        out_of_slice_display=True,
-                    )
-                    # self.info_label.setText(
-                    #     f"Loaded Picks: {pick_set.meta.pickable_object_name}"
-                    # )
-                # else:
-                    # self.info_label.setText(
-                    #     f"No points found for Picks: {pick_set.meta.pickable_object_name}"
-                    # )
-            # else:
-                # self.info_label.setText(
-                #     f"No pick set found for Picks: {pick_set.meta.pickable_object_name}"
-                # )
-        # else:
-            # self.info_label.setText("No parent run found")
+        if parent_run is None or not pick_set:
+            return None
+        layer = self.layer_registry.focus(picks_key(pick_set))
+        if layer is not None:
+            return layer
+        # Empty pick sets are opened too, so that they can be annotated
+        layer = self.add_points_layer(
+            [pick_set],
+            f"Picks: {pick_set.meta.pickable_object_name}",
+            parent_run,
+            allow_empty=True,
+        )
+        self.layer_registry.add(picks_key(pick_set), layer)
+        return layer
+
+    @timed()
+    def load_run_picks(self, run, user_id=None, session_id=None):
+        # All pick sets of a run, or of one of its users/sessions, in a
+        # single layer
+        key = ("run_picks", run.meta.name, user_id, session_id)
+        layer = self.layer_registry.focus(key)
+        if layer is not None:
+            return layer
+        pick_sets = [
+            pick_set
+            for pick_set in self.index.picks(run.meta.name)
+            if (user_id is None or pick_set.meta.user_id == user_id)
+            and (session_id is None or pick_set.meta.session_id == session_id)
+        ]
+        name = f"Picks: {run.meta.name}"
+        if user_id is not None:
+            name += f" {user_id}"
+        if session_id is not None:
+            name += f"/{session_id}"
+        layer = self.add_points_layer(pick_sets, name, run)
+        if layer is not None:
+            self.layer_registry.add(key, layer)
+        return layer
+
+    def add_points_layer(self, pick_sets, name, run, allow_empty=False):
+        with self.profiler.span("read_picks", "copick") as span:
+            points, features = pick_sets_to_points(pick_sets)
+            span.args["points"] = len(points)
+        if not len(points) and not allow_empty:
+            return None
+        # Links flushing the same pick set would each renumber its points,
+        # so only the first layer with a pick set saves edits to it
+        keys = [picks_key(pick_set) for pick_set in pick_sets]
+        editable = not any(key in self._pick_set_layers for key in keys)
+        if not editable:
+            print(f"{name}: pick sets are edited in another layer")
+            name = f"{name} (read-only)"
+        pickable_objects = self.root.config.pickable_objects
+        # Colors and sizes are mapped from the object name feature rather than
+        # set per point
+        with self.profiler.span("add_points", "napari"):
+            layer = self.viewer.add_points(
+                points,
+                ndim=3,
+                name=name,
+                features=features,
+                size=point_sizes(
+                    features["pickable_object_name"], pickable_objects
+                ),
+                face_color="pickable_object_name",
+                face_color_cycle=object_colors(pickable_objects),
+                out_of_slice_display=True,
+            )
+        # Edits are saved back to the pick sets by the write-back manager
+        link = PicksLayerLink(layer, pick_sets, run)
+        if editable:
+            self.writeback.register(layer, link, name=name)
+            self._pick_set_layers.update(dict.fromkeys(keys, layer))
+        else:
+            layer.editable = False
+        if len(points) > CULL_POINTS:
+            self.add_slab_culling(layer, link)
+        return layer
+
+    def release_pick_sets(self, layer):
+        for key, owner in list(self._pick_set_layers.items()):
+            if owner is layer:
+                del self._pick_set_layers[key]
+
+    def add_slab_culling(self, layer, link):
+        reach = float(np.max(layer.size, initial=1.0)) / 2
+        callback = partial(self.update_slab, layer, link, reach)
+        self._culled_layers[layer] = callback
+        self.viewer.dims.events.current_step.connect(callback)
+        self.viewer.dims.events.ndisplay.connect(callback)
+        callback()
+
+    def update_slab(self, layer, link, reach, event=None):
+        # Points are drawn up to half their size away from the slice. The
+        # slab is wider, and only moves once the slice gets close to its
+        # edges
+        if 0 not in self.viewer.dims.not_displayed:
+            if link.slab is not None:
+                link.show_slab()
+            return
+        z = layer.world_to_data(self.viewer.dims.point)[0]
+        if link.slab is not None:
+            low, high = link.slab
+            if low + reach <= z <= high - reach:
+                return
+        margin = reach * (1 + 2 * SLAB_MARGIN)
+        link.show_slab(z - margin, z + margin)
+
+    def remove_slab_culling(self, layer):
+        callback = self._culled_layers.pop(layer, None)
+        if callback is None:
+            return
+        self.viewer.dims.events.current_step.disconnect(callback)
+        self.viewer.dims.events.ndisplay.disconnect(callback)
 
     def get_color(self, pick):
         for obj in self.root.pickable_objects:
@@ -313,32 +1395,83 @@ class CellCanvasWidget(QWidget):
         return "white"
 
     def get_run(self, name):
-        return self.root.get_run(name)
+        return self.index.get_run(name)
 
-    def open_context_menu(self, position):
-        print("Opening context menu")
-        item = self.tree_view.itemAt(position)
-        if not item:
+    def open_context_menu(self, view, position):
+        index = view.indexAt(position)
+        if not index.isValid():
             return
 
-        if self.is_segmentations_or_picks_item(item):
-            context_menu = QMenu(self.tree_view)
-            if item.text(0) == "Segmentations":
-                run_name = item.parent().parent().text(0)
-                run = self.root.get_run(run_name)
-                self.show_segmentation_widget(run)
-            elif item.text(0) == "Picks":
-                run_name = item.parent().text(0)
-                run = self.root.get_run(run_name)
-                self.show_picks_widget(run)
-            context_menu.exec_(self.tree_view.viewport().mapToGlobal(position))
-
-    def is_segmentations_or_picks_item(self, item):
-        if item.text(0) == "Segmentations" or item.text(0) == "Picks":
-            return True
-        return False
+        context_menu = QMenu(view)
+        self.add_context_actions(context_menu, index)
+        if not context_menu.isEmpty():
+            context_menu.exec_(view.viewport().mapToGlobal(position))
+
+    def add_context_actions(self, context_menu, index):
+        from copick.models import CopickFeatures, CopickRun, CopickSegmentation
+
+        text = index.data()
+        data = index.data(Qt.UserRole)
+        if isinstance(data, CopickRun):
+            context_menu.addAction(
+                "Warm Chunk Cache", lambda: self.warm_run_cache(data)
+            )
+        elif isinstance(data, CopickSegmentation):
+            context_menu.addAction(
+                "Open for Painting",
+                lambda: self.load_segmentation(data, paint=True),
+            )
+            context_menu.addAction(
+                "Build Label Pyramid",
+                lambda: self.update_label_pyramid(data),
+            )
+            context_menu.addAction(
+                "Convert to Picks…",
+                lambda: self.show_components_widget(data),
+            )
+        elif isinstance(data, CopickFeatures):
+            context_menu.addAction(
+                "Open PCA RGB", lambda: self.load_features_pca(data)
+            )
+        elif text == "Segmentations":
+            run = self.get_parent_run(index)
+            context_menu.addAction(
+                "Create New Segmentation…",
+                lambda: self.show_segmentation_widget(run),
+            )
+        elif text == "Picks":
+            run = self.get_parent_run(index)
+            context_menu.addAction(
+                "Create New Picks…", lambda: self.show_picks_widget(run)
+            )
+            context_menu.addAction(
+                "Load All Picks", lambda: self.load_run_picks(run)
+            )
+            context_menu.addAction(
+                "Merge Duplicate Picks…",
+                lambda: self.show_merge_picks_widget(run),
+            )
+        elif text.startswith("User: "):
+            run = self.get_parent_run(index)
+            user_id = text[len("User: "):]
+            context_menu.addAction(
+                "Load Picks of User",
+                lambda: self.load_run_picks(run, user_id=user_id),
+            )
+        elif text.startswith("Session: "):
+            run = self.get_parent_run(index)
+            user_id = index.parent().data()[len("User: "):]
+            session_id = text[len("Session: "):]
+            context_menu.addAction(
+                "Load Picks of Session",
+                lambda: self.load_run_picks(
+                    run, user_id=user_id, session_id=session_id
+                ),
+            )
 
     def show_segmentation_widget(self, run):
+        from ._zarr import COMPRESSORS, LABEL_DTYPES, label_dtype
+
         widget = QWidget()
         widget.setWindowTitle("Create New Segmentation")
 
@@ -356,10 +1489,32 @@ class CellCanvasWidget(QWidget):
         layout.addRow("User ID:", user_input)
 
         voxel_size_input = QComboBox(widget)
-        for voxel_spacing in run.voxel_spacings:
-            voxel_size_input.addItem(str(voxel_spacing.meta.voxel_size))
+        for voxel_size in self.index.voxel_sizes(run.meta.name):
+            voxel_size_input.addItem(str(voxel_size))
         layout.addRow("Voxel Size:", voxel_size_input)
 
+        dtype_input = QComboBox(widget)
+        dtype_input.addItems(LABEL_DTYPES)
+        dtype_input.setCurrentText(
+            label_dtype(
+                max(
+                    (obj.label for obj in self.root.config.pickable_objects),
+                    default=0,
+                )
+            )
+        )
+        layout.addRow("Label Type:", dtype_input)
+
+        chunk_input = QSpinBox(widget)
+        chunk_input.setRange(16, 512)
+        chunk_input.setSingleStep(16)
+        chunk_input.setValue(128)
+        layout.addRow("Chunk Size:", chunk_input)
+
+        compressor_input = QComboBox(widget)
+        compressor_input.addItems(list(COMPRESSORS))
+        layout.addRow("Compressor:", compressor_input)
+
         create_button = QPushButton("Create", widget)
         create_button.clicked.connect(
             lambda: self.create_segmentation(
@@ -369,6 +1524,9 @@ class CellCanvasWidget(QWidget):
                 session_input.value(),
                 user_input.text(),
                 float(voxel_size_input.currentText()),
+                dtype=dtype_input.currentText(),
+                chunks=(chunk_input.value(),) * 3,
+                compressor=compressor_input.currentText(),
             )
         )
         layout.addWidget(create_button)
@@ -407,91 +1565,574 @@ class CellCanvasWidget(QWidget):
 
         self.viewer.window.add_dock_widget(widget, area="right")
 
-    def create_segmentation(
-        self, widget, run, name, session_id, user_id, voxel_size
-    ):
-        seg = run.new_segmentation(
-            voxel_size=voxel_size,
-            name=name,
-            session_id=str(session_id),
-            is_multilabel=True,
-            user_id=user_id,
+    def show_merge_picks_widget(self, run):
+        widget = QWidget()
+        widget.setWindowTitle("Merge Duplicate Picks")
+
+        layout = QFormLayout(widget)
+        session_input = QSpinBox(widget)
+        session_input.setValue(0)
+        layout.addRow("Session ID:", session_input)
+
+        user_input = QLineEdit(widget)
+        user_input.setText("napariCellcanvasMerged")
+        layout.addRow("User ID:", user_input)
+
+        scale_input = QDoubleSpinBox(widget)
+        scale_input.setRange(0.01, 10.0)
+        scale_input.setSingleStep(0.1)
+        scale_input.setValue(1.0)
+        layout.addRow("Distance (radii):", scale_input)
+
+        merge_button = QPushButton("Merge", widget)
+        merge_button.clicked.connect(
+            lambda: self.merge_duplicate_picks(
+                run,
+                session_input.value(),
+                user_input.text(),
+                scale=scale_input.value(),
+            )
         )
+        merge_button.clicked.connect(widget.close)
+        layout.addWidget(merge_button)
 
-        tomo = zarr.open(run.voxel_spacings[0].tomograms[0].zarr(), "r")[
-            "0"
+        self.viewer.window.add_dock_widget(widget, area="right")
+
+    def merge_duplicate_picks(self, run, session_id, user_id, scale=1.0):
+        """Merge the picks of all users and sessions of a run that are
+        closer than `scale` times the radius of their object, in the
+        background, into one new pick set per object."""
+        from concurrent.futures import wait
+
+        from ._picks import PickIndex, store_new_picks
+
+        session_id = str(session_id)
+        # Earlier merges into the same session are not merged again
+        pick_sets = [
+            pick_set
+            for pick_set in self.index.picks(run.meta.name)
+            if (pick_set.meta.user_id, pick_set.meta.session_id)
+            != (user_id, session_id)
         ]
+        pending = self.writeback.flush_all()
+        pickable_objects = self.root.config.pickable_objects
+
+        def merge():
+            wait(pending)
+            index = PickIndex.from_pick_sets(pick_sets, pickable_objects)
+            coordinates, names, _ = index.merge_duplicates(scale)
+            new_pick_sets = [
+                store_new_picks(
+                    run, name, coordinates[names == name], user_id, session_id
+                )
+                for name in np.unique(names)
+            ]
+            return len(index) - len(coordinates), new_pick_sets
 
-        shape = tomo.shape
-        dtype = np.int32
+        worker = create_worker(merge)
+        worker.returned.connect(
+            lambda result: self._on_picks_merged(run.meta.name, *result)
+        )
+        worker.errored.connect(
+            lambda e: print(f"Error merging picks of {run.meta.name}: {e}")
+        )
+        worker.start()
+        return worker
 
-        # Create an empty Zarr array for the segmentation
-        zarr_file = zarr.open(seg.zarr(), mode="w")
-        zarr_file.create_dataset(
-            "data",
-            shape=shape,
-            dtype=dtype,
-            chunks=(128, 128, 128),
-            fill_value=0,
+    def _on_picks_merged(self, run_name, merged, pick_sets):
+        print(
+            f"Merged {merged} duplicate picks of {run_name} into "
+            f"{len(pick_sets)} pick sets"
         )
+        self.update_run(run_name)
 
-        self.populate_tree()
+    def show_components_widget(self, segmentation):
+        widget = QWidget()
+        widget.setWindowTitle("Convert Segmentation to Picks")
+
+        layout = QFormLayout(widget)
+        session_input = QSpinBox(widget)
+        session_input.setValue(0)
+        layout.addRow("Session ID:", session_input)
+
+        user_input = QLineEdit(widget)
+        user_input.setText("napariCellcanvas")
+        layout.addRow("User ID:", user_input)
+
+        min_size_input = QSpinBox(widget)
+        min_size_input.setRange(1, 2**31 - 1)
+        min_size_input.setValue(1)
+        layout.addRow("Minimum Size (voxels):", min_size_input)
+
+        convert_button = QPushButton("Convert", widget)
+        convert_button.clicked.connect(
+            lambda: self.convert_segmentation_to_picks(
+                segmentation,
+                session_input.value(),
+                user_input.text(),
+                min_size=min_size_input.value(),
+            )
+        )
+        convert_button.clicked.connect(widget.close)
+        layout.addWidget(convert_button)
+
+        self.viewer.window.add_dock_widget(widget, area="right")
+
+    def convert_segmentation_to_picks(
+        self, segmentation, session_id, user_id, min_size=1
+    ):
+        """Pick the centroids of the connected components of a segmentation
+        in the background, one new pick set per object."""
+        from concurrent.futures import wait
+
+        from ._components import segmentation_to_picks
+
+        # Painted chunks not written yet are part of the segmentation
+        key = segmentation_key(segmentation)
+        pending = [
+            self.writeback.flush(layer)
+            for layer in self.viewer.layers
+            if layer.metadata.get("copick_segmentation") == key
+        ]
+        pending = [future for future in pending if future is not None]
+
+        def convert():
+            wait(pending)
+            return segmentation_to_picks(
+                segmentation,
+                self.root.config.pickable_objects,
+                user_id,
+                str(session_id),
+                min_size=min_size,
+                max_workers=self.pyramid_max_workers,
+            )
+
+        run_name = segmentation.run.meta.name
+        worker = create_worker(convert)
+        worker.returned.connect(
+            lambda pick_sets: self._on_components_converted(
+                run_name, segmentation, pick_sets
+            )
+        )
+        worker.errored.connect(
+            lambda e: print(
+                f"Error converting {segmentation.meta.name} to picks: {e}"
+            )
+        )
+        worker.start()
+        return worker
+
+    def _on_components_converted(self, run_name, segmentation, pick_sets):
+        count = sum(len(pick_set.points or []) for pick_set in pick_sets)
+        print(
+            f"Converted {segmentation.meta.name} to {count} picks in "
+            f"{len(pick_sets)} pick sets"
+        )
+        self.update_run(run_name)
+
+    @timed()
+    def create_segmentation(
+        self,
+        widget,
+        run,
+        name,
+        session_id,
+        user_id,
+        voxel_size,
+        dtype="int32",
+        chunks=(128, 128, 128),
+        compressor="blosc-zstd",
+    ):
+        # The segmentation matches the tomograms of the chosen voxel spacing
+        try:
+            new_segmentation(
+                self.index,
+                run.meta.name,
+                name,
+                session_id,
+                user_id,
+                voxel_size,
+                dtype=dtype,
+                chunks=chunks,
+                compressor=compressor,
+            )
+        except ValueError as e:
+            print(e)
+            return
+
+        self.update_run(run.meta.name)
         widget.close()
 
+    @timed()
     def create_picks(self, widget, run, object_name, session_id, user_id):
-        run.new_picks(
-            object_name=object_name,
-            session_id=str(session_id),
-            user_id=user_id,
+        pick_set = new_picks(
+            self.index, run.meta.name, object_name, session_id, user_id
         )
-        self.populate_tree()
+        self.update_run(run.meta.name)
         widget.close()
+        self.load_picks(pick_set, run)
+
+    def show_bulk_create_widget(self):
+        from ._zarr import COMPRESSORS, LABEL_DTYPES, label_dtype
+
+        if self.index is None:
+            return
+        widget = QWidget()
+        widget.setWindowTitle("Create in Runs")
+
+        layout = QFormLayout(widget)
+        runs_input = MultiSelectComboBox(widget)
+        runs_input.addItems(self.index.run_names())
+        layout.addRow("Runs:", runs_input)
+        all_runs_input = QCheckBox("All Runs", widget)
+        layout.addRow(all_runs_input)
+
+        kind_input = QComboBox(widget)
+        kind_input.addItems(["Segmentation", "Picks"])
+        layout.addRow("Create:", kind_input)
+
+        session_input = QSpinBox(widget)
+        session_input.setValue(0)
+        layout.addRow("Session ID:", session_input)
+
+        user_input = QLineEdit(widget)
+        user_input.setText("napariCellcanvas")
+        layout.addRow("User ID:", user_input)
+
+        # Segmentation options
+        name_input = QLineEdit(widget)
+        name_input.setText("segmentation")
+        layout.addRow("Name:", name_input)
+
+        voxel_size_input = QComboBox(widget)
+        voxel_size_input.setEditable(True)
+        run_names = self.index.run_names()
+        if run_names:
+            for voxel_size in self.index.voxel_sizes(run_names[0]):
+                voxel_size_input.addItem(str(voxel_size))
+        layout.addRow("Voxel Size:", voxel_size_input)
+        # Reads the shape of a single run's tomograms instead of every run's
+        same_shape_input = QCheckBox("Same Shape in All Runs", widget)
+        layout.addRow(same_shape_input)
+
+        dtype_input = QComboBox(widget)
+        dtype_input.addItems(LABEL_DTYPES)
+        dtype_input.setCurrentText(
+            label_dtype(
+                max(
+                    (obj.label for obj in self.root.config.pickable_objects),
+                    default=0,
+                )
+            )
+        )
+        layout.addRow("Label Type:", dtype_input)
+
+        chunk_input = QSpinBox(widget)
+        chunk_input.setRange(16, 512)
+        chunk_input.setSingleStep(16)
+        chunk_input.setValue(128)
+        layout.addRow("Chunk Size:", chunk_input)
+
+        compressor_input = QComboBox(widget)
+        compressor_input.addItems(list(COMPRESSORS))
+        layout.addRow("Compressor:", compressor_input)
+
+        # Picks options
+        object_name_input = QComboBox(widget)
+        for obj in self.root.config.pickable_objects:
+            object_name_input.addItem(obj.name)
+        layout.addRow("Object Name:", object_name_input)
+
+        workers_input = QSpinBox(widget)
+        workers_input.setRange(1, 64)
+        workers_input.setValue(8)
+        layout.addRow("Workers:", workers_input)
+
+        def selected_runs():
+            if all_runs_input.isChecked():
+                return self.index.run_names()
+            return runs_input.selectedItems()
+
+        def create():
+            run_names = selected_runs()
+            max_workers = workers_input.value()
+            if kind_input.currentText() != "Segmentation":
+                fn = partial(
+                    new_picks,
+                    object_name=object_name_input.currentText(),
+                    session_id=session_input.value(),
+                    user_id=user_input.text(),
+                )
+                self.create_in_runs(fn, run_names, max_workers=max_workers)
+                widget.close()
+                return
+
+            voxel_size = float(voxel_size_input.currentText())
+            fn = partial(
+                new_segmentation,
+                name=name_input.text(),
+                session_id=session_input.value(),
+                user_id=user_input.text(),
+                voxel_size=voxel_size,
+                dtype=dtype_input.currentText(),
+                chunks=(chunk_input.value(),) * 3,
+                compressor=compressor_input.currentText(),
+            )
+            if not same_shape_input.isChecked():
+                self.create_in_runs(fn, run_names, max_workers=max_workers)
+                widget.close()
+                return
+
+            def create_with_shape(shape):
+                if shape is None:
+                    print(f"No tomogram found at voxel size {voxel_size}")
+                    return
+                self.create_in_runs(
+                    partial(fn, shape=shape),
+                    run_names,
+                    max_workers=max_workers,
+                )
+
+            # The shape is read once, in the background
+            worker = create_worker(
+                shared_volume_shape, self.index, run_names, voxel_size
+            )
+            worker.returned.connect(create_with_shape)
+            worker.errored.connect(
+                lambda e: print(f"Error reading the volume shape: {e}")
+            )
+            worker.start()
+            widget.close()
+
+        create_button = QPushButton("Create", widget)
+        create_button.clicked.connect(create)
+        layout.addWidget(create_button)
+
+        self.viewer.window.add_dock_widget(widget, area="right")
+
+    def create_in_runs(self, fn, run_names, max_workers=None):
+        """Call `fn(index, run_name)` for many runs in the background, e.g.
+        a partial of `new_segmentation` or `new_picks`. The tree is updated
+        once all are done."""
+        if not run_names:
+            return None
+        results = {}
+        errors = {}
+
+        def collect(item):
+            run_name, result, error = item
+            if error is not None:
+                errors[run_name] = error
+                print(f"Error creating in {run_name}: {error}")
+            else:
+                results[run_name] = result
+            self.batch_status.setText(
+                f"Created in {len(results)} of {len(run_names)} runs, "
+                f"{len(errors)} failed"
+            )
+
+        worker = create_worker(
+            create_in_runs,
+            self.index,
+            fn,
+            list(run_names),
+            max_workers=max_workers,
+        )
+        worker.yielded.connect(collect)
+        worker.errored.connect(lambda e: print(f"Error creating in runs: {e}"))
+        worker.finished.connect(lambda: self.update_tree(changed=list(results)))
+        worker.start()
+        return worker
+
+    def update_run(self, run_name):
+        # Re-list a single run after it was modified from the widget
+        worker = create_worker(self.index.refresh_run, run_name, force=True)
+        worker.returned.connect(partial(self._on_run_refreshed, run_name))
+        worker.errored.connect(
+            lambda e: print(f"Error refreshing run {run_name}: {e}")
+        )
+        worker.start()
+
+    def _on_run_refreshed(self, run_name, changed):
+        if changed:
+            self.update_tree(changed=[run_name])
 
     def refresh_tree(self):
-        self.root = copick.from_file(self.copick_config_path)
-        self.populate_tree()
+        # Retry whatever failed to load
+        if not self.solution_dropdown.count():
+            self.populate_solution_dropdown()
+        if self.index is None:
+            if self.copick_config_path:
+                self.open_project(self.copick_config_path)
+            return
+        # Only runs whose storage changed are re-listed and rebuilt
+        self.refresh_button.setEnabled(False)
+        worker = create_worker(self.index.refresh)
+        worker.returned.connect(self._on_refresh_done)
+        worker.errored.connect(
+            lambda e: print(f"Error refreshing project: {e}")
+        )
+        worker.finished.connect(lambda: self.refresh_button.setEnabled(True))
+        worker.start()
+
+    def _on_refresh_done(self, diff):
+        added, removed, changed = diff
+        self.update_tree(added, removed, changed)
+        if added or removed:
+            self.populate_run_dropdown()
+        if added or changed:
+            self.build_choices()
+
+    def build_choices(self):
+        # Only runs without choices are listed
+        worker = create_worker(self.index.build_choices)
+        worker.returned.connect(self._on_choices_built)
+        worker.errored.connect(
+            lambda e: print(f"Error indexing solution choices: {e}")
+        )
+        worker.start()
+
+    def _on_choices_built(self, _):
+        # User and session ids span all runs, rebuild a form that was built
+        # before they were all indexed
+        if not self._form_complete:
+            self.update_solution_args()
+        # Results may now include the entities of runs indexed meanwhile
+        if self.filter_input.text().strip():
+            self.filter_tree()
 
     def populate_solution_dropdown(self):
+        # An unreachable server leaves the dropdown empty instead of
+        # blocking the widget for the request timeout
         self.solution_dropdown.clear()
-        try:
-            response = requests.get(f"http://{self.hostname}:{self.port}/index")
-            if response.status_code == 200:
-                index = response.json().get('index', {})
-                for solution_id, solution_info in index.items():
-                    self.solution_dropdown.addItem(f"{solution_info['catalog']}:{solution_info['group']}:{solution_info['name']}:{solution_info['version']}")
-        except Exception as e:
-            print(f"Error fetching solutions: {e}")
-
-    def populate_model_dropdown(self, combobox):
-        try:
-            response = requests.get(f"http://{self.hostname}:{self.port}/models")
-            if response.status_code == 200:
-                model_list = response.json().get('models', [])
-                for model_name in model_list:
-                    combobox.addItem(model_name)
-            else:
-                print(f"Failed to fetch models. Status code: {response.status_code}")
-        except Exception as e:
-            print(f"Error fetching models: {e}")
-            
+        self.solution_dropdown.setPlaceholderText(LOADING_TEXT)
+        worker = create_worker(self.client.index)
+        worker.returned.connect(self.fill_solution_dropdown)
+        worker.errored.connect(self._on_catalog_error)
+        worker.start()
+
+    def _on_catalog_error(self, error):
+        print(f"Error fetching solutions: {error}")
+        self.solution_dropdown.setPlaceholderText(SERVER_UNAVAILABLE_TEXT)
+
+    @timed()
+    def fill_solution_dropdown(self, index):
+        self.solution_dropdown.clear()
+        solutions = []
+        for solution_id, solution_info in index.items():
+            solution = (
+                solution_info["catalog"],
+                solution_info["group"],
+                solution_info["name"],
+                solution_info["version"],
+            )
+            solutions.append(solution)
+            self.solution_dropdown.addItem(":".join(solution))
+
+        # Fill the /info and /models caches so switching solutions builds
+        # the form without a round-trip
+        worker = create_worker(self.client.prefetch_info, solutions)
+        worker.start()
+        worker = create_worker(self.client.models)
+        worker.errored.connect(lambda e: print(f"Error fetching models: {e}"))
+        worker.start()
+
+    @timed()
     def update_solution_args(self):
-        # Clear existing widgets
-        for i in reversed(range(self.scroll_layout.count())): 
-            widget = self.scroll_layout.itemAt(i).widget()
-            if widget is not None:
-                widget.deleteLater()  # Ensures the widget is fully cleaned up
-                self.scroll_layout.removeWidget(widget)
+        # Clear existing rows, removing only their widgets leaves them empty
+        while self.scroll_layout.rowCount():
+            self.scroll_layout.removeRow(0)
+        self.form_status_label.setVisible(False)
 
         selected_run = self.run_dropdown.currentText()
         selected_solution = self.solution_dropdown.currentText()
 
-        default_value = ""
-        
-        if not selected_solution:
+        self._form_generation += 1
+
+        if not selected_solution or self.index is None:
             return
 
         catalog, group, name, version = selected_solution.split(":")
 
+        # The form is built from the choice index only, list the selected
+        # run first if it is not indexed yet
+        if selected_run and not self.index.has_choices(selected_run):
+            self.form_status_label.setVisible(True)
+            worker = create_worker(self.index.run_choices, selected_run)
+            worker.returned.connect(lambda _: self.update_solution_args())
+            worker.errored.connect(
+                lambda e: print(f"Error indexing run {selected_run}: {e}")
+            )
+            worker.start()
+            return
+        choices = (
+            self.index.run_choices(selected_run)
+            if selected_run
+            else RunChoices()
+        )
+        self._form_complete = self.index.choices_complete()
+
+        solution = (catalog, group, name, version)
+        solution_info = self.client.cached_info(*solution)
+        models = (
+            self.client.cached_models() if takes_model(solution_info) else []
+        )
+        if solution_info is None or models is None:
+            # Not fetched yet or expired, fetch without blocking the UI
+            self.form_status_label.setVisible(True)
+            generation = self._form_generation
+            worker = create_worker(self.fetch_solution_form, solution)
+            worker.returned.connect(
+                partial(
+                    self._on_solution_form_fetched,
+                    generation,
+                    selected_run,
+                    solution,
+                    choices,
+                )
+            )
+            worker.errored.connect(
+                partial(self._on_solution_form_error, generation)
+            )
+            worker.start()
+            return
+        self.build_solution_form(
+            selected_run, solution, choices, solution_info, models
+        )
+
+    def fetch_solution_form(self, solution):
+        """The arguments of `solution` and, if it takes a model, the model
+        names, read from the server on a worker."""
+        solution_info = self.client.info(*solution)
+        models = []
+        if takes_model(solution_info):
+            try:
+                models = self.client.models()
+            except Exception as e:  # noqa: BLE001
+                print(f"Error fetching models: {e}")
+        return solution_info, models
+
+    def _on_solution_form_fetched(
+        self, generation, selected_run, solution, choices, result
+    ):
+        # Dropped if the form was updated meanwhile
+        if generation != self._form_generation:
+            return
+        self.form_status_label.setVisible(False)
+        self.build_solution_form(selected_run, solution, choices, *result)
+
+    def _on_solution_form_error(self, generation, error):
+        print(f"Error fetching solution info: {error}")
+        if generation == self._form_generation:
+            self.form_status_label.setVisible(False)
+
+    @timed()
+    def build_solution_form(
+        self, selected_run, solution, choices, solution_info, models
+    ):
+        catalog, _, name, _ = solution
+        default_value = ""
+
         # Define the conditions for freeform parameters
         freeform_conditions = {
             "cellcanvas": {
@@ -503,9 +2144,7 @@ class CellCanvasWidget(QWidget):
         }
 
         try:
-            response = requests.get(f"http://{self.hostname}:{self.port}/info/{catalog}/{group}/{name}/{version}")
-            if response.status_code == 200:
-                solution_info = response.json().get('info', {})
+            if solution_info:
                 args = solution_info.get('args', [])
 
                 for arg in args:
@@ -523,59 +2162,43 @@ class CellCanvasWidget(QWidget):
                     else:
                         if arg_name == 'run_name':
                             field = QComboBox()
-                            for run in self.root.runs:
-                                field.addItem(run.meta.name)
+                            for run_name in self.index.run_names():
+                                field.addItem(run_name)
                             field.setCurrentText(selected_run)
                         elif arg_name == 'voxel_spacing':
                             field = QComboBox()
-                            run = self.root.get_run(selected_run)
-                            for voxel_spacing in run.voxel_spacings:
-                                field.addItem(str(voxel_spacing.meta.voxel_size))
+                            for voxel_size in choices.voxel_sizes:
+                                field.addItem(str(voxel_size))
                         elif arg_name == 'tomo_type':
                             field = QComboBox()
-                            run = self.root.get_run(selected_run)
-                            for tomogram in run.voxel_spacings[0].tomograms:
-                                field.addItem(tomogram.meta.tomo_type)
+                            field.addItems(choices.tomo_types)
                         elif arg_name in ['embedding_name', 'feature_type', 'feature_names']:
                             field = QComboBox()
-                            run = self.root.get_run(selected_run)
-                            for voxel_spacing in run.voxel_spacings:
-                                for tomogram in voxel_spacing.tomograms:
-                                    for feature in tomogram.features:
-                                        field.addItem(feature.meta.feature_type)
+                            field.addItems(choices.feature_types)
                         elif arg_name == 'painting_segmentation_names':
                             field = MultiSelectComboBox()
-                            run = self.root.get_run(selected_run)
-                            for voxel_spacing in run.voxel_spacings:
-                                for segmentation in voxel_spacing.run.get_segmentations(voxel_spacing.meta.voxel_size):
-                                    field.addItem(segmentation.meta.name)
+                            for segmentation_name in choices.segmentation_names:
+                                field.addItem(segmentation_name)
                         elif arg_name in ['train_run_names', 'val_run_names', 'run_names']:
                             field = MultiSelectComboBox()
-                            for run in self.root.runs:
-                                field.addItem(run.meta.name)
+                            for run_name in self.index.run_names():
+                                field.addItem(run_name)
                         elif arg_name == 'feature_types':
                             field = MultiSelectComboBox()
-                            run = self.root.get_run(selected_run)
-                            for voxel_spacing in run.voxel_spacings:
-                                for tomogram in voxel_spacing.tomograms:
-                                    for feature in tomogram.features:
-                                        field.addItem(feature.meta.feature_type)
-                        elif arg_name in ['user_id', 'session_id']:
+                            for feature_type in choices.feature_types:
+                                field.addItem(feature_type)
+                        elif arg_name == 'user_id':
                             field = QComboBox()
-                            for pick in self.root.runs[0].picks:  # Assuming all runs have similar user_ids and session_ids
-                                if arg_name == 'user_id':
-                                    field.addItem(pick.meta.user_id)
-                                elif arg_name == 'session_id':
-                                    field.addItem(pick.meta.session_id)
+                            field.addItems(self.index.user_ids())
+                        elif arg_name == 'session_id':
+                            field = QComboBox()
+                            field.addItems(self.index.session_ids())
                         elif arg_name == 'model_path':
                             field = QComboBox()
-                            self.populate_model_dropdown(field)
+                            field.addItems(models)
                         elif arg_name == 'segmentation_name':
                             field = QComboBox()
-                            run = self.root.get_run(selected_run)
-                            for voxel_spacing in run.voxel_spacings:
-                                for segmentation in voxel_spacing.run.get_segmentations(voxel_spacing.meta.voxel_size):
-                                    field.addItem(segmentation.meta.name)
+                            field.addItems(choices.segmentation_names)
                         else:
                             field = QLineEdit(str(default_value))
 
@@ -586,14 +2209,8 @@ class CellCanvasWidget(QWidget):
         except Exception as e:
             print(f"Error updating solution args: {e}")
             
-    def run_solution(self):
-        selected_solution = self.solution_dropdown.currentText()
-        if not selected_solution:
-            return
-
-        catalog, group, name, version = selected_solution.split(":")
+    def solution_form_args(self):
         solution_args = {}
-        
         for i in range(self.scroll_layout.rowCount()):
             label_item = self.scroll_layout.itemAt(i * 2)
             field_item = self.scroll_layout.itemAt(i * 2 + 1)
@@ -604,20 +2221,170 @@ class CellCanvasWidget(QWidget):
                     solution_args[label.text()] = field.currentText()
                 else:
                     solution_args[label.text()] = field.text()
-        
-        try:
-            response = requests.post(f"http://{self.hostname}:{self.port}/run/{catalog}/{group}/{name}/{version}", 
-                                     json={"args": solution_args})
-            if response.status_code == 200:
-                result = response.json()
-                print(f"Execution result: {result}")
-            else:
-                print(f"Failed to execute solution. Status code: {response.status_code}")
-                print(f"Response content: {response.text}")
-        except Exception as e:
-            print(f"Error occurred: {e}")
+        return solution_args
+
+    @timed()
+    def run_solution(self):
+        selected_solution = self.solution_dropdown.currentText()
+        if not selected_solution or self.index is None:
+            return
+
+        catalog, group, name, version = selected_solution.split(":")
+        solution_args = self.solution_form_args()
+        self.job_manager.submit(
+            selected_solution,
+            partial(run_with_outputs, self.index, self.client.run),
+            catalog,
+            group,
+            name,
+            version,
+            solution_args,
+            job_args=solution_args,
+        )
+
+    @timed()
+    def run_batch(self):
+        selected_solution = self.solution_dropdown.currentText()
+        run_names = self.batch_runs.selectedItems()
+        if not selected_solution or not run_names or self.index is None:
+            return
+
+        catalog, group, name, version = selected_solution.split(":")
+        solution_args = self.solution_form_args()
+        if "run_name" not in solution_args:
+            print(f"Solution {selected_solution} does not take a run_name")
+            return
+        items = []
+        for run_name in run_names:
+            run_args = {**solution_args, "run_name": run_name}
+            items.append(
+                (run_name, (catalog, group, name, version, run_args), run_args)
+            )
+        # Connection errors, timeouts and server errors are retried
+        self._batch = self.job_manager.submit_batch(
+            selected_solution,
+            partial(run_with_outputs, self.index, self.client.run),
+            items,
+            max_concurrency=self.batch_concurrency.value(),
+            retries=self.batch_retries.value(),
+            retry_on=self.client.is_transient,
+        )
+
+    def cancel_batch(self):
+        if self._batch is not None:
+            self.job_manager.cancel_batch(self._batch)
+
+    def update_batch_status(self, batch):
+        if batch is not self._batch:
+            return
+        self.cancel_batch_button.setEnabled(not batch.finished)
+        self.batch_status.setText(
+            f"{batch.done} done, {batch.failed} failed, "
+            f"{batch.cancelled} cancelled, {batch.remaining} remaining \u2014 "
+            f"{batch.throughput():.1f} runs/min"
+        )
+
+    def handle_job_finished(self, job):
+        if job.error is not None:
+            print(f"Error occurred in job {job.job_id} ({job.description}): {job.error}")
+        elif job.state == DONE:
+            result, outputs = job.result
+            print(f"Execution result: {result}")
+            self.ingest_outputs(outputs, job.args)
+
+    @timed()
+    def ingest_outputs(self, outputs, solution_args):
+        """Show what a solution changed in its runs, from the diffs of
+        `run_with_outputs`."""
+        # Runs created by the solution are found by a project refresh
+        if any(
+            run_name not in self.index.runs
+            for run_name in solution_runs(solution_args)
+        ):
+            self.refresh_tree()
+
+        changed = False
+        for run_name, (added, removed) in outputs.items():
+            if added or removed:
+                changed = True
+                self.insert_run_entities(run_name, added, removed)
+            if (
+                self.viewer is not None
+                and self.open_outputs_checkbox.isChecked()
+            ):
+                self.open_outputs(run_name, added, solution_args)
+        if changed:
+            self.build_choices()
+
+    def open_outputs(self, run_name, added, solution_args):
+        run = self.index.get_run(run_name)
+        for key, entity in added.items():
+            kind = key[0]
+            if kind == "tomogram":
+                self.load_tomogram(entity)
+            elif kind == "segmentation":
+                self.load_segmentation(entity)
+            elif kind == "picks":
+                self.load_picks(entity, run)
+
+        # Listings do not show rewritten data. Segmentations named in the
+        # arguments may have been overwritten, their open layers are re-read
+        names = {
+            name
+            for value in solution_args.values()
+            if isinstance(value, str)
+            for name in value.split(", ")
+        }
+        for layer in list(self.viewer.layers):
+            key = layer.metadata.get("copick_segmentation")
+            if (
+                key is not None
+                and key[0] == run_name
+                and key[-1] in names
+                and ("segmentation", *key[1:]) not in added
+                and self.discard_unsaved_edits(layer)
+            ):
+                self.reload_layer(layer)
+
+    def discard_unsaved_edits(self, layer):
+        """Ask before dropping the unsaved edits of a layer whose data was
+        rewritten. Returns False if they are kept, they are then saved over
+        the new data."""
+        from ._zarr import WriteBehindStore, wrapped_stores
+
+        levels = layer.data if layer.multiscale else [layer.data]
+        stores = [
+            store
+            for level in levels
+            for store in wrapped_stores(getattr(level, "store", None))
+            if isinstance(store, WriteBehindStore) and store.dirty_count
+        ]
+        if not stores:
+            return True
+        answer = QMessageBox.question(
+            self,
+            "Unsaved edits",
+            f"{layer.name} may have been rewritten by a solution and has "
+            "unsaved edits. Discard them and show the new data? Kept edits "
+            "are saved over it.",
+        )
+        if answer != QMessageBox.Yes:
+            return False
+        for store in stores:
+            store.discard()
+        return True
+
+    def closeEvent(self, event):
+        self.job_manager.shutdown()
+        self.writeback.shutdown()
+        if self._pca_executor is not None:
+            self._pca_executor.shutdown(wait=False, cancel_futures=True)
+        self.client.close()
+        super().closeEvent(event)
 
 def main():
+    import napari
+
     viewer = napari.Viewer()
     widget = CellCanvasWidget(viewer=viewer)
     viewer.window.add_dock_widget(widget, area='right')